@@ -4,31 +4,100 @@ from flask_pymongo import PyMongo
 from dotenv import load_dotenv
 import os
 import posthog
+from app.indexes import ensure_indexes
+from app.user_cache import init_user_cache
+from app.summary_cache import init_summary_cache
+from app.analytics import init_analytics
+from app.metrics import init_metrics, command_metrics
+from app.querylog import init_query_log, query_log
+from app.profiler import init_profiler, mongo_timer
+from app.tracing import init_tracing, mongo_spans
 load_dotenv() 
 
 # Initialize the Flask application
 app = Flask(__name__)
 app.config["MONGO_URI"] = os.getenv("MONGO_URI", "mongodb://localhost:27017/mydatabase")
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "default_secret_key") 
+# Connections per worker process; with gevent workers every in-flight request may hold one
+app.config["MONGO_MAX_POOL_SIZE"] = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+# How long a request waits for a free pooled connection before failing, in milliseconds
+app.config["MONGO_WAIT_QUEUE_TIMEOUT_MS"] = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000))
+# Number of expenses shown per page on the dashboard
+app.config["EXPENSES_PAGE_SIZE"] = int(os.getenv("EXPENSES_PAGE_SIZE", 50))
+# Longest window, in months, the summary charts may request
+app.config["SUMMARY_MAX_MONTHS"] = int(os.getenv("SUMMARY_MAX_MONTHS", 60))
+# Expenses written per insert_many round trip when importing files
+app.config["IMPORT_BATCH_SIZE"] = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+# Expenses fetched per cursor round trip when streaming exports
+app.config["EXPORT_BATCH_SIZE"] = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+# Per-worker cache of user settings documents (entries, and seconds before expiry)
+app.config["USER_CACHE_SIZE"] = int(os.getenv("USER_CACHE_SIZE", 1024))
+app.config["USER_CACHE_TTL"] = float(os.getenv("USER_CACHE_TTL", 30))
+# Cache of summary chart series keyed by each user's data version (entries, seconds before expiry),
+# optionally backed by a shared cache: an import path to a factory taking the app
+app.config["SUMMARY_CACHE_SIZE"] = int(os.getenv("SUMMARY_CACHE_SIZE", 1024))
+app.config["SUMMARY_CACHE_TTL"] = float(os.getenv("SUMMARY_CACHE_TTL", 300))
+app.config["SUMMARY_CACHE_BACKEND"] = os.getenv("SUMMARY_CACHE_BACKEND")
+# Analytics events are queued in memory and sent in batches by a background thread
+app.config["ANALYTICS_QUEUE_SIZE"] = int(os.getenv("ANALYTICS_QUEUE_SIZE", 10000))
+app.config["ANALYTICS_BATCH_SIZE"] = int(os.getenv("ANALYTICS_BATCH_SIZE", 100))
+app.config["ANALYTICS_FLUSH_INTERVAL"] = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", 1.0))
+# Bearer token required to read /metrics; the endpoint is open when unset
+app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN")
+# MongoDB round trips a request may make before a warning is logged (views can lower it with
+# @query_budget); warnings are on in debug mode unless QUERY_BUDGET_WARNINGS says otherwise
+app.config["QUERY_BUDGET_DEFAULT"] = int(os.getenv("QUERY_BUDGET_DEFAULT", 10))
+app.config["QUERY_BUDGET_WARNINGS"] = os.getenv("QUERY_BUDGET_WARNINGS", os.getenv("FLASK_DEBUG", "0")) == "1"
+# Comma-separated emails of users allowed to use admin-only tools such as ?profile=1
+app.config["ADMIN_EMAILS"] = {
+    email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()
+}
+# Where profiled requests are saved; without it the report replaces the response
+app.config["PROFILE_DIR"] = os.getenv("PROFILE_DIR")
+# Seconds a token from `flask profile-token` stays valid
+app.config["PROFILE_TOKEN_MAX_AGE"] = int(os.getenv("PROFILE_TOKEN_MAX_AGE", 900))
+# Request traces: kept in an in-memory ring buffer, optionally appended to a JSON lines file,
+# and shown on /admin/traces when they take at least TRACE_SLOW_MS milliseconds
+app.config["TRACING_ENABLED"] = os.getenv("TRACING_ENABLED", "1") == "1"
+app.config["TRACE_BUFFER_SIZE"] = int(os.getenv("TRACE_BUFFER_SIZE", 200))
+app.config["TRACE_FILE"] = os.getenv("TRACE_FILE")
+app.config["TRACE_SLOW_MS"] = float(os.getenv("TRACE_SLOW_MS", 250))
 
 # Initialize PostHog if API key is available
 posthog_api_key = os.getenv('POSTHOG_API_KEY')
 if posthog_api_key:
     posthog.api_key = posthog_api_key
     posthog.host = os.getenv('POSTHOG_HOST', 'https://app.posthog.com')
+init_analytics(app)
 
-# Initialize PyMongo for MongoDB interactions
-mongo = PyMongo(app)
+init_user_cache(app)
+init_summary_cache(app)
+init_metrics(app)
+init_query_log(app)
 
-# Ensure database is initialized
-with app.app_context():
-    # Create collections if they don't exist
-    if 'users' not in mongo.db.list_collection_names():
-        mongo.db.create_collection('users')
-    if 'expenses' not in mongo.db.list_collection_names():
-        mongo.db.create_collection('expenses')
-    if 'user_settings' not in mongo.db.list_collection_names():
-        mongo.db.create_collection('user_settings')
+# PyMongo for MongoDB interactions; the client is created by init_db()
+mongo = PyMongo()
+init_profiler(app, mongo)
+init_tracing(app)
+
+
+def init_db(app):
+    """Create this process's MongoDB client and connection pool, then build missing indexes."""
+    mongo.init_app(
+        app,
+        maxPoolSize=app.config["MONGO_MAX_POOL_SIZE"],
+        waitQueueTimeoutMS=app.config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+        event_listeners=[command_metrics, query_log, mongo_timer, mongo_spans]
+    )
+    # Build any missing query indexes (collections are created implicitly)
+    with app.app_context():
+        ensure_indexes(mongo.db, logger=app.logger)
+
+
+# gunicorn.conf.py preloads the app in the master and calls init_db() in each
+# worker after fork, so connections are never shared across processes
+if os.getenv("DEFER_DB_INIT") != "1":
+    init_db(app)
 
 # Initialize the LoginManager for user session management
 login_manager = LoginManager(app)
@@ -36,4 +105,4 @@ login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
 # Import routes after initializing the app to avoid circular imports
-from app import routes
+from app import routes, commands
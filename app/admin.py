@@ -0,0 +1,11 @@
+from flask import current_app
+from app.user_cache import get_user_settings
+
+
+def is_admin(db, user_id):
+    """Return whether the user's email is listed in the ADMIN_EMAILS setting."""
+    admins = current_app.config["ADMIN_EMAILS"]
+    if not admins or not user_id:
+        return False
+    settings = get_user_settings(db, user_id)
+    return bool(settings) and settings.get("email", "").lower() in admins
@@ -0,0 +1,329 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from bson import ObjectId
+from dateutil.relativedelta import relativedelta
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app.dates import format_date
+
+
+# A rebuild claimed longer ago than this is assumed abandoned and may be taken over
+REBUILD_TIMEOUT = timedelta(seconds=60)
+
+# Passes a rebuild makes before leaving the aggregates to a later read when writes keep interrupting it
+REBUILD_ATTEMPTS = 5
+
+# Seconds a rebuild waits between passes for in-flight expense writes to finish
+REBUILD_RETRY_DELAY = 0.05
+
+
+def _delta_update(amounts, counts):
+    """Build the $inc document for {category: delta} amount and count mappings."""
+    inc = {"total": sum(amounts.values())}
+    for category, amount in amounts.items():
+        inc[f"categories.{category}"] = amount
+    for category, count in counts.items():
+        inc[f"counts.{category}"] = count
+    return {"$inc": inc}
+
+
+def _fresh_version():
+    """Return a data version for rebuilt aggregates.
+
+    Rebuilds restart the version from the clock rather than from zero, so a
+    rebuilt user never reuses a version that may still be cached.
+    """
+    return time.time_ns()
+
+
+def _totals_document(user_id, rows):
+    """Build a totals document from per-category {"_id", "amount", "count"} rows."""
+    rows = list(rows)
+    return {
+        "_id": user_id,
+        "total": sum(row["amount"] for row in rows),
+        "categories": {row["_id"]: row["amount"] for row in rows},
+        "counts": {row["_id"]: row["count"] for row in rows},
+        "data_version": _fresh_version()
+    }
+
+
+def _month_key(expense):
+    """Return the YYYY-MM rollup bucket an expense falls into."""
+    return format_date(expense["date"])[:7]
+
+
+def _month_category_pipeline(match):
+    """Aggregation pipeline summing matched expenses per (month, category)."""
+    return [
+        {"$match": match},
+        {"$group": {
+            # $toString renders native dates as ISO-8601, so this also buckets legacy strings
+            "_id": {"month": {"$substr": [{"$toString": "$date"}, 0, 7]}, "category": "$category"},
+            "amount": {"$sum": "$amount"},
+            "count": {"$sum": 1}
+        }}
+    ]
+
+
+@contextmanager
+def expense_write(db, user_id):
+    """Register an expense write with the user's aggregates while the block runs.
+
+    Wrap both the write to the expenses collection and the apply_expense_*()
+    call that folds it into the aggregates. A rebuild only stores its result
+    once no registered write is in flight, so it can never count an expense
+    whose delta is still to come.
+    """
+    db.expense_totals.update_one(
+        {"_id": user_id}, {"$inc": {"pending": 1}, "$set": {"pending_at": datetime.utcnow()}}, upsert=True
+    )
+    try:
+        yield
+    finally:
+        db.expense_totals.update_one({"_id": user_id}, {"$inc": {"pending": -1}})
+
+
+def _apply_deltas(db, user_id, signed_expenses):
+    """Fold (expense, +1/-1) pairs into the user's totals and monthly rollups.
+
+    Aggregates are only incremented if the user's totals document is
+    complete; a missing or partial document means the user's aggregates are
+    rebuilt from the expenses collection on the next read, so writes never
+    create partial aggregates for users with pre-existing history. While a
+    rebuild is in progress, writes leave the aggregates alone and make the
+    rebuild start over.
+    """
+    deltas = defaultdict(lambda: {"amount": 0.0, "count": 0})
+    for expense, sign in signed_expenses:
+        if expense:
+            bucket = deltas[(_month_key(expense), expense["category"])]
+            bucket["amount"] += sign * expense["amount"]
+            bucket["count"] += sign
+    deltas = {key: delta for key, delta in deltas.items() if delta["amount"] or delta["count"]}
+    if not deltas:
+        return
+
+    amounts = defaultdict(float)
+    counts = defaultdict(int)
+    for (month, category), delta in deltas.items():
+        amounts[category] += delta["amount"]
+        counts[category] += delta["count"]
+    counts = {category: count for category, count in counts.items() if count}
+    result = db.expense_totals.update_one(
+        {"_id": user_id, "rebuilding": {"$exists": False}, "counts": {"$exists": True}}, _delta_update(amounts, counts)
+    )
+    if not result.matched_count:
+        # A rebuild in progress may have summed the expenses before this write
+        db.expense_totals.update_one({"_id": user_id}, {"$inc": {"dirty": 1}})
+        return
+
+    db.monthly_rollups.bulk_write([
+        UpdateOne(
+            {"user_id": user_id, "month": month, "category": category},
+            {"$inc": {"amount": delta["amount"], "count": delta["count"]}},
+            upsert=True
+        )
+        for (month, category), delta in deltas.items()
+    ], ordered=False)
+    # Bump the version that keys the cached summary series only once the rollups
+    # are written, so a concurrent read never caches old rollups under the new version
+    db.expense_totals.update_one({"_id": user_id}, {"$inc": {"data_version": 1}})
+
+
+def apply_expense_change(db, user_id, old=None, new=None):
+    """Fold an expense insert, edit or delete into the user's totals and monthly rollups.
+
+    Pass ``old`` for the expense as it was before the write (None on insert)
+    and ``new`` for the expense as written (None on delete).
+    """
+    _apply_deltas(db, user_id, ((old, -1), (new, 1)))
+
+
+def apply_expense_inserts(db, user_id, expenses):
+    """Fold a batch of inserted expenses into the aggregates with one write per collection."""
+    _apply_deltas(db, user_id, ((expense, 1) for expense in expenses))
+
+
+def _category_rows(rows):
+    """Fold (month, category) rows into per-category {"_id", "amount", "count"} rows."""
+    categories = defaultdict(lambda: {"amount": 0, "count": 0})
+    for row in rows:
+        category = categories[row["_id"]["category"]]
+        category["amount"] += row["amount"]
+        category["count"] += row["count"]
+    return [{"_id": category, **sums} for category, sums in categories.items()]
+
+
+def _write_rollups(db, user_id, rows):
+    """Upsert a user's rollups from (month, category) rows and drop the buckets that are gone.
+
+    Unlike delete-then-insert, the rollups stay readable throughout and two
+    writers never collide on the unique (user, month, category) index.
+    """
+    if rows:
+        db.monthly_rollups.bulk_write([
+            UpdateOne(
+                {"user_id": user_id, "month": row["_id"]["month"], "category": row["_id"]["category"]},
+                {"$set": {"amount": row["amount"], "count": row["count"]}},
+                upsert=True
+            )
+            for row in rows
+        ], ordered=False)
+    stale = {"user_id": user_id}
+    if rows:
+        stale["$nor"] = [{"month": row["_id"]["month"], "category": row["_id"]["category"]} for row in rows]
+    db.monthly_rollups.delete_many(stale)
+
+
+def _claim_rebuild(db, user_id, force):
+    """Mark the user's aggregates as being rebuilt; return the claim token, or None if that is not needed or taken.
+
+    Without ``force`` only missing or outdated totals documents are claimed.
+    Either way a claim older than REBUILD_TIMEOUT is taken over.
+    """
+    now = datetime.utcnow()
+    idle = {"rebuilding": {"$exists": False}}
+    if not force:
+        idle["counts"] = {"$exists": False}
+    token = ObjectId()
+    try:
+        db.expense_totals.update_one(
+            {"_id": user_id, "$or": [idle, {"claimed_at": {"$lt": now - REBUILD_TIMEOUT}}]},
+            {"$set": {"rebuilding": token, "claimed_at": now, "dirty": 0}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The document exists and is either up to date or claimed by a live rebuild
+        return None
+    return token
+
+
+def _rebuild_user_aggregates(db, user_id, force=False):
+    """Rebuild a user's totals and monthly rollups together; return the totals and the rollup count.
+
+    Both come from one aggregation, so they never disagree. The rebuild is
+    claimed on the totals document first: concurrent writes then only flag
+    it, and the totals are stored only if no write came in while the
+    expenses were being summed and none registered with expense_write() is
+    still in flight; otherwise it starts over. Callers that lose the claim
+    get totals summed on the spot, marked with ``rebuilding``.
+    """
+    token = _claim_rebuild(db, user_id, force)
+    for _ in range(REBUILD_ATTEMPTS):
+        rows = list(db.expenses.aggregate(_month_category_pipeline({"user_id": user_id})))
+        totals = _totals_document(user_id, _category_rows(rows))
+        if token is None:
+            break
+        _write_rollups(db, user_id, rows)
+        stored = db.expense_totals.replace_one(
+            {"_id": user_id, "rebuilding": token, "dirty": 0, "pending": {"$not": {"$gt": 0}}}, totals
+        )
+        if stored.matched_count:
+            return totals, len(rows)
+        restarted = db.expense_totals.update_one({"_id": user_id, "rebuilding": token}, {"$set": {"dirty": 0}})
+        if not restarted.matched_count:
+            # Taken over by another rebuild after REBUILD_TIMEOUT
+            break
+        # Writes registered that long ago belong to a worker that died before finishing them
+        db.expense_totals.update_one(
+            {"_id": user_id, "rebuilding": token, "pending_at": {"$lt": datetime.utcnow() - REBUILD_TIMEOUT}},
+            {"$set": {"pending": 0}}
+        )
+        time.sleep(REBUILD_RETRY_DELAY)
+    else:
+        # Leave the aggregates outdated so writes skip them and the next read rebuilds them
+        db.expense_totals.update_one(
+            {"_id": user_id, "rebuilding": token}, {"$unset": {"rebuilding": "", "claimed_at": "", "counts": ""}}
+        )
+    totals["rebuilding"] = True
+    return totals, len(rows)
+
+
+def recompute_user_totals(db, user_id):
+    """Rebuild a user's totals document, along with their rollups, from their expenses and return it."""
+    return _rebuild_user_aggregates(db, user_id, force=True)[0]
+
+
+def rebuild_user_rollups(db, user_id):
+    """Rebuild a user's monthly rollups, along with their totals, from their expenses; return the bucket count."""
+    return _rebuild_user_aggregates(db, user_id, force=True)[1]
+
+
+def _rebuild_all_aggregates(db):
+    """Rebuild the totals and rollups of every user with expenses; return the user count."""
+    user_ids = db.expenses.distinct("user_id")
+    for user_id in user_ids:
+        _rebuild_user_aggregates(db, user_id, force=True)
+    # Users without any expenses left are rebuilt as empty on their next read
+    db.expense_totals.delete_many({"_id": {"$nin": user_ids}})
+    db.monthly_rollups.delete_many({"user_id": {"$nin": user_ids}})
+    return len(user_ids)
+
+
+def recompute_all_totals(db):
+    """Rebuild the totals document of every user with expenses; return the user count."""
+    return _rebuild_all_aggregates(db)
+
+
+def rebuild_all_rollups(db):
+    """Rebuild the monthly rollups of every user with expenses; return the user count."""
+    return _rebuild_all_aggregates(db)
+
+
+def get_user_totals(db, user_id):
+    """Return the user's totals document, rebuilding it if it does not exist yet."""
+    totals = db.expense_totals.find_one({"_id": user_id})
+    # Documents written before category counts existed are rebuilt as well;
+    # while another request rebuilds them, the totals are summed on the spot
+    if totals is None or "counts" not in totals or "rebuilding" in totals:
+        totals = _rebuild_user_aggregates(db, user_id)[0]
+    return totals
+
+
+def user_categories(totals):
+    """Return the sorted categories with at least one expense in a totals document."""
+    return sorted(category for category, count in totals.get("counts", {}).items() if count > 0)
+
+
+def get_monthly_rollups(db, user_id, start_month, end_month):
+    """Return {(YYYY-MM, category): amount} for a user's rollups between two months, inclusive."""
+    rollups = db.monthly_rollups.find(
+        {"user_id": user_id, "month": {"$gte": start_month, "$lte": end_month}},
+        {"_id": 0, "month": 1, "category": 1, "amount": 1}
+    )
+    return {(rollup["month"], rollup["category"]): rollup["amount"] for rollup in rollups}
+
+
+def summary_window(db, user_id, months, today=None):
+    """Return chart-ready series for the last ``months`` months, including the current one.
+
+    The result holds a per-month spending series and per-category totals for
+    the window, both folded from the user's monthly rollups, so its size
+    depends only on the window length.
+    """
+    today = today or datetime.now()
+    start_date = (today - relativedelta(months=months - 1)).replace(day=1)
+    month_starts = [start_date + relativedelta(months=i) for i in range(months)]
+    month_keys = [month.strftime('%Y-%m') for month in month_starts]
+
+    monthly_totals = dict.fromkeys(month_keys, 0.0)
+    category_totals = defaultdict(float)
+    for (month_key, category), amount in get_monthly_rollups(db, user_id, month_keys[0], month_keys[-1]).items():
+        monthly_totals[month_key] += amount
+        category_totals[category] += amount
+    categories = sorted(category for category, amount in category_totals.items() if amount > 0)
+
+    return {
+        "months": months,
+        "time": {
+            "labels": [month.strftime('%B %Y') for month in month_starts],
+            "values": [monthly_totals[month_key] for month_key in month_keys]
+        },
+        "categories": {
+            "labels": categories,
+            "values": [category_totals[category] for category in categories]
+        }
+    }
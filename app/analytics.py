@@ -0,0 +1,171 @@
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, timezone
+import posthog
+
+
+logger = logging.getLogger(__name__)
+
+
+def posthog_sink(events):
+    """Send a batch of events to PostHog."""
+    for event in events:
+        posthog.capture(
+            event["distinct_id"],
+            event["event"],
+            event["properties"],
+            timestamp=event["timestamp"]
+        )
+
+
+class EventDispatcher:
+    """Bounded in-process event queue drained in batches by a background thread.
+
+    ``enqueue`` only appends to a deque, so callers never wait on the sink.
+    When the queue is full the oldest events are dropped. The worker thread
+    is started lazily and restarted after a fork, so it also works when the
+    app is preloaded in a gunicorn master.
+    """
+
+    def __init__(self, sink, max_queue=10000, batch_size=100, flush_interval=1.0):
+        self.sink = sink
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self._reset()
+
+    def _reset(self):
+        """Create fresh queue state for the current process."""
+        self._events = deque(maxlen=self.max_queue)
+        self._condition = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._pid = os.getpid()
+
+    def depth(self):
+        """Return the number of events waiting to be sent."""
+        return len(self._events)
+
+    def enqueue(self, event):
+        """Queue an event for the background thread, dropping the oldest one if full."""
+        if self._pid != os.getpid():
+            # Locks and threads do not survive a fork; events queued before it belong to the parent
+            self._reset()
+        with self._condition:
+            if len(self._events) == self.max_queue:
+                self.dropped += 1
+            self._events.append(event)
+            if self._thread is None:
+                self._start()
+            elif len(self._events) >= self.batch_size:
+                self._condition.notify()
+
+    def _start(self):
+        """Start the worker thread; called with the condition held."""
+        self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run, args=(self._condition,), name="analytics-dispatcher", daemon=True
+        )
+        self._thread.start()
+
+    def _take_batch(self):
+        """Pop up to batch_size events; called with the condition held."""
+        return [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+
+    def _send(self, batch):
+        """Hand a batch to the sink, counting rather than raising failures."""
+        if not batch:
+            return
+        with self._send_lock:
+            try:
+                self.sink(batch)
+                self.sent += len(batch)
+            except Exception:
+                self.failed += len(batch)
+                logger.exception("Failed to send %d analytics events", len(batch))
+
+    def _run(self, condition):
+        """Send a batch whenever one is full or the flush interval elapses."""
+        while True:
+            with condition:
+                condition.wait_for(
+                    lambda: self._stopping or len(self._events) >= self.batch_size,
+                    timeout=self.flush_interval
+                )
+                # A reset queue belongs to a newer worker thread
+                if self._stopping or self._condition is not condition:
+                    return
+                batch = self._take_batch()
+            self._send(batch)
+
+    def flush(self):
+        """Send every queued event from the calling thread."""
+        while True:
+            with self._condition:
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._send(batch)
+
+    def close(self, timeout=5.0):
+        """Stop the worker thread and send what is left in the queue."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self.flush()
+
+
+# Installed by init_analytics() or by tests; events are discarded while None
+dispatcher = None
+
+
+def install_dispatcher(new_dispatcher):
+    """Replace the active dispatcher, sending what the previous one still holds."""
+    global dispatcher
+    previous, dispatcher = dispatcher, new_dispatcher
+    if previous is not None:
+        previous.close()
+    return new_dispatcher
+
+
+def init_analytics(app):
+    """Install a PostHog dispatcher if an API key is configured, flushing it on shutdown."""
+    if not getattr(posthog, "api_key", None):
+        return None
+    installed = install_dispatcher(EventDispatcher(
+        posthog_sink,
+        max_queue=app.config["ANALYTICS_QUEUE_SIZE"],
+        batch_size=app.config["ANALYTICS_BATCH_SIZE"],
+        flush_interval=app.config["ANALYTICS_FLUSH_INTERVAL"]
+    ))
+    atexit.register(_shutdown, installed)
+    return installed
+
+
+def _shutdown(installed):
+    """Drain the dispatcher, then PostHog's own client queue, before the worker exits."""
+    installed.close()
+    # PostHog's exit hook may already have run, so flush the events handed over just now
+    posthog.flush()
+
+
+def track(distinct_id, event_name, properties=None):
+    """Queue an analytics event without blocking the caller."""
+    if dispatcher is None:
+        return
+    dispatcher.enqueue({
+        "distinct_id": str(distinct_id),
+        "event": event_name,
+        "properties": dict(properties or {}),
+        "timestamp": datetime.now(timezone.utc)
+    })
@@ -0,0 +1,171 @@
+import click
+from bson.objectid import ObjectId
+from app import app, mongo
+from app.aggregates import (
+    recompute_user_totals, recompute_all_totals, rebuild_user_rollups, rebuild_all_rollups
+)
+from app.importer import import_expenses, detect_format, ImportFormatError, PARSERS
+from app.forms import EXPENSE_CATEGORIES
+from app.exporter import export_cursor, EXPORT_FORMATS
+from app.indexes import check_indexes, ensure_indexes
+from app.migrations import migrate_expense_dates
+from app.goals import recompute_goal_totals, recompute_all_goal_totals
+from app.profiler import make_profile_token
+
+
+@app.cli.command("recompute-totals")
+@click.option("--user-id", default=None, help="Only rebuild the totals of this user.")
+def recompute_totals_command(user_id):
+    """Rebuild the materialized expense totals from the expenses collection."""
+    if user_id:
+        totals = recompute_user_totals(mongo.db, user_id)
+        click.echo(f"Recomputed totals for user {user_id}: {totals['total']:.2f}")
+    else:
+        count = recompute_all_totals(mongo.db)
+        click.echo(f"Recomputed totals for {count} users")
+
+
+@app.cli.command("rebuild-rollups")
+@click.option("--user-id", default=None, help="Only rebuild the rollups of this user.")
+def rebuild_rollups_command(user_id):
+    """Rebuild the monthly rollups from the expenses collection (backfill and drift repair)."""
+    if user_id:
+        count = rebuild_user_rollups(mongo.db, user_id)
+        click.echo(f"Rebuilt {count} monthly rollups for user {user_id}")
+    else:
+        count = rebuild_all_rollups(mongo.db)
+        click.echo(f"Rebuilt monthly rollups for {count} users")
+
+
+@app.cli.command("migrate-dates")
+@click.option("--batch-size", default=1000, show_default=True, help="Expenses converted per round trip.")
+@click.option("--after-id", default=None, help="Resume after this expense _id.")
+def migrate_dates_command(batch_size, after_id):
+    """Convert string expense dates to native BSON dates (safe to interrupt and re-run)."""
+    def report(migrated, invalid, last_id):
+        click.echo(f"Migrated {migrated} expenses ({invalid} invalid) up to _id {last_id}")
+
+    migrated, invalid, last_id = migrate_expense_dates(
+        mongo.db,
+        batch_size=batch_size,
+        after_id=ObjectId(after_id) if after_id else None,
+        on_batch=report
+    )
+    click.echo(f"Done: {migrated} expenses migrated, {invalid} left with invalid dates")
+    if migrated:
+        # Goal counters computed while these dates were strings may have left them out
+        count = recompute_all_goal_totals(mongo.db)
+        click.echo(f"Recomputed goal totals for {count} users")
+
+
+@app.cli.command("recompute-goal-totals")
+@click.option("--user-id", default=None, help="Only recompute the goals of this user.")
+def recompute_goal_totals_command(user_id):
+    """Recompute every savings goal's allocated total from the allocated expenses."""
+    if user_id:
+        user = mongo.db.users.find_one({"_id": ObjectId(user_id)}, {"savings_goals": 1})
+        if user is None:
+            raise click.ClickException(f"No user with id {user_id}")
+        recompute_goal_totals(mongo.db, user_id, user.get("savings_goals", []))
+        click.echo(f"Recomputed goal totals for user {user_id}")
+    else:
+        count = recompute_all_goal_totals(mongo.db)
+        click.echo(f"Recomputed goal totals for {count} users")
+
+
+@app.cli.command("import-expenses")
+@click.argument("email")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(sorted(PARSERS)), default=None,
+              help="File format; detected from the extension by default.")
+@click.option("--batch-size", default=None, type=int, help="Expenses written per round trip.")
+@click.option("--default-category", default="Needs", show_default=True,
+              type=click.Choice([value for value, _ in EXPENSE_CATEGORIES]),
+              help="Category for rows whose category is missing or unknown.")
+def import_expenses_command(email, path, fmt, batch_size, default_category):
+    """Import a CSV, OFX or QIF export into the account registered with EMAIL."""
+    user = mongo.db.users.find_one({"email": email}, {"_id": 1})
+    if user is None:
+        raise click.ClickException(f"No user registered with {email}")
+
+    try:
+        with open(path, encoding="utf-8-sig", errors="replace", newline="") as stream:
+            report = import_expenses(
+                mongo.db,
+                str(user["_id"]),
+                stream,
+                fmt or detect_format(path),
+                batch_size=batch_size or app.config["IMPORT_BATCH_SIZE"],
+                default_category=default_category
+            )
+    except ImportFormatError as exc:
+        raise click.ClickException(str(exc))
+    for error in report["errors"]:
+        click.echo(f"Row {error['row']}: {error['message']}")
+    click.echo(
+        f"Imported {report['inserted']} expenses, {report['error_count']} errors, "
+        f"{report['skipped']} credits skipped"
+    )
+
+
+@app.cli.command("export-expenses")
+@click.argument("email")
+@click.option("--format", "fmt", type=click.Choice(sorted(EXPORT_FORMATS)), default="csv", show_default=True)
+@click.option("--output", type=click.File("w", lazy=True), default="-", help="Write to this file instead of stdout.")
+@click.option("--batch-size", default=None, type=int, help="Expenses fetched per round trip.")
+def export_expenses_command(email, fmt, output, batch_size):
+    """Stream the full expense history of the account registered with EMAIL."""
+    user = mongo.db.users.find_one({"email": email}, {"_id": 1})
+    if user is None:
+        raise click.ClickException(f"No user registered with {email}")
+
+    generate, _ = EXPORT_FORMATS[fmt]
+    expenses = export_cursor(mongo.db, str(user["_id"]), batch_size=batch_size or app.config["EXPORT_BATCH_SIZE"])
+    for chunk in generate(expenses):
+        output.write(chunk)
+
+
+@app.cli.command("profile-token")
+def profile_token_command():
+    """Print a token that profiles requests sent with it in the X-Profile-Token header."""
+    click.echo(make_profile_token(app.config["SECRET_KEY"]))
+    click.echo(f"Valid for {app.config['PROFILE_TOKEN_MAX_AGE']} seconds", err=True)
+
+
+def _report_indexes(report):
+    """Print a check_indexes() report; returns whether every declared index is in place."""
+    in_sync = True
+    for collection_name, result in report.items():
+        for name in result["missing"]:
+            click.echo(f"{collection_name}: missing {name}")
+        for name in result["conflicting"]:
+            click.echo(f"{collection_name}: {name} has different keys than declared")
+        for name in result["extra"]:
+            click.echo(f"{collection_name}: undeclared {name}")
+        in_sync = in_sync and not result["missing"] and not result["conflicting"]
+    return in_sync
+
+
+@app.cli.group("indexes")
+def indexes_group():
+    """Inspect and build the declared MongoDB indexes."""
+
+
+@indexes_group.command("check")
+def check_indexes_command():
+    """Report declared indexes that are missing or differ; exits non-zero when out of sync."""
+    if not _report_indexes(check_indexes(mongo.db)):
+        raise SystemExit(1)
+    click.echo("All declared indexes are present")
+
+
+@indexes_group.command("sync")
+def sync_indexes_command():
+    """Build every declared index that does not exist yet and rebuild those whose keys differ."""
+    created = ensure_indexes(mongo.db, rebuild=True)
+    for name in created:
+        click.echo(f"Created {name}")
+    click.echo(f"{len(created)} indexes created")
+    if not _report_indexes(check_indexes(mongo.db)):
+        raise SystemExit(1)
+
@@ -0,0 +1,24 @@
+from datetime import date, datetime, time
+
+
+# Format of dates in forms, goals and legacy expense documents
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def to_datetime(value):
+    """Normalize a date, datetime or 'YYYY-MM-DD' string to the midnight datetime stored on expenses.
+
+    Raises ValueError for strings that are not valid dates.
+    """
+    if isinstance(value, datetime):
+        return datetime.combine(value.date(), time())
+    if isinstance(value, date):
+        return datetime.combine(value, time())
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+def format_date(value):
+    """Render an expense date (native datetime or legacy string) as 'YYYY-MM-DD'."""
+    if isinstance(value, date):
+        return value.strftime(DATE_FORMAT)
+    return value
@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+from app.dates import format_date
+from app.pagination import EXPENSE_SORT
+
+
+# Exported columns; the CSV layout can be imported back as-is
+EXPORT_FIELDS = ["date", "description", "amount", "category", "goal_id"]
+
+# Rows encoded per chunk handed to the WSGI server
+ROWS_PER_CHUNK = 500
+
+
+def export_cursor(db, user_id, batch_size=1000):
+    """Return a cursor over a user's expenses, newest first, fetching only exported fields.
+
+    The cursor pulls ``batch_size`` documents per round trip, so iterating it
+    keeps at most one batch in memory however long the history is.
+    """
+    return db.expenses.find(
+        {"user_id": user_id},
+        {"_id": 0, **{field: 1 for field in EXPORT_FIELDS}}
+    ).sort(EXPENSE_SORT).batch_size(batch_size)
+
+
+def _export_row(expense):
+    """Return an expense's exported fields with the date rendered as YYYY-MM-DD."""
+    row = {field: expense.get(field) for field in EXPORT_FIELDS}
+    row["date"] = format_date(row["date"])
+    return row
+
+
+def iter_csv(expenses):
+    """Yield a CSV export of the expenses in chunks of ROWS_PER_CHUNK rows, header first."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    # Send the header straight away so the download starts before the first batch arrives
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    rows = 0
+    for expense in expenses:
+        writer.writerow(_export_row(expense))
+        rows += 1
+        if rows == ROWS_PER_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if rows:
+        yield buffer.getvalue()
+
+
+def iter_ndjson(expenses):
+    """Yield a newline-delimited JSON export of the expenses in chunks of ROWS_PER_CHUNK lines."""
+    lines = []
+    for expense in expenses:
+        lines.append(json.dumps(_export_row(expense)))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+# Format name to (chunk generator, mimetype)
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv"),
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+}
@@ -1,17 +1,36 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, PasswordField, SubmitField, FloatField, SelectField, DateField, DecimalField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, NumberRange
 from datetime import date
+from app.tracing import span
 
 
-class LoginForm(FlaskForm):
+# (value, label) choices of an expense's category
+EXPENSE_CATEGORIES = [
+    ("Needs", "Needs"),
+    ("Wants", "Wants"),
+    ("Savings", "Savings"),
+    ("Investments", "Investments")
+]
+
+
+class BaseForm(FlaskForm):
+    """FlaskForm whose validation shows up as a span in request traces."""
+
+    def validate(self, extra_validators=None):
+        with span(f"validate {type(self).__name__}", "form"):
+            return super().validate(extra_validators=extra_validators)
+
+
+class LoginForm(BaseForm):
     """Form for user login."""
     email = StringField('Email', validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired()])
     submit = SubmitField('Login')
 
 
-class RegistrationForm(FlaskForm):
+class RegistrationForm(BaseForm):
     """Form for user registration."""
     email = StringField('Email', validators=[DataRequired(), Email()])
     password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
@@ -19,18 +38,13 @@ class RegistrationForm(FlaskForm):
     submit = SubmitField('Register')
 
 
-class ExpenseForm(FlaskForm):
+class ExpenseForm(BaseForm):
     """Form for adding and editing expenses."""
     description = StringField("Description", validators=[DataRequired()])
     amount = DecimalField("Amount", validators=[DataRequired(), NumberRange(min=0.01)])
     category = SelectField(
         "Category",
-        choices=[
-            ("Needs", "Needs"),
-            ("Wants", "Wants"),
-            ("Savings", "Savings"),
-            ("Investments", "Investments")
-        ],
+        choices=EXPENSE_CATEGORIES,
         validators=[DataRequired()],
     )
     date = DateField("Date", validators=[DataRequired()])
@@ -38,7 +52,21 @@ class ExpenseForm(FlaskForm):
     submit = SubmitField('Add Expense')
 
 
-class BudgetSettingsForm(FlaskForm):
+class ImportExpensesForm(BaseForm):
+    """Form for uploading a CSV, OFX or QIF export of expenses."""
+    file = FileField("File", validators=[
+        FileRequired(),
+        FileAllowed(["csv", "ofx", "qfx", "qif"], "Upload a CSV, OFX, QFX or QIF file")
+    ])
+    default_category = SelectField(
+        "Category for rows with a missing or unknown category",
+        choices=EXPENSE_CATEGORIES,
+        default="Needs",
+    )
+    submit = SubmitField('Import')
+
+
+class BudgetSettingsForm(BaseForm):
     """Form for setting budget percentages."""
     needs_percentage = FloatField('Needs (%)', validators=[DataRequired(), NumberRange(min=0, max=100)])
     wants_percentage = FloatField('Wants (%)', validators=[DataRequired(), NumberRange(min=0, max=100)])
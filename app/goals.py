@@ -0,0 +1,149 @@
+from collections import defaultdict
+from bson.objectid import ObjectId
+from app.dates import to_datetime, format_date
+from app.user_cache import invalidate_user
+
+
+# Only these categories can be allocated to a savings goal
+GOAL_CATEGORIES = ["Savings", "Investments"]
+
+
+def goal_expense_filter(goal):
+    """Build the query clause matching expenses allocated to a goal within its date range.
+
+    Legacy string dates are matched alongside native ones while the date
+    migration is pending, since range comparisons only match a single type.
+    """
+    clause = {"goal_id": goal.get("goal_id", "")}
+    if goal.get("start_date") and goal.get("end_date"):
+        clause["$or"] = [
+            {"date": {"$gte": to_datetime(goal["start_date"]), "$lte": to_datetime(goal["end_date"])}},
+            {"date": {"$gte": format_date(goal["start_date"]), "$lte": format_date(goal["end_date"])}}
+        ]
+    return clause
+
+
+def fetch_goal_expenses(db, user_id, goals):
+    """Return {goal_id: [expenses sorted by date]} for all of a user's goals in one query."""
+    expenses_by_goal = defaultdict(list)
+    if not goals:
+        return expenses_by_goal
+    expenses = db.expenses.find({
+        "user_id": user_id,
+        "category": {"$in": GOAL_CATEGORIES},
+        "$or": [goal_expense_filter(goal) for goal in goals]
+    }).sort("date", 1)
+    for expense in expenses:
+        expenses_by_goal[expense["goal_id"]].append(expense)
+    return expenses_by_goal
+
+
+def compute_goal_totals(db, user_id, goals):
+    """Sum the in-range allocated expenses of several goals with one aggregation."""
+    if not goals:
+        return {}
+    rows = db.expenses.aggregate([
+        {"$match": {
+            "user_id": user_id,
+            "category": {"$in": GOAL_CATEGORIES},
+            "$or": [goal_expense_filter(goal) for goal in goals]
+        }},
+        {"$group": {"_id": "$goal_id", "total": {"$sum": "$amount"}}}
+    ])
+    return {row["_id"]: row["total"] for row in rows}
+
+
+def apply_goal_change(db, user_id, old=None, new=None):
+    """Fold an expense write into the allocated_total counters of the goals it touches.
+
+    Pass ``old`` for the expense before the write (None on insert) and ``new``
+    for the expense as written (None on delete). Only goals whose counter is
+    already initialized are incremented; goals that predate the counter are
+    filled in by backfill_goal_totals() on their next read.
+    """
+    deltas = defaultdict(float)
+    if old and old.get("goal_id"):
+        deltas[old["goal_id"]] -= old["amount"]
+    if new and new.get("goal_id"):
+        deltas[new["goal_id"]] += new["amount"]
+    for goal_id, amount in deltas.items():
+        if not amount:
+            continue
+        db.users.update_one(
+            {
+                "_id": ObjectId(user_id),
+                "savings_goals": {"$elemMatch": {"goal_id": goal_id, "allocated_total": {"$exists": True}}}
+            },
+            {"$inc": {"savings_goals.$.allocated_total": amount}}
+        )
+    if any(deltas.values()):
+        invalidate_user(db, user_id)
+
+
+def backfill_goal_totals(db, user_id, goals):
+    """Initialize allocated_total on goals that do not carry one yet; returns the goals.
+
+    The goal dictionaries are updated in place so callers can render them
+    straight away. Goals that already have a counter cost nothing.
+    """
+    missing = [goal for goal in goals if "allocated_total" not in goal]
+    if not missing:
+        return goals
+    totals = compute_goal_totals(db, user_id, missing)
+    for goal in missing:
+        goal["allocated_total"] = totals.get(goal.get("goal_id", ""), 0.0)
+        db.users.update_one(
+            {"_id": ObjectId(user_id), "savings_goals.goal_id": goal.get("goal_id", "")},
+            {"$set": {"savings_goals.$.allocated_total": goal["allocated_total"]}}
+        )
+    invalidate_user(db, user_id)
+    return goals
+
+
+def recompute_goal_totals(db, user_id, goals):
+    """Overwrite allocated_total on every goal of a user from the expenses; returns {goal_id: total}.
+
+    Repairs counters computed while part of the user's expenses could not be
+    matched, e.g. before their dates were migrated.
+    """
+    totals = compute_goal_totals(db, user_id, goals)
+    for goal in goals:
+        db.users.update_one(
+            {"_id": ObjectId(user_id), "savings_goals.goal_id": goal.get("goal_id", "")},
+            {"$set": {"savings_goals.$.allocated_total": totals.get(goal.get("goal_id", ""), 0.0)}}
+        )
+    invalidate_user(db, user_id)
+    return totals
+
+
+def recompute_all_goal_totals(db):
+    """Recompute the goal counters of every user with savings goals; returns the user count."""
+    users = db.users.find({"savings_goals.0": {"$exists": True}}, {"savings_goals": 1})
+    count = 0
+    for user in users:
+        recompute_goal_totals(db, str(user["_id"]), user["savings_goals"])
+        count += 1
+    return count
+
+
+def detach_out_of_range_expenses(db, user_id, goal_id, start_date, end_date):
+    """Unallocate a goal's expenses dated outside a new range in one round trip.
+
+    Returns the number of expenses that were detached. Legacy string dates
+    are matched alongside native ones while the date migration is pending.
+    """
+    start, end = to_datetime(start_date), to_datetime(end_date)
+    result = db.expenses.update_many(
+        {
+            "user_id": user_id,
+            "goal_id": goal_id,
+            "$or": [
+                {"date": {"$lt": start}},
+                {"date": {"$gt": end}},
+                {"date": {"$lt": start_date}},
+                {"date": {"$gt": end_date}}
+            ]
+        },
+        {"$unset": {"goal_id": ""}}
+    )
+    return result.modified_count
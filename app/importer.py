@@ -0,0 +1,239 @@
+import csv
+import html
+import re
+from datetime import date
+from pymongo.errors import BulkWriteError
+from werkzeug.datastructures import MultiDict
+from app.aggregates import apply_expense_inserts, expense_write
+from app.dates import to_datetime, DATE_FORMAT
+from app.forms import EXPENSE_CATEGORIES, ExpenseForm
+
+
+# Errors kept in an import report; the total count is always reported
+MAX_REPORTED_ERRORS = 100
+
+# One OFX tag and the text up to the next tag
+_OFX_TOKEN = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+# Expense categories by lowercased name, to match exports case-insensitively
+_CATEGORIES = {value.lower(): value for value, _ in EXPENSE_CATEGORIES}
+
+
+class ImportFormatError(ValueError):
+    """Raised when an uploaded file cannot be parsed in the requested format."""
+
+
+def _category(value, default_category):
+    """Return the expense category named by an export, or ``default_category`` if it names none."""
+    return _CATEGORIES.get(value.strip().lower(), default_category)
+
+
+def parse_csv(stream, default_category="Needs"):
+    """Yield (row number, fields) pairs from a CSV with description, amount, date and optional category columns."""
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None:
+        return
+    columns = {name.strip().lower(): name for name in reader.fieldnames if name}
+    missing = {"description", "amount", "date"} - set(columns)
+    if missing:
+        raise ImportFormatError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+    for row in reader:
+        fields = {field: (row.get(columns[field]) or "").strip() for field in ("description", "amount", "date")}
+        fields["category"] = _category(row.get(columns.get("category", ""), "") or "", default_category)
+        # line_num is the file line the row ends on, counting the header
+        yield reader.line_num, fields
+
+
+def _ofx_tokens(stream, chunk_size=65536):
+    """Yield (closing, tag, value) for every tag in an OFX file without loading it whole."""
+    buffer = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        # Only tokenize up to the last tag start; its value may continue in the next chunk
+        cut = buffer.rfind("<")
+        for match in _OFX_TOKEN.finditer(buffer, 0, cut):
+            yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+        buffer = buffer[cut:] if cut >= 0 else ""
+    for match in _OFX_TOKEN.finditer(buffer):
+        yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+
+
+def _bank_amount(value):
+    """Return the expense amount of a signed bank amount, or None for credits."""
+    try:
+        amount = float(value.replace(",", ""))
+    except ValueError:
+        return value
+    # Bank exports record spending as debits (negative amounts)
+    if amount >= 0:
+        return None
+    return f"{-amount:.2f}"
+
+
+def parse_ofx(stream, default_category="Needs"):
+    """Yield (transaction number, fields) pairs for the debit transactions of an OFX/QFX file.
+
+    Credits carry no expense and are yielded as None fields so they can be
+    counted as skipped.
+    """
+    transaction = None
+    number = 0
+    for closing, tag, value in _ofx_tokens(stream):
+        if tag == "STMTTRN":
+            if transaction is not None:
+                yield number, _ofx_fields(transaction, default_category)
+                transaction = None
+            if not closing:
+                number += 1
+                transaction = {}
+        elif transaction is not None and not closing:
+            # OFX 1.x (SGML) leaves element tags unclosed, so closing tags are ignored
+            transaction[tag] = html.unescape(value)
+    if transaction is not None:
+        yield number, _ofx_fields(transaction, default_category)
+
+
+def _ofx_fields(transaction, default_category):
+    """Map an OFX transaction's tags to expense form fields."""
+    amount = _bank_amount(transaction.get("TRNAMT", ""))
+    if amount is None:
+        return None
+    posted = transaction.get("DTPOSTED", "")
+    return {
+        "description": transaction.get("NAME") or transaction.get("MEMO", ""),
+        "amount": amount,
+        "category": default_category,
+        # DTPOSTED is YYYYMMDD optionally followed by a time and timezone
+        "date": f"{posted[:4]}-{posted[4:6]}-{posted[6:8]}" if len(posted) >= 8 else posted
+    }
+
+
+def _qif_date(value):
+    """Convert a QIF date (MM/DD/YYYY, MM/DD'YY or YYYY-MM-DD) to YYYY-MM-DD."""
+    parts = re.split(r"[/'\-.]", value.strip())
+    try:
+        if len(parts) != 3:
+            raise ValueError(value)
+        if len(parts[0]) == 4:
+            year, month, day = (int(part) for part in parts)
+        else:
+            month, day, year = (int(part) for part in parts)
+            if year < 100:
+                year += 2000
+        return date(year, month, day).strftime(DATE_FORMAT)
+    except ValueError:
+        # Leave it to form validation to report
+        return value
+
+
+def parse_qif(stream, default_category="Needs"):
+    """Yield (line number, fields) pairs for the debit records of a QIF file."""
+    record = {}
+    for line_number, line in enumerate(stream, start=1):
+        line = line.rstrip("\r\n")
+        if not line or line.startswith("!"):
+            continue
+        code, value = line[0], line[1:].strip()
+        if code != "^":
+            record.setdefault("_line", line_number)
+            record[code] = value
+            continue
+
+        start_line = record.pop("_line", line_number)
+        amount = _bank_amount(record.get("T", record.get("U", "")))
+        if amount is None:
+            yield start_line, None
+        else:
+            yield start_line, {
+                "description": record.get("P") or record.get("M", ""),
+                "amount": amount,
+                "category": _category(record.get("L", ""), default_category),
+                "date": _qif_date(record.get("D", ""))
+            }
+        record = {}
+
+
+PARSERS = {
+    "csv": parse_csv,
+    "ofx": parse_ofx,
+    "qfx": parse_ofx,
+    "qif": parse_qif,
+}
+
+
+def detect_format(filename):
+    """Guess an import format from a file name's extension."""
+    extension = filename.rsplit(".", 1)[-1].lower() if filename and "." in filename else ""
+    if extension not in PARSERS:
+        raise ImportFormatError(f"Unsupported import format: {extension or filename!r}")
+    return extension
+
+
+def _form_errors(form):
+    """Flatten WTForms errors into a single message."""
+    return "; ".join(
+        f"{field}: {', '.join(messages)}" for field, messages in form.errors.items()
+    )
+
+
+def import_expenses(db, user_id, stream, fmt, batch_size=1000, default_category="Needs"):
+    """Stream-parse an export, validate each row with ExpenseForm and insert them in batches.
+
+    Rows are validated with the same rules as the add-expense form and written
+    with unordered ``insert_many`` calls of ``batch_size`` documents, folding
+    each batch into the user's aggregates. Returns a report dict with the
+    inserted, skipped and failed row counts plus the first errors by row.
+    """
+    if fmt not in PARSERS:
+        raise ImportFormatError(f"Unsupported import format: {fmt}")
+
+    report = {"inserted": 0, "skipped": 0, "error_count": 0, "errors": []}
+
+    def record_error(row, message):
+        report["error_count"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row, "message": message})
+
+    def flush(batch, rows):
+        with expense_write(db, user_id):
+            try:
+                db.expenses.insert_many(batch, ordered=False)
+                inserted = batch
+            except BulkWriteError as exc:
+                failed = {error["index"] for error in exc.details.get("writeErrors", [])}
+                for index in sorted(failed):
+                    record_error(rows[index], "Could not be saved")
+                inserted = [expense for index, expense in enumerate(batch) if index not in failed]
+            apply_expense_inserts(db, user_id, inserted)
+        report["inserted"] += len(inserted)
+
+    # One form instance is reused for every row to keep validation cheap
+    form = ExpenseForm(formdata=None, meta={"csrf": False})
+    batch, rows = [], []
+    for row, fields in PARSERS[fmt](stream, default_category=default_category):
+        if fields is None:
+            report["skipped"] += 1
+            continue
+        form.process(MultiDict(fields))
+        if not form.validate():
+            record_error(row, _form_errors(form))
+            continue
+
+        batch.append({
+            "user_id": user_id,
+            "description": form.description.data,
+            "amount": float(form.amount.data),
+            "category": form.category.data,
+            "date": to_datetime(form.date.data),
+        })
+        rows.append(row)
+        if len(batch) >= batch_size:
+            flush(batch, rows)
+            batch, rows = [], []
+    if batch:
+        flush(batch, rows)
+    return report
@@ -0,0 +1,118 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+
+# Every index the application's queries rely on, keyed by collection.
+# Add an entry here whenever a route starts filtering or sorting on new fields.
+INDEXES = {
+    "users": [
+        # login/register look users up by email
+        IndexModel([("email", ASCENDING)], name="email_1", unique=True, sparse=True),
+    ],
+    "expenses": [
+        # Keyset-paginated dashboard listing and per-user aggregations
+        IndexModel(
+            [("user_id", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+            name="user_id_1_date_-1__id_-1"
+        ),
+        # Expenses allocated to a savings goal, in date order
+        IndexModel(
+            [("user_id", ASCENDING), ("goal_id", ASCENDING), ("date", ASCENDING)],
+            name="user_id_1_goal_id_1_date_1"
+        ),
+    ],
+    "monthly_rollups": [
+        # One rollup per user, month and category; summary reads a month range
+        IndexModel(
+            [("user_id", ASCENDING), ("month", ASCENDING), ("category", ASCENDING)],
+            name="user_id_1_month_1_category_1",
+            unique=True
+        ),
+    ],
+}
+
+
+def _existing_indexes(collection):
+    """Return {name: key list} for the indexes currently on a collection."""
+    return {
+        name: list(info["key"])
+        for name, info in collection.index_information().items()
+    }
+
+
+def _compare(collection, models):
+    """Compare a collection's indexes with its declared models.
+
+    Returns (missing, conflicting, extra): the declared models with no index
+    of their name, those whose same-named index has different keys, and the
+    names of undeclared indexes.
+    """
+    existing = _existing_indexes(collection)
+    missing, conflicting = [], []
+    for model in models:
+        name = model.document["name"]
+        if name not in existing:
+            missing.append(model)
+        elif existing[name] != list(model.document["key"].items()):
+            conflicting.append(model)
+    declared = {model.document["name"] for model in models}
+    extra = [name for name in existing if name != "_id_" and name not in declared]
+    return missing, conflicting, extra
+
+
+def check_indexes(db):
+    """Compare declared indexes with the database.
+
+    Returns a dict of collection name to {"missing": [...], "conflicting": [...],
+    "extra": [...]} listing index names, only for collections that are out of
+    sync. Conflicting indexes carry a declared name but different keys.
+    """
+    report = {}
+    for collection_name, models in INDEXES.items():
+        missing, conflicting, extra = _compare(db[collection_name], models)
+        if missing or conflicting or extra:
+            report[collection_name] = {
+                "missing": [model.document["name"] for model in missing],
+                "conflicting": [model.document["name"] for model in conflicting],
+                "extra": extra,
+            }
+    return report
+
+
+def ensure_indexes(db, logger=None, rebuild=False):
+    """Create any declared index that does not exist yet and return their names.
+
+    Safe to run on every startup: collections already in sync cost a single
+    listIndexes round trip, and missing indexes are built in the background.
+    Indexes whose keys differ from their declaration are dropped and built
+    again only with ``rebuild``; otherwise they are logged and left alone.
+    Failures are logged rather than raised so a bad build never blocks boot.
+    """
+    created = []
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        missing, conflicting, _ = _compare(collection, models)
+        if conflicting and not rebuild:
+            if logger is not None:
+                logger.warning(
+                    "Indexes on %s differ from their declaration: %s (run flask indexes sync)",
+                    collection_name, ", ".join(model.document["name"] for model in conflicting)
+                )
+            conflicting = []
+        to_create = [
+            IndexModel(list(model.document["key"].items()), background=True, **{
+                option: value for option, value in model.document.items() if option != "key"
+            })
+            for model in missing + conflicting
+        ]
+        if not to_create:
+            continue
+        try:
+            for model in conflicting:
+                collection.drop_index(model.document["name"])
+            created.extend(collection.create_indexes(to_create))
+        except OperationFailure as exc:
+            if logger is None:
+                raise
+            logger.error("Failed to build indexes on %s: %s", collection_name, exc)
+    return created
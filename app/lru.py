@@ -0,0 +1,60 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+# Sentinel for "not cached", since None is a valid cached value
+MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with a time-to-live and hit counters.
+
+    Values are deep-copied in and out, so callers may mutate what they get.
+    """
+
+    def __init__(self, max_size=1024, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return a copy of the cached value, or MISSING if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[1]
+        # Callers may mutate what they get back, so never hand out the cached object
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        """Cache a copy of a value, evicting the least recently used entries."""
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        entry = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Drop a cached value."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every cached value and reset the hit counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
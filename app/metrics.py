@@ -0,0 +1,266 @@
+import threading
+import time
+from bisect import bisect_left
+from flask import g, request
+from pymongo import monitoring
+from app import analytics, summary_cache, user_cache
+from app.querylog import command_collection
+
+
+# Request latency buckets, in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# MongoDB command latency buckets, in seconds
+COMMAND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+def _escape(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    """Render a {name="value",...} label set."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    """Render a sample value."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class holding per-label-set values behind a lock."""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        """Return the label values of ``labels`` in declaration order."""
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self):
+        """Return the HELP and TYPE lines."""
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def clear(self):
+        """Drop every recorded value."""
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Add ``amount`` to the count of a label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Return the current count of a label set."""
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        """Return the exposition lines of every label set."""
+        with self._lock:
+            samples = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in samples
+        ]
+
+
+class Histogram(_Metric):
+    """Bucketed observations with their sum and count per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """Record one observation for a label set."""
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts plus the overflow bucket, then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, **labels):
+        """Return the number of observations of a label set."""
+        state = self._values.get(self._key(labels))
+        return sum(state[0]) if state else 0
+
+    def render(self):
+        """Return cumulative bucket, sum and count lines of every label set."""
+        with self._lock:
+            samples = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in samples:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter whose value is read from a callback at scrape time."""
+
+    def __init__(self, name, documentation, callback, kind="gauge"):
+        super().__init__(name, documentation)
+        self.callback = callback
+        self.kind = kind
+
+    def render(self):
+        """Return the HELP and TYPE lines and the callback's current value."""
+        return self.header() + [f"{self.name} {_number(self.callback())}"]
+
+
+class Registry:
+    """Ordered set of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """Add a metric and return it."""
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        """Drop the values of every metric."""
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Time spent handling requests, per Flask endpoint.",
+    ["endpoint", "method"]
+))
+REQUESTS = registry.register(Counter(
+    "http_requests_total", "Requests handled, per Flask endpoint and status code.",
+    ["endpoint", "method", "status"]
+))
+MONGO_LATENCY = registry.register(Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round-trip time, per collection and command.",
+    ["collection", "command"], buckets=COMMAND_BUCKETS
+))
+MONGO_COMMANDS = registry.register(Counter(
+    "mongodb_commands_total", "MongoDB commands sent, per collection, command and outcome.",
+    ["collection", "command", "outcome"]
+))
+
+
+registry.register(CallbackMetric(
+    "analytics_queue_depth", "Analytics events waiting to be sent.",
+    lambda: analytics.dispatcher.depth() if analytics.dispatcher else 0
+))
+registry.register(CallbackMetric(
+    "analytics_events_dropped_total", "Analytics events dropped because the queue was full.",
+    lambda: analytics.dispatcher.dropped if analytics.dispatcher else 0, kind="counter"
+))
+registry.register(CallbackMetric(
+    "analytics_events_failed_total", "Analytics events the sink failed to send.",
+    lambda: analytics.dispatcher.failed if analytics.dispatcher else 0, kind="counter"
+))
+registry.register(CallbackMetric(
+    "user_settings_cache_hits_total", "User settings served from the worker cache.",
+    lambda: user_cache.cache.hits, kind="counter"
+))
+registry.register(CallbackMetric(
+    "user_settings_cache_misses_total", "User settings fetched from MongoDB.",
+    lambda: user_cache.cache.misses, kind="counter"
+))
+registry.register(CallbackMetric(
+    "user_settings_cache_hit_ratio", "Share of user settings lookups served from the worker cache.",
+    lambda: user_cache.cache.hits / max(user_cache.cache.hits + user_cache.cache.misses, 1)
+))
+registry.register(CallbackMetric(
+    "summary_cache_hits_total", "Summary chart series served from the cache.",
+    lambda: summary_cache.cache.hits, kind="counter"
+))
+registry.register(CallbackMetric(
+    "summary_cache_misses_total", "Summary chart series computed from the monthly rollups.",
+    lambda: summary_cache.cache.misses, kind="counter"
+))
+registry.register(CallbackMetric(
+    "summary_cache_hit_ratio", "Share of summary chart lookups served from the cache.",
+    lambda: summary_cache.cache.hits / max(summary_cache.cache.hits + summary_cache.cache.misses, 1)
+))
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """PyMongo listener recording every command's collection, duration and outcome."""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        self._pending[(event.connection_id, event.request_id)] = command_collection(event.command_name, event.command)
+
+    def _finish(self, event, outcome):
+        collection = self._pending.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMANDS.inc(collection=collection, command=event.command_name, outcome=outcome)
+        MONGO_LATENCY.observe(event.duration_micros / 1e6, collection=collection, command=event.command_name)
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+
+command_metrics = CommandMetrics()
+
+
+def _start_timer():
+    """Remember when the request started."""
+    g.request_started = time.perf_counter()
+
+
+def _record_request(response):
+    """Record the request's latency and status."""
+    started = g.pop("request_started", None)
+    if started is not None:
+        endpoint = request.endpoint or "unmatched"
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method)
+        REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    return response
+
+
+def init_metrics(app):
+    """Time every request of the app."""
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
@@ -0,0 +1,47 @@
+from pymongo import UpdateOne
+from app.dates import to_datetime
+
+
+def migrate_expense_dates(db, batch_size=1000, after_id=None, on_batch=None):
+    """Convert legacy string expense dates to native BSON dates in batches.
+
+    Only documents whose date is still a string are selected, so the
+    migration is idempotent and can be interrupted and re-run at any point;
+    ``after_id`` resumes explicitly after a given _id. Each batch is written
+    with one unordered bulk_write, guarded on the old value so concurrent
+    edits are never overwritten. ``on_batch`` is called with the running
+    (migrated, invalid, last_id) counts after every batch.
+
+    Returns a (migrated, invalid, last_id) tuple, where ``invalid`` counts
+    strings that are not YYYY-MM-DD dates and were left untouched.
+    """
+    migrated = invalid = 0
+    last_id = after_id
+    while True:
+        query = {"date": {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = list(
+            db.expenses.find(query, {"date": 1}).sort("_id", 1).limit(batch_size)
+        )
+        if not batch:
+            break
+
+        updates = []
+        for expense in batch:
+            try:
+                new_date = to_datetime(expense["date"])
+            except ValueError:
+                invalid += 1
+                continue
+            updates.append(UpdateOne(
+                {"_id": expense["_id"], "date": expense["date"]},
+                {"$set": {"date": new_date}}
+            ))
+        if updates:
+            migrated += db.expenses.bulk_write(updates, ordered=False).modified_count
+
+        last_id = batch[-1]["_id"]
+        if on_batch:
+            on_batch(migrated, invalid, last_id)
+    return migrated, invalid, last_id
@@ -0,0 +1,65 @@
+import base64
+import binascii
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+
+
+# Sort order for expense listings; matches the (user_id, date, _id) index
+EXPENSE_SORT = [("date", -1), ("_id", -1)]
+
+
+def encode_cursor(expense):
+    """Build an opaque keyset cursor pointing just past the given expense."""
+    date_value = expense["date"]
+    # Keep the BSON type of the date so legacy string dates keep paging correctly
+    if isinstance(date_value, datetime):
+        date_value = "d" + date_value.isoformat()
+    else:
+        date_value = "s" + date_value
+    raw = f"{date_value}|{expense['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into its (date, ObjectId) pair, raising ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_value, expense_id = raw.rsplit("|", 1)
+        if date_value.startswith("d"):
+            date_value = datetime.fromisoformat(date_value[1:])
+        elif date_value.startswith("s"):
+            date_value = date_value[1:]
+        else:
+            raise ValueError("Invalid pagination cursor")
+        return date_value, ObjectId(expense_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError, InvalidId):
+        raise ValueError("Invalid pagination cursor")
+
+
+def fetch_expense_page(collection, user_id, cursor=None, page_size=50):
+    """Return one page of a user's expenses (newest first) and the cursor for the next page.
+
+    Pages are selected by keyset on (date, _id) instead of skip/limit, so every
+    page costs a single bounded index scan regardless of how far back it is.
+    """
+    query = {"user_id": user_id}
+    if cursor:
+        date_value, expense_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"date": {"$lt": date_value}},
+            {"date": date_value, "_id": {"$lt": expense_id}},
+        ]
+        # Comparisons only match values of the same BSON type, and the descending sort puts
+        # every native date before every legacy string date, so past a date cursor the
+        # unmigrated string rows all still lie ahead
+        if isinstance(date_value, datetime):
+            query["$or"].append({"date": {"$type": "string"}})
+
+    # Fetch one extra row to find out whether another page exists
+    expenses = list(collection.find(query).sort(EXPENSE_SORT).limit(page_size + 1))
+    next_cursor = None
+    if len(expenses) > page_size:
+        expenses = expenses[:page_size]
+        next_cursor = encode_cursor(expenses[-1])
+    return expenses, next_cursor
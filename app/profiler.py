@@ -0,0 +1,200 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+import greenlet
+from flask import Response, current_app, g, has_app_context, request, before_render_template, template_rendered
+from flask_login import current_user
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from pymongo import monitoring
+from app.admin import is_admin
+
+
+# Request header carrying a token minted by make_profile_token()
+TOKEN_HEADER = "X-Profile-Token"
+
+# Query flag admins add to a URL; "inline" also forces the report into the response
+QUERY_FLAG = "profile"
+
+# Functions listed in the text report, by cumulative time
+TOP_FUNCTIONS = 40
+
+# cProfile and the greenlet switch hook are per thread, so only one request per worker is profiled at a time
+_active = threading.Lock()
+
+
+def _serializer(secret_key):
+    return URLSafeTimedSerializer(secret_key, salt="request-profile")
+
+
+def make_profile_token(secret_key):
+    """Return a signed token that enables profiling when sent in the X-Profile-Token header."""
+    return _serializer(secret_key).dumps("profile")
+
+
+def _valid_token(token):
+    """Return whether a profile token is genuine and not expired."""
+    try:
+        _serializer(current_app.config["SECRET_KEY"]).loads(
+            token, max_age=current_app.config["PROFILE_TOKEN_MAX_AGE"]
+        )
+    except BadSignature:
+        return False
+    return True
+
+
+class RequestProfile:
+    """cProfile run of one request plus the MongoDB and template time spent in it.
+
+    gevent workers serve many requests on one thread, and cProfile records
+    whatever runs on it; the profiler is paused whenever another greenlet
+    is switched in, so the report only covers this request.
+    """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.started = time.perf_counter()
+        self.mongo_seconds = 0.0
+        self.mongo_commands = 0
+        self.templates = []
+        self._render_started = None
+        self._greenlet = None
+        self._previous_trace = None
+
+    def start(self):
+        """Start profiling the calling greenlet."""
+        self._greenlet = greenlet.getcurrent()
+        self._previous_trace = greenlet.settrace(self._switched)
+        self.profiler.enable()
+
+    def stop(self):
+        """Stop profiling and restore the thread's previous greenlet trace function."""
+        self.profiler.disable()
+        greenlet.settrace(self._previous_trace)
+
+    def _switched(self, event, args):
+        if event in ("switch", "throw"):
+            origin, target = args
+            if target is self._greenlet:
+                self.profiler.enable()
+            elif origin is self._greenlet:
+                self.profiler.disable()
+        if self._previous_trace is not None:
+            self._previous_trace(event, args)
+
+    def report(self, response):
+        """Render a plain-text report of the request."""
+        elapsed = time.perf_counter() - self.started
+        out = io.StringIO()
+        out.write(f"{request.method} {request.full_path.rstrip('?')} -> {response.status_code} "
+                  f"in {elapsed * 1000:.1f} ms\n")
+        out.write(f"MongoDB: {self.mongo_commands} commands, {self.mongo_seconds * 1000:.1f} ms\n")
+        rendered = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.templates)
+        out.write(f"Templates: {rendered or 'none'}\n\n")
+        pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        return out.getvalue()
+
+
+def _current_profile():
+    """Return the profile of the current request, if it is being profiled."""
+    return g.get("profile") if has_app_context() else None
+
+
+class MongoTimer(monitoring.CommandListener):
+    """PyMongo listener adding command round-trip time to the request being profiled."""
+
+    def started(self, event):
+        pass
+
+    def _finish(self, event):
+        profile = _current_profile()
+        if profile is not None:
+            profile.mongo_commands += 1
+            profile.mongo_seconds += event.duration_micros / 1e6
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+
+mongo_timer = MongoTimer()
+
+
+def _render_started(sender, template, context, **extra):
+    profile = _current_profile()
+    if profile is not None:
+        profile._render_started = time.perf_counter()
+
+
+def _render_finished(sender, template, context, **extra):
+    profile = _current_profile()
+    if profile is not None and profile._render_started is not None:
+        profile.templates.append((template.name, time.perf_counter() - profile._render_started))
+        profile._render_started = None
+
+
+def _requested(mongo):
+    """Return whether this request asked for profiling and is allowed to."""
+    token = request.headers.get(TOKEN_HEADER)
+    if token is not None:
+        return _valid_token(token)
+    return (
+        request.args.get(QUERY_FLAG) in ("1", "inline")
+        and current_user.is_authenticated
+        and is_admin(mongo.db, current_user.get_id())
+    )
+
+
+def _write_report(profile, report):
+    """Save the pstats dump and the text report in PROFILE_DIR; returns the dump's file name."""
+    directory = current_app.config["PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    stem = f"{datetime.now():%Y%m%d-%H%M%S}-{request.endpoint or 'unmatched'}-{os.getpid()}-{id(profile):x}"
+    path = os.path.join(directory, stem + ".prof")
+    profile.profiler.dump_stats(path)
+    with open(os.path.join(directory, stem + ".txt"), "w") as output:
+        output.write(report)
+    return os.path.basename(path)
+
+
+def init_profiler(app, mongo):
+    """Let signed or admin requests be profiled; costs one header and argument lookup otherwise."""
+
+    @app.before_request
+    def _start_profile():
+        if TOKEN_HEADER not in request.headers and QUERY_FLAG not in request.args:
+            return
+        if not _requested(mongo) or not _active.acquire(blocking=False):
+            return
+        g.profile = RequestProfile()
+        g.profile.start()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+        profile.stop()
+        _active.release()
+        report = profile.report(response)
+        if current_app.config["PROFILE_DIR"] and request.args.get(QUERY_FLAG) != "inline":
+            # Only the file name, so responses do not reveal the server's directory layout
+            response.headers["X-Profile-File"] = _write_report(profile, report)
+            return response
+        return Response(report, mimetype="text/plain")
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request does not run when the view raised
+        profile = g.pop("profile", None)
+        if profile is not None:
+            profile.stop()
+            _active.release()
+
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
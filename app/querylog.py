@@ -0,0 +1,90 @@
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, request
+from pymongo import monitoring
+
+
+# Lists receiving every recorded command, opened by capture_queries()
+_captures = []
+
+
+def command_collection(command_name, command):
+    """Return the collection a command targets, or '' for database commands."""
+    target = command.get("collection") if command_name == "getMore" else command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+
+def record(command_name, collection):
+    """Count one MongoDB round trip against the current request and any open captures."""
+    entry = (command_name, collection)
+    if has_app_context() and "queries" in g:
+        g.queries.append(entry)
+    for capture in _captures:
+        capture.append(entry)
+
+
+@contextmanager
+def capture_queries():
+    """Collect the (command, collection) pairs sent while the block runs."""
+    queries = []
+    _captures.append(queries)
+    try:
+        yield queries
+    finally:
+        _captures.remove(queries)
+
+
+class QueryLog(monitoring.CommandListener):
+    """PyMongo listener counting the commands each request sends."""
+
+    def started(self, event):
+        record(event.command_name, command_collection(event.command_name, event.command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+query_log = QueryLog()
+
+
+def query_budget(limit):
+    """Declare the most MongoDB round trips a view should need."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def describe(queries):
+    """Summarize recorded commands, most repeated first, e.g. '3x find expenses'."""
+    counts = Counter(queries).most_common()
+    return ", ".join(f"{count}x {command} {collection}".rstrip() for (command, collection), count in counts)
+
+
+def _start_request_log():
+    """Give the request an empty command list."""
+    g.queries = []
+
+
+def _check_budget(response):
+    """Warn when the request sent more commands than its view's budget."""
+    queries = g.pop("queries", None)
+    if queries is None or not current_app.config["QUERY_BUDGET_WARNINGS"]:
+        return response
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, "query_budget", current_app.config["QUERY_BUDGET_DEFAULT"])
+    if len(queries) > budget:
+        current_app.logger.warning(
+            "%s %s sent %d MongoDB commands (budget %d): %s",
+            request.method, request.path, len(queries), budget, describe(queries)
+        )
+    return response
+
+
+def init_query_log(app):
+    """Count the MongoDB commands of every request of the app."""
+    app.before_request(_start_request_log)
+    app.after_request(_check_budget)
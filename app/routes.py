@@ -1,14 +1,30 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask import render_template, redirect, url_for, flash, request, jsonify, abort, Response
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import app, mongo, login_manager
-import posthog
-from app.forms import LoginForm, RegistrationForm, ExpenseForm, BudgetSettingsForm
+from app import analytics, tracing
+from app.forms import LoginForm, RegistrationForm, ExpenseForm, ImportExpensesForm, BudgetSettingsForm
+from app.importer import import_expenses, detect_format, ImportFormatError
+from app.exporter import export_cursor, EXPORT_FORMATS
+from app.user_cache import get_user_settings, invalidate_user
+from app.metrics import registry
+from app.querylog import query_budget
+from app.tracing import span, breakdown, waterfall
+from app.admin import is_admin
 from app.models import User
+from app.pagination import fetch_expense_page
+from app.dates import to_datetime, format_date
+from app.goals import (
+    fetch_goal_expenses, compute_goal_totals, apply_goal_change, backfill_goal_totals,
+    detach_out_of_range_expenses
+)
+from app.aggregates import apply_expense_change, expense_write, get_user_totals, user_categories
+from app.summary_cache import cached_summary_window
 from bson.objectid import ObjectId
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from collections import defaultdict
+import codecs
+import csv
+import hmac
 import random
 
 
@@ -42,6 +58,12 @@ def get_random_fact():
     return random.choice(FINANCIAL_FACTS)
 
 
+@app.template_filter("isodate")
+def isodate_filter(value):
+    """Render an expense date as YYYY-MM-DD in templates."""
+    return format_date(value)
+
+
 @login_manager.user_loader
 def load_user(user_id):
     """Load a user from the database using the user ID."""
@@ -49,28 +71,71 @@ def load_user(user_id):
 
 
 def track_event(user_id, event_name, properties={}):
-    """Helper function to track events if PostHog is configured."""
-    if hasattr(posthog, 'api_key') and posthog.api_key:
-        posthog.capture(str(user_id), event_name, properties)
+    """Helper function to track events if PostHog is configured; never blocks the request."""
+    with span(f"track_event {event_name}", "analytics"):
+        analytics.track(user_id, event_name, properties)
+
+
+@app.route("/metrics")
+def metrics():
+    """Expose this worker's metrics in the Prometheus text format."""
+    token = app.config["METRICS_TOKEN"]
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(401)
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/admin/traces")
+@login_required
+def admin_traces():
+    """Show recent slow requests of this worker as span waterfalls (admins only)."""
+    if not is_admin(mongo.db, current_user.get_id()):
+        abort(404)
+    min_ms = request.args.get("min_ms", app.config["TRACE_SLOW_MS"], type=float)
+    traces = [
+        {**trace, "breakdown": breakdown(trace), "waterfall": waterfall(trace)}
+        for trace in reversed(tracing.recent)
+        if trace["duration_ms"] >= min_ms
+    ][:50]
+    return render_template("admin_traces.html", traces=traces, min_ms=min_ms)
 
 
 @app.route("/")
+@query_budget(3)
 @login_required
 def index():
-    """Render the index page with the user's expenses and total expenses."""
-    # Retrieve all expenses for the current user from the database
-    expenses = list(mongo.db.expenses.find({"user_id": current_user.get_id()}))
-    categories = mongo.db.expenses.distinct("category")
-    total_expenses = sum(expense["amount"] for expense in expenses)
-    
+    """Render the index page with a page of the user's expenses and total expenses."""
+    # Retrieve one page of expenses for the current user, newest first
+    try:
+        expenses, next_cursor = fetch_expense_page(
+            mongo.db.expenses,
+            current_user.get_id(),
+            cursor=request.args.get("cursor"),
+            page_size=app.config["EXPENSES_PAGE_SIZE"]
+        )
+    except ValueError:
+        abort(400)
+
     # Get user's savings goals for the dropdown
-    user_settings = mongo.db.users.find_one({"_id": ObjectId(current_user.get_id())})
-    
+    user_settings = get_user_settings(mongo.db, current_user.get_id())
+
     # Initialize goals as an empty list if user_settings is None
     goals = []
     if user_settings:
-        goals = user_settings.get("savings_goals", [])
-    
+        goals = backfill_goal_totals(mongo.db, current_user.get_id(), user_settings.get("savings_goals", []))
+
+    # "Load more" requests only need the next batch of rows
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({
+            "html": render_template("_expense_rows.html", expenses=expenses, goals=goals),
+            "next_cursor": next_cursor
+        })
+
+    # Headline total and category set both come from the maintained totals document
+    totals = get_user_totals(mongo.db, current_user.get_id())
+    categories = user_categories(totals)
+    total_expenses = totals["total"]
+
     # Create an instance of the ExpenseForm for adding new expenses
     form = ExpenseForm()
     
@@ -81,7 +146,9 @@ def index():
     return render_template(
         "index.html",
         form=form,
+        import_form=ImportExpensesForm(),
         expenses=expenses,
+        next_cursor=next_cursor,
         total_expenses=total_expenses,
         categories=categories,
         goals=goals,
@@ -169,22 +236,21 @@ def add_expense():
             "description": form.description.data,
             "amount": float(form.amount.data),
             "category": form.category.data,
-            "date": str(form.date.data),
+            "date": to_datetime(form.date.data),
         }
         
         # Add goal_id if provided and category is Savings or Investments
         if goal_id and form.category.data in ["Savings", "Investments"]:
-            # Get the goal details
-            user_settings = mongo.db.users.find_one({"_id": ObjectId(current_user.get_id())})
+            # Get the goal details; another worker may have just changed its dates
+            user_settings = get_user_settings(mongo.db, current_user.get_id(), fresh=True)
             if user_settings and "savings_goals" in user_settings:
                 goal = next((g for g in user_settings["savings_goals"] if g["goal_id"] == goal_id), None)
                 if goal:
                     # Check if expense date is within goal date range
-                    expense_date = datetime.strptime(str(form.date.data), '%Y-%m-%d')
-                    goal_start = datetime.strptime(goal["start_date"], '%Y-%m-%d')
-                    goal_end = datetime.strptime(goal["end_date"], '%Y-%m-%d')
+                    goal_start = to_datetime(goal["start_date"])
+                    goal_end = to_datetime(goal["end_date"])
                     
-                    if goal_start <= expense_date <= goal_end:
+                    if goal_start <= expense_data["date"] <= goal_end:
                         expense_data["goal_id"] = goal_id
                     else:
                         error_msg = f"Expense date must be between {goal['start_date']} and {goal['end_date']} for this goal"
@@ -197,7 +263,10 @@ def add_expense():
                         return redirect(url_for("index"))
         
         # Insert the new expense into the database
-        mongo.db.expenses.insert_one(expense_data)
+        with expense_write(mongo.db, current_user.get_id()):
+            mongo.db.expenses.insert_one(expense_data)
+            apply_expense_change(mongo.db, current_user.get_id(), new=expense_data)
+        apply_goal_change(mongo.db, current_user.get_id(), new=expense_data)
         
         track_event(current_user.get_id(), 'expense_added', {
             'amount': expense_data['amount'],
@@ -239,24 +308,31 @@ def edit_expense(expense_id):
     goal_id = request.form.get("goal_id", "")
     
     # Prepare the updated expense data
+    try:
+        expense_date = to_datetime(request.form["date"])
+    except ValueError:
+        error_msg = "Please check your input and try again."
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({"success": False, "message": error_msg}), 400
+        flash(error_msg, "error")
+        return redirect(url_for("index"))
     updated_expense = {
         "description": request.form["description"],
         "amount": float(request.form["amount"]),
         "category": request.form["category"],
-        "date": request.form["date"],
+        "date": expense_date,
     }
     
     # Add goal_id if provided and category is Savings or Investments
     if goal_id and request.form["category"] in ["Savings", "Investments"]:
-        # Get the goal details
-        user_settings = mongo.db.users.find_one({"_id": ObjectId(current_user.get_id())})
+        # Get the goal details; another worker may have just changed its dates
+        user_settings = get_user_settings(mongo.db, current_user.get_id(), fresh=True)
         if user_settings and "savings_goals" in user_settings:
             goal = next((g for g in user_settings["savings_goals"] if g["goal_id"] == goal_id), None)
             if goal:
                 # Check if expense date is within goal date range
-                expense_date = datetime.strptime(updated_expense["date"], '%Y-%m-%d')
-                goal_start = datetime.strptime(goal["start_date"], '%Y-%m-%d')
-                goal_end = datetime.strptime(goal["end_date"], '%Y-%m-%d')
+                goal_start = to_datetime(goal["start_date"])
+                goal_end = to_datetime(goal["end_date"])
                 
                 if goal_start <= expense_date <= goal_end:
                     updated_expense["goal_id"] = goal_id
@@ -270,22 +346,24 @@ def edit_expense(expense_id):
                     flash(error_msg, "error")
                     return redirect(url_for("index"))
     
-    # Update the expense in the database
+    # Update the expense in the database, keeping the previous version for the totals
     if "goal_id" in updated_expense:
         # If goal_id is valid and date is within range, update with new goal_id
-        mongo.db.expenses.update_one(
-            {"_id": ObjectId(expense_id), "user_id": current_user.get_id()},
-            {"$set": updated_expense}
-        )
+        update = {"$set": updated_expense}
     else:
         # If no valid goal_id, remove goal_id if it exists
-        mongo.db.expenses.update_one(
-            {"_id": ObjectId(expense_id), "user_id": current_user.get_id()},
-            {
-                "$set": updated_expense,
-                "$unset": {"goal_id": ""}
-            }
+        update = {
+            "$set": updated_expense,
+            "$unset": {"goal_id": ""}
+        }
+    with expense_write(mongo.db, current_user.get_id()):
+        old_expense = mongo.db.expenses.find_one_and_update(
+            {"_id": ObjectId(expense_id), "user_id": current_user.get_id()}, update
         )
+        if old_expense:
+            apply_expense_change(mongo.db, current_user.get_id(), old=old_expense, new=updated_expense)
+    if old_expense:
+        apply_goal_change(mongo.db, current_user.get_id(), old=old_expense, new=updated_expense)
     
     success_msg = "Expense updated successfully!"
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -299,23 +377,97 @@ def edit_expense(expense_id):
 def delete_expense(expense_id):
     """Delete an expense from the database."""
     # Remove the expense from the database
-    mongo.db.expenses.delete_one(
-        {"_id": ObjectId(expense_id), "user_id": current_user.get_id()}
-    )
+    with expense_write(mongo.db, current_user.get_id()):
+        deleted_expense = mongo.db.expenses.find_one_and_delete(
+            {"_id": ObjectId(expense_id), "user_id": current_user.get_id()}
+        )
+        if deleted_expense:
+            apply_expense_change(mongo.db, current_user.get_id(), old=deleted_expense)
+    if deleted_expense:
+        apply_goal_change(mongo.db, current_user.get_id(), old=deleted_expense)
     flash("Expense deleted successfully!")  # Flash a success message
     return redirect(url_for("index"))  # Redirect to the index page
 
 
+@app.route("/import_expenses", methods=["POST"])
+@login_required
+def import_expenses_route():
+    """Import expenses from an uploaded CSV, OFX or QIF file and report the outcome."""
+    form = ImportExpensesForm()
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    if not form.validate_on_submit():
+        message = "; ".join(error for errors in form.errors.values() for error in errors)
+        if is_ajax:
+            return jsonify({"success": False, "message": message}), 400
+        flash(message, "error")
+        return redirect(url_for("index"))
+
+    upload = form.file.data
+    try:
+        # The upload is decoded and parsed as it is read, never loaded whole. A codec reader
+        # is used because TextIOWrapper needs readable(), which SpooledTemporaryFile (where
+        # Werkzeug keeps uploads) only has from Python 3.11 on
+        report = import_expenses(
+            mongo.db,
+            current_user.get_id(),
+            codecs.getreader("utf-8-sig")(upload.stream, errors="replace"),
+            detect_format(upload.filename),
+            batch_size=app.config["IMPORT_BATCH_SIZE"],
+            default_category=form.default_category.data
+        )
+    except (ImportFormatError, csv.Error) as exc:
+        if is_ajax:
+            return jsonify({"success": False, "message": str(exc)}), 400
+        flash(str(exc), "error")
+        return redirect(url_for("index"))
+
+    track_event(current_user.get_id(), 'expenses_imported', {
+        'inserted': report['inserted'],
+        'errors': report['error_count']
+    })
+
+    message = f"Imported {report['inserted']} expenses"
+    if report["error_count"]:
+        message += f", {report['error_count']} rows had errors"
+    if report["skipped"]:
+        message += f", {report['skipped']} credits skipped"
+    if is_ajax:
+        return jsonify({"success": True, "message": message, **report})
+    flash(message)
+    return redirect(url_for("index"))
+
+
+@app.route("/export_expenses")
+@login_required
+def export_expenses():
+    """Stream the user's full expense history as a CSV or NDJSON download."""
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    generate, mimetype = EXPORT_FORMATS[fmt]
+
+    # Rows are encoded as the cursor yields them, so memory stays flat for any history size
+    expenses = export_cursor(mongo.db, current_user.get_id(), batch_size=app.config["EXPORT_BATCH_SIZE"])
+    filename = f"expenses-{datetime.now().strftime('%Y-%m-%d')}.{fmt}"
+    track_event(current_user.get_id(), 'expenses_exported', {'format': fmt})
+    return Response(
+        generate(expenses),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
 @app.route("/summary")
+@query_budget(3)
 @login_required
 def summary():
     """Render the summary page with financial analytics."""
-    # Retrieve all expenses for the current user from the database
-    expenses = list(mongo.db.expenses.find({"user_id": current_user.get_id()}))
-    total_expenses = sum(e['amount'] for e in expenses)  # Calculate total expenses
+    # Headline numbers come from the maintained totals document
+    totals = get_user_totals(mongo.db, current_user.get_id())
+    total_expenses = totals["total"]
     
     # Fetch user-defined budget settings
-    user_settings = mongo.db.users.find_one({"_id": ObjectId(current_user.get_id())})
+    user_settings = get_user_settings(mongo.db, current_user.get_id())
     
     # Handle case when user_settings is None
     if user_settings is None:
@@ -323,75 +475,10 @@ def summary():
     else:
         budget_settings = user_settings.get("budget_settings", {"needs": 50, "wants": 20, "savings": 20, "investments": 10})
 
-    # Define the date range for the summary (last 12 months)
-    end_date = datetime.now()
-    start_date = end_date - relativedelta(months=11)
-    
-    # Filter recent expenses within the last 12 months
-    recent_expenses = [
-        expense for expense in expenses 
-        if datetime.strptime(expense['date'], '%Y-%m-%d') >= start_date
-    ]
-    # Calculate the monthly average of recent expenses
-    monthly_average = sum(e['amount'] for e in recent_expenses) / 12
-
-    # Initialize a dictionary to hold monthly totals
-    monthly_totals = {}
-    current_date = start_date
-    # Populate the monthly_totals dictionary with keys for each month
-    while current_date <= end_date:
-        month_key = current_date.strftime('%Y-%m')
-        monthly_totals[month_key] = 0.0  # Initialize each month's total to 0.0
-        current_date += relativedelta(months=1)
-    
-    # Calculate total expenses for each month
-    for expense in expenses:
-        date_obj = datetime.strptime(expense['date'], '%Y-%m-%d')
-        if start_date <= date_obj <= end_date:  # Check if the expense is within the date range
-            month_key = date_obj.strftime('%Y-%m')
-            monthly_totals[month_key] += expense['amount']  # Accumulate the amount for the month
-    
-    sorted_months = sorted(monthly_totals.keys())  # Sort the months for display
-    
-    # Prepare time data for rendering in the template
-    time_data = {
-        "labels": [datetime.strptime(m, '%Y-%m').strftime('%B %Y') for m in sorted_months],
-        "values": [monthly_totals[m] for m in sorted_months]
-    }
-    
-    # Organize expenses by category for further analysis
-    expenses_by_category = defaultdict(list)
-    
-    for expense in expenses:
-        date_obj = datetime.strptime(expense['date'], '%Y-%m-%d')
-        category = expense['category']
-        amount = expense['amount']
-        expenses_by_category[category].append({
-            'date': date_obj.strftime('%Y-%m-%d'),
-            'amount': amount
-        })
-    
-    # Prepare category data for rendering in the template
-    category_data = {
-        "labels": [],
-        "values": [],
-        "dates": [],
-        "monthly_data": {}  
-    }
-    
-    # Calculate totals for each category
-    for category, expense_list in expenses_by_category.items():
-        monthly_totals = defaultdict(float)  # Initialize monthly totals for the category
-        for expense in expense_list:
-            date = datetime.strptime(expense['date'], '%Y-%m-%d')
-            month_key = date.strftime('%Y-%m')
-            monthly_totals[month_key] += expense['amount']  # Accumulate the amount for the month
-        
-        # Append category data for rendering
-        category_data["labels"].append(category)
-        category_data["values"].append(sum(expense['amount'] for expense in expense_list))
-        category_data["dates"].extend([expense['date'] for expense in expense_list])
-        category_data["monthly_data"][category] = dict(monthly_totals)
+    # Calculate the monthly average over the last 12 months from the rollups;
+    # the charts fetch their own windows from summary_data()
+    window = cached_summary_window(mongo.db, current_user.get_id(), totals, 12)
+    monthly_average = sum(window["time"]["values"]) / 12
 
     # Get a random financial fact
     financial_fact = get_random_fact()
@@ -401,13 +488,29 @@ def summary():
         "summary.html",
         total_expenses=total_expenses,
         monthly_average=monthly_average,
-        time_data=time_data,
-        category_data=category_data,
         budget_settings=budget_settings,
         financial_fact=financial_fact
     )
 
 
+@app.route("/summary/data")
+@query_budget(3)
+@login_required
+def summary_data():
+    """Return pre-aggregated chart series for the requested number of months."""
+    months = request.args.get("months", 12, type=int)
+    if not 1 <= months <= app.config["SUMMARY_MAX_MONTHS"]:
+        return jsonify({
+            "success": False,
+            "message": f"months must be between 1 and {app.config['SUMMARY_MAX_MONTHS']}"
+        }), 400
+
+    # Make sure the user's rollups exist before reading them; the totals also carry the
+    # data version the cached series are keyed by
+    totals = get_user_totals(mongo.db, current_user.get_id())
+    return jsonify(cached_summary_window(mongo.db, current_user.get_id(), totals, months))
+
+
 @app.route("/budget_settings", methods=["GET", "POST"])
 @login_required
 def budget_settings():
@@ -438,11 +541,12 @@ def budget_settings():
             }},
             upsert=True  # Create the document if it doesn't exist
         )
+        invalidate_user(mongo.db, current_user.get_id())
         flash("Budget settings updated successfully!", "success")
         return redirect(url_for("index"))
 
     # Load current settings if they exist
-    user_settings = mongo.db.users.find_one({"_id": ObjectId(current_user.get_id())})
+    user_settings = get_user_settings(mongo.db, current_user.get_id())
     
     # Set default values if user_settings is None or budget_settings is not present
     if user_settings is None or "budget_settings" not in user_settings:
@@ -466,7 +570,8 @@ def budget_settings():
 @login_required
 def set_savings_goal():
     """Render the savings goals page and handle submissions."""
-    user_settings = mongo.db.users.find_one({"_id": ObjectId(current_user.get_id())})
+    # Submissions act on the stored goals, so they bypass the worker cache
+    user_settings = get_user_settings(mongo.db, current_user.get_id(), fresh=request.method == "POST")
 
     # Initialize savings_goals as an empty list if user_settings is None
     if user_settings is None:
@@ -477,6 +582,7 @@ def set_savings_goal():
             "savings_goals": [],
             "created_at": datetime.now()
         })
+        invalidate_user(mongo.db, current_user.get_id())
     else:
         # Retrieve savings goals
         savings_goals = user_settings.get("savings_goals", [])
@@ -502,40 +608,47 @@ def set_savings_goal():
                 "goal_amount": goal_amount,
                 "start_date": start_date,
                 "end_date": end_date,
-                "created_at": datetime.now().strftime('%Y-%m-%d')
+                "created_at": datetime.now().strftime('%Y-%m-%d'),
+                "allocated_total": 0.0
             }
             
-            # If editing, remove old goal first and update expenses
+            # If editing, update the goal in place and detach out-of-range expenses
+            old_goal = None
+            detached_count = 0
             if action == "edit_goal" and goal_id:
                 old_goal = next((g for g in savings_goals if g.get("goal_id") == goal_id), None)
                 if old_goal:
                     # Check if date range changed
                     if (old_goal["start_date"] != start_date or old_goal["end_date"] != end_date):
                         # Remove goal_id from expenses that are now outside the date range
-                        new_start = datetime.strptime(start_date, '%Y-%m-%d')
-                        new_end = datetime.strptime(end_date, '%Y-%m-%d')
-                        
-                        # Update all expenses with this goal_id
-                        expenses = mongo.db.expenses.find({"user_id": current_user.get_id(), "goal_id": goal_id})
-                        for expense in expenses:
-                            expense_date = datetime.strptime(expense["date"], '%Y-%m-%d')
-                            if not (new_start <= expense_date <= new_end):
-                                # Remove goal_id if expense is outside new date range
-                                mongo.db.expenses.update_one(
-                                    {"_id": expense["_id"]},
-                                    {"$unset": {"goal_id": ""}}
-                                )
-                
-                savings_goals = [g for g in savings_goals if g.get("goal_id") != goal_id]
-            
-            # Add the new/updated goal
-            savings_goals.append(new_goal)
-            
-            # Update the savings goals in the database
-            mongo.db.users.update_one(
-                {"_id": ObjectId(current_user.get_id())},
-                {"$set": {"savings_goals": savings_goals}}
-            )
+                        detached_count = detach_out_of_range_expenses(
+                            mongo.db, current_user.get_id(), goal_id, start_date, end_date
+                        )
+
+            if old_goal:
+                # Update the goal's fields in place so concurrent counter increments are kept
+                goal_update = {
+                    "savings_goals.$.goal_name": goal_name,
+                    "savings_goals.$.goal_amount": goal_amount,
+                    "savings_goals.$.start_date": start_date,
+                    "savings_goals.$.end_date": end_date
+                }
+                # A new date range changes which expenses count towards the goal
+                if (old_goal["start_date"] != start_date or old_goal["end_date"] != end_date
+                        or "allocated_total" not in old_goal):
+                    goal_totals = compute_goal_totals(mongo.db, current_user.get_id(), [new_goal])
+                    goal_update["savings_goals.$.allocated_total"] = goal_totals.get(goal_id, 0.0)
+                mongo.db.users.update_one(
+                    {"_id": ObjectId(current_user.get_id()), "savings_goals.goal_id": goal_id},
+                    {"$set": goal_update}
+                )
+            else:
+                # Add the new goal
+                mongo.db.users.update_one(
+                    {"_id": ObjectId(current_user.get_id())},
+                    {"$push": {"savings_goals": new_goal}}
+                )
+            invalidate_user(mongo.db, current_user.get_id())
             
             track_event(current_user.get_id(), 'goal_created' if action == "add_goal" else 'goal_updated', {
                 'goal_amount': new_goal['goal_amount'],
@@ -543,7 +656,11 @@ def set_savings_goal():
                                 datetime.strptime(new_goal['start_date'], '%Y-%m-%d')).days
             })
             
-            flash("Savings goal saved successfully!", "success")
+            if detached_count:
+                flash(f"Savings goal saved successfully! {detached_count} expense(s) outside the new dates "
+                      "are no longer allocated to it.", "success")
+            else:
+                flash("Savings goal saved successfully!", "success")
             return redirect(url_for("set_savings_goal"))
             
         elif action == "delete_goal":
@@ -556,37 +673,25 @@ def set_savings_goal():
                 )
                 
                 # Remove the goal with the specified ID
-                savings_goals = [goal for goal in savings_goals if goal.get("goal_id") != goal_id]
-                
-                # Update the database
                 mongo.db.users.update_one(
                     {"_id": ObjectId(current_user.get_id())},
-                    {"$set": {"savings_goals": savings_goals}}
+                    {"$pull": {"savings_goals": {"goal_id": goal_id}}}
                 )
+                invalidate_user(mongo.db, current_user.get_id())
                 
                 flash("Goal deleted successfully!", "success")
                 return redirect(url_for("set_savings_goal"))
 
+    # Progress comes from each goal's maintained allocated total
+    backfill_goal_totals(mongo.db, current_user.get_id(), savings_goals)
+
+    # Get the expenses allocated to every goal, within each goal's date range, in one query
+    expenses_by_goal = fetch_goal_expenses(mongo.db, current_user.get_id(), savings_goals)
+
     # Process each goal to calculate progress
     for goal in savings_goals:
-        goal_id = goal.get("goal_id", "")
         goal_amount = goal.get("goal_amount", 0)
-        start_date = goal.get("start_date", "")
-        end_date = goal.get("end_date", "")
-        
-        # Get all expenses allocated to this specific goal
-        goal_expenses = list(mongo.db.expenses.find({
-            "user_id": str(current_user.get_id()), 
-            "category": {"$in": ["Savings", "Investments"]},
-            "goal_id": goal_id  # Only get expenses explicitly allocated to this goal
-        }).sort("date", 1))  # Sort by date ascending
-        
-        # Filter expenses within the goal date range
-        if start_date and end_date:
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-            goal_expenses = [expense for expense in goal_expenses if 
-                           start_date_obj <= datetime.strptime(expense['date'], '%Y-%m-%d') <= end_date_obj]
+        goal_expenses = expenses_by_goal.get(goal.get("goal_id", ""), [])
 
         # Prepare savings data for the chart
         savings_data = {
@@ -594,14 +699,15 @@ def set_savings_goal():
             "cumulative_amounts": []
         }
         
-        # Calculate cumulative savings
-        total_savings = 0
+        # Calculate cumulative savings for the chart
+        cumulative = 0
         for expense in goal_expenses:
-            total_savings += expense['amount']
-            savings_data['dates'].append(expense['date'])
-            savings_data['cumulative_amounts'].append(total_savings)
+            cumulative += expense['amount']
+            savings_data['dates'].append(format_date(expense['date']))
+            savings_data['cumulative_amounts'].append(cumulative)
 
         # Calculate progress towards the savings goal
+        total_savings = goal["allocated_total"]
         progress = (total_savings / goal_amount * 100) if goal_amount > 0 else 0
         
         # Add goal data for the template
@@ -653,6 +759,7 @@ def onboarding_step1():
                 }
             }}
         )
+        invalidate_user(mongo.db, current_user.get_id())
         
         # Check if this is an AJAX request
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -681,17 +788,27 @@ def onboarding_step2():
             flash("Please fill in all required fields.", "error")
             return redirect(url_for("onboarding"))
         
+        try:
+            expense_date = to_datetime(date_str)
+        except ValueError:
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return jsonify({"success": False, "message": "Please enter a valid date."})
+            flash("Please enter a valid date.", "error")
+            return redirect(url_for("onboarding"))
+
         # Create expense object
         first_expense = {
             "description": description,
             "amount": amount,
             "category": category,
             "user_id": current_user.get_id(),
-            "date": date_str
+            "date": expense_date
         }
         
         # Save to database
-        mongo.db.expenses.insert_one(first_expense)
+        with expense_write(mongo.db, current_user.get_id()):
+            mongo.db.expenses.insert_one(first_expense)
+            apply_expense_change(mongo.db, current_user.get_id(), new=first_expense)
         
         # Check if this is an AJAX request
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -719,32 +836,22 @@ def onboarding_step3():
             "goal_amount": goal_amount,
             "start_date": start_date,
             "end_date": end_date,
-            "created_at": datetime.now().strftime('%Y-%m-%d')
+            "created_at": datetime.now().strftime('%Y-%m-%d'),
+            "allocated_total": 0.0
         }
         
-        # Check if user document exists
-        user_exists = mongo.db.users.find_one({"_id": ObjectId(current_user.get_id())})
-        
-        if user_exists:
-            # Update the savings goals in the database
-            mongo.db.users.update_one(
-                {"_id": ObjectId(current_user.get_id())},
-                {"$push": {"savings_goals": new_goal}}
-            )
-        else:
-            # Create a new user document with the savings goal
-            mongo.db.users.insert_one({
-                "_id": ObjectId(current_user.get_id()),
-                "savings_goals": [new_goal],
-                "onboarding_complete": True,
-                "created_at": datetime.now()
-            })
-
-        # Mark onboarding as complete
+        # Save the goal and mark onboarding as complete in one write,
+        # creating the user document if it does not exist yet
         mongo.db.users.update_one(
             {"_id": ObjectId(current_user.get_id())},
-            {"$set": {"onboarding_complete": True}}
+            {
+                "$push": {"savings_goals": new_goal},
+                "$set": {"onboarding_complete": True},
+                "$setOnInsert": {"created_at": datetime.now()}
+            },
+            upsert=True
         )
+        invalidate_user(mongo.db, current_user.get_id())
 
         flash("Onboarding completed successfully!", "success")
         return redirect(url_for("index"))  # Redirect to the main dashboard
@@ -789,6 +896,7 @@ def set_budget():
                 "budget_categories": budget_settings
             }}
         )
+        invalidate_user(mongo.db, current_user.get_id())
         
         # Check if this is from onboarding
         from_onboarding = request.form.get("from_onboarding") == "true"
@@ -814,6 +922,7 @@ def restart_onboarding():
         {"_id": ObjectId(current_user.get_id())},
         {"$set": {"onboarding_complete": False}}
     )
+    invalidate_user(mongo.db, current_user.get_id())
     
     flash("Onboarding process restarted. Let's set up your profile again.", "info")
     return redirect(url_for("onboarding"))
\ No newline at end of file
@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from datetime import datetime
+from werkzeug.utils import import_string
+from app.aggregates import summary_window
+from app.lru import LRUCache, MISSING
+
+
+class LocalBackend:
+    """In-memory stand-in for a shared cache such as Redis or memcached.
+
+    Shared backends store serialized values with a time-to-live and return
+    None on a miss; this one keeps the JSON text in a dict so tests exercise
+    the same round trip.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value stored under ``key``, or None if absent or expired."""
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._values.pop(key, None)
+                return None
+        return json.loads(entry[1])
+
+    def set(self, key, value, ttl):
+        """Store a JSON-serializable value for ``ttl`` seconds."""
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl, json.dumps(value))
+
+
+class SummaryCache:
+    """Two-tier cache of summary chart series: a per-worker LRU in front of an optional shared backend.
+
+    Keys embed the user's data version, so writes never need to delete
+    entries; stale versions are simply no longer looked up and expire.
+    """
+
+    def __init__(self, max_size=1024, ttl=300, backend=None):
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for ``key``, or None."""
+        value = self.local.get(key)
+        if value is MISSING and self.backend is not None:
+            value = self.backend.get(key)
+            if value is not None:
+                self.local.set(key, value)
+            else:
+                value = MISSING
+        # The tiers do their own locking; the counters span both, so they get a lock of their own
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store a value in both tiers."""
+        self.local.set(key, value)
+        if self.backend is not None:
+            self.backend.set(key, value, self.local.ttl)
+
+    def clear(self):
+        """Drop the worker's entries and reset the hit counters; the shared backend is left alone."""
+        self.local.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+cache = SummaryCache()
+
+
+def init_summary_cache(app):
+    """Size the worker cache and connect the shared backend named by SUMMARY_CACHE_BACKEND.
+
+    The setting is an import path to a callable taking the app and returning
+    an object with ``get(key)`` and ``set(key, value, ttl)``.
+    """
+    cache.local.max_size = app.config["SUMMARY_CACHE_SIZE"]
+    cache.local.ttl = app.config["SUMMARY_CACHE_TTL"]
+    factory = app.config["SUMMARY_CACHE_BACKEND"]
+    cache.backend = import_string(factory)(app) if factory else None
+    cache.clear()
+
+
+def cached_summary_window(db, user_id, totals, months, today=None):
+    """Return summary_window(), reusing the result while the user's data version and month are unchanged.
+
+    ``totals`` is the user's totals document from get_user_totals(), which
+    carries the data version bumped by every expense write. Nothing is cached
+    while the user's aggregates are being rebuilt.
+    """
+    today = today or datetime.now()
+    if totals.get("rebuilding"):
+        return summary_window(db, user_id, months, today)
+    key = f"summary:{user_id}:{totals.get('data_version', 0)}:{today:%Y-%m}:{months}"
+    window = cache.get(key)
+    if window is None:
+        window = summary_window(db, user_id, months, today)
+        cache.set(key, window)
+    return window
@@ -0,0 +1,206 @@
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from flask import (
+    current_app, g, has_app_context, request, request_started, request_finished,
+    before_render_template, template_rendered
+)
+from pymongo import monitoring
+from app.querylog import command_collection
+
+
+# Spans kept per trace; bulk imports validate one form per row
+MAX_SPANS = 500
+
+# Most recent finished traces, newest last; resized by init_tracing()
+recent = deque(maxlen=200)
+
+_file_lock = threading.Lock()
+
+
+class Trace:
+    """Timed spans of one request, measured from when it started."""
+
+    def __init__(self, method, path):
+        self.trace_id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.start = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.spans = []
+        self.dropped = 0
+
+    def add(self, name, kind, started, finished, **attributes):
+        """Record a span between two perf_counter() readings."""
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped += 1
+            return
+        self.spans.append({
+            "name": name,
+            "kind": kind,
+            "start_ms": round((started - self.started) * 1000, 3),
+            "duration_ms": round((finished - started) * 1000, 3),
+            "attributes": attributes,
+        })
+
+    def finish(self, endpoint, status):
+        """Return the finished trace as a JSON-serializable dict."""
+        return {
+            "trace_id": self.trace_id,
+            "method": self.method,
+            "path": self.path,
+            "endpoint": endpoint,
+            "status": status,
+            "start": self.start.isoformat(),
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+            "dropped_spans": self.dropped,
+        }
+
+
+def current_trace():
+    """Return the trace of the current request, if it is being traced."""
+    return g.get("trace") if has_app_context() else None
+
+
+@contextmanager
+def span(name, kind, **attributes):
+    """Time the enclosed block as a span of the current request's trace."""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, kind, started, time.perf_counter(), **attributes)
+
+
+def breakdown(trace):
+    """Split a finished trace's view time into MongoDB, template, form and remaining Python time."""
+    totals = {"mongo": 0.0, "template": 0.0, "form": 0.0, "analytics": 0.0}
+    view = 0.0
+    for item in trace["spans"]:
+        if item["kind"] == "view":
+            view += item["duration_ms"]
+        elif item["kind"] in totals:
+            totals[item["kind"]] += item["duration_ms"]
+    totals["python"] = max(view - sum(totals.values()), 0.0)
+    return totals
+
+
+def waterfall(trace):
+    """Return the spans of a finished trace with their bar offset and width in percent."""
+    total = trace["duration_ms"] or 1.0
+    return [
+        {**item, "left": item["start_ms"] / total * 100, "width": max(item["duration_ms"] / total * 100, 0.2)}
+        for item in trace["spans"]
+    ]
+
+
+class MongoSpans(monitoring.CommandListener):
+    """PyMongo listener adding a span per command to the current request's trace."""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        trace = current_trace()
+        if trace is not None:
+            self._pending[(event.connection_id, event.request_id)] = (
+                trace, time.perf_counter(), command_collection(event.command_name, event.command)
+            )
+
+    def _finish(self, event, outcome):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        trace, started, collection = pending
+        name = f"{event.command_name} {collection}".rstrip()
+        trace.add(name, "mongo", started, started + event.duration_micros / 1e6, outcome=outcome)
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+
+mongo_spans = MongoSpans()
+
+
+def _begin_trace(sender, **extra):
+    if sender.config["TRACING_ENABLED"]:
+        g.trace = Trace(request.method, request.path)
+
+
+def _begin_view():
+    trace = current_trace()
+    if trace is not None:
+        trace.view_started = time.perf_counter()
+
+
+def _end_view(response):
+    trace = current_trace()
+    if trace is not None and trace.view_started is not None:
+        trace.add(f"view {request.endpoint}", "view", trace.view_started, time.perf_counter())
+    return response
+
+
+def _render_started(sender, template, context, **extra):
+    trace = current_trace()
+    if trace is not None:
+        g.render_started = time.perf_counter()
+
+
+def _render_finished(sender, template, context, **extra):
+    trace = current_trace()
+    started = g.pop("render_started", None)
+    if trace is not None and started is not None:
+        trace.add(f"render {template.name}", "template", started, time.perf_counter())
+
+
+def _export(finished):
+    """Keep a finished trace in the ring buffer and append it to TRACE_FILE if set."""
+    recent.append(finished)
+    path = current_app.config["TRACE_FILE"]
+    if path:
+        line = json.dumps(finished) + "\n"
+        with _file_lock, open(path, "a") as output:
+            output.write(line)
+
+
+def _end_trace(sender, response, **extra):
+    trace = g.pop("trace", None)
+    if trace is not None:
+        _export(trace.finish(request.endpoint, response.status_code))
+
+
+def _abandon_trace(exc):
+    # request_finished is not sent when the request failed
+    trace = g.pop("trace", None)
+    if trace is not None:
+        _export(trace.finish(request.endpoint, 500))
+
+
+def init_tracing(app):
+    """Trace every request of the app; call after the other request hooks are registered.
+
+    The view span covers the time between this module's before_request and
+    after_request hooks, so registering them last keeps the other hooks out of it.
+    """
+    global recent
+    recent = deque(recent, maxlen=app.config["TRACE_BUFFER_SIZE"])
+    request_started.connect(_begin_trace, app)
+    app.before_request(_begin_view)
+    app.after_request(_end_view)
+    request_finished.connect(_end_trace, app)
+    app.teardown_request(_abandon_trace)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
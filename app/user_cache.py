@@ -0,0 +1,94 @@
+from bson.objectid import ObjectId
+from flask import g, has_app_context, has_request_context, session
+from pymongo import ReturnDocument
+from app.lru import LRUCache, MISSING as _MISSING
+
+
+# Fields never kept in memory
+_PROJECTION = {"password": 0}
+
+# Session key holding {user_id: settings_version} as of the session's last write
+SESSION_KEY = "settings_versions"
+
+
+class UserSettingsCache(LRUCache):
+    """LRU of user settings documents with a time-to-live, keyed by user and settings version.
+
+    Every write to a users document increments its ``settings_version`` and
+    records the new value in the writer's session. Requests from that
+    session then look the user up under the new version, so no worker can
+    serve them a document from before their own write. Other sessions of
+    the same user may see a document up to ``ttl`` seconds old.
+    """
+
+
+cache = UserSettingsCache()
+
+
+def _reset_request_memo():
+    """Start every request with an empty memo, even if the app context is reused."""
+    g.user_settings = {}
+
+
+def init_user_cache(app):
+    """Size the worker cache from the app config and reset the request memo per request."""
+    cache.max_size = app.config["USER_CACHE_SIZE"]
+    cache.ttl = app.config["USER_CACHE_TTL"]
+    cache.clear()
+    app.before_request(_reset_request_memo)
+
+
+def _request_memo():
+    """Return the per-request {user_id: document} memo, or None outside an app context."""
+    if not has_app_context():
+        return None
+    if "user_settings" not in g:
+        g.user_settings = {}
+    return g.user_settings
+
+
+def _cache_key(user_id):
+    """Return the worker cache key of a user as seen by the current session."""
+    versions = session.get(SESSION_KEY, {}) if has_request_context() else {}
+    return user_id, versions.get(user_id, 0)
+
+
+def get_user_settings(db, user_id, fresh=False):
+    """Return a user's settings document (None if it does not exist).
+
+    The document is memoized for the rest of the request and kept in the
+    worker cache for later requests. Pass ``fresh=True`` on write paths that
+    make decisions based on the stored document, to skip the worker cache.
+    """
+    memo = _request_memo()
+    if memo is not None and user_id in memo:
+        return memo[user_id]
+
+    key = _cache_key(user_id)
+    document = _MISSING if fresh else cache.get(key)
+    if document is _MISSING:
+        document = db.users.find_one({"_id": ObjectId(user_id)}, _PROJECTION)
+        cache.set(key, document)
+    if memo is not None:
+        memo[user_id] = document
+    return document
+
+
+def invalidate_user(db, user_id):
+    """Forget a user's cached settings in every worker; call after every write to their users document.
+
+    Bumps the document's settings version and records it in the session, so
+    the session's next request misses the cache whichever worker serves it.
+    """
+    cache.invalidate(_cache_key(user_id))
+    document = db.users.find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$inc": {"settings_version": 1}},
+        projection={"settings_version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if document is not None and has_request_context():
+        session[SESSION_KEY] = {user_id: document["settings_version"]}
+    memo = _request_memo()
+    if memo is not None:
+        memo.pop(user_id, None)
@@ -0,0 +1,88 @@
+"""Timings of the hot routes against a generated dataset.
+
+Save a baseline, then compare later runs against it:
+    pytest -c benchmarks/pytest.ini benchmarks/ --benchmark-save=mongomock-1k
+    pytest -c benchmarks/pytest.ini benchmarks/ --benchmark-compare --benchmark-compare-fail=mean:20%
+"""
+import itertools
+from datetime import datetime
+from app.summary_cache import cache as summary_cache
+
+
+# Rounds of the uncached summary benchmarks, which empty the cache before each request
+COLD_ROUNDS = 50
+
+
+def bench_index(benchmark, bench_client):
+    """Dashboard: first page of expenses, totals and goals."""
+    response = benchmark(bench_client.get, "/")
+    assert response.status_code == 200
+
+
+def bench_index_next_page(benchmark, bench_client):
+    """Load-more request for the second page of expenses."""
+    cursor = bench_client.get("/", headers={"X-Requested-With": "XMLHttpRequest"}).get_json()["next_cursor"]
+    response = benchmark(bench_client.get, f"/?cursor={cursor}", headers={"X-Requested-With": "XMLHttpRequest"})
+    assert response.status_code == 200
+
+
+def bench_summary(benchmark, bench_client):
+    """Summary page headline numbers, with the chart series computed from the rollups."""
+    response = benchmark.pedantic(bench_client.get, args=("/summary",), setup=summary_cache.clear, rounds=COLD_ROUNDS)
+    assert response.status_code == 200
+
+
+def bench_summary_cached(benchmark, bench_client):
+    """Summary page revisited, with the chart series served from the summary cache."""
+    response = benchmark(bench_client.get, "/summary")
+    assert response.status_code == 200
+
+
+def bench_summary_data(benchmark, bench_client):
+    """Twelve-month chart window requested by the summary page, computed from the rollups."""
+    response = benchmark.pedantic(
+        bench_client.get, args=("/summary/data?months=12",), setup=summary_cache.clear, rounds=COLD_ROUNDS
+    )
+    assert response.status_code == 200
+
+
+def bench_summary_data_cached(benchmark, bench_client):
+    """Twelve-month chart window served from the summary cache."""
+    response = benchmark(bench_client.get, "/summary/data?months=12")
+    assert response.status_code == 200
+
+
+def bench_set_savings_goal(benchmark, bench_client):
+    """Goals page with progress and allocated expenses of every goal."""
+    response = benchmark(bench_client.get, "/set_savings_goal")
+    assert response.status_code == 200
+
+
+def bench_add_expense(benchmark, bench_client):
+    """AJAX expense creation, including the aggregate updates."""
+    form = {
+        "description": "Benchmark lunch",
+        "amount": "12.50",
+        "category": "Wants",
+        "date": datetime.now().strftime("%Y-%m-%d"),
+    }
+    response = benchmark(bench_client.post, "/add_expense", data=form,
+                         headers={"X-Requested-With": "XMLHttpRequest"})
+    assert response.status_code == 200
+
+
+def bench_edit_expense(benchmark, bench_db, bench_user, bench_client):
+    """Expense edit that moves the amount between two values on every round."""
+    expense = bench_db.expenses.find_one({"user_id": str(bench_user["_id"]), "goal_id": {"$exists": False}})
+    amounts = itertools.cycle(["10.00", "20.00"])
+
+    def edit():
+        return bench_client.post(f"/edit_expense/{expense['_id']}", data={
+            "description": expense["description"],
+            "amount": next(amounts),
+            "category": expense["category"],
+            "date": expense["date"].strftime("%Y-%m-%d"),
+        }, headers={"X-Requested-With": "XMLHttpRequest"})
+
+    response = benchmark(edit)
+    assert response.status_code == 200
@@ -0,0 +1,71 @@
+import os
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# The benchmarks bind the app to their own database
+os.environ["DEFER_DB_INIT"] = "1"
+
+import mongomock
+import app as app_package
+from app import app
+from app.indexes import ensure_indexes
+from app.summary_cache import cache as summary_cache
+from app.user_cache import cache as user_cache
+from benchmarks.datagen import generate_user
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("expense tracker benchmarks")
+    group.addoption("--backend", choices=["mongomock", "mongod"], default="mongomock",
+                    help="Database the routes are timed against.")
+    group.addoption("--mongo-uri", default="mongodb://localhost:27017/expense_tracker_bench",
+                    help="Database used by the mongod backend; it is overwritten.")
+    group.addoption("--bench-expenses", type=int, default=1000,
+                    help="Expenses generated for the benchmark user.")
+    group.addoption("--bench-goals", type=int, default=3,
+                    help="Savings goals generated for the benchmark user.")
+
+
+@pytest.fixture(scope="session")
+def bench_db(request):
+    """The database for the selected backend, with declared indexes."""
+    if request.config.getoption("--backend") == "mongomock":
+        yield mongomock.MongoClient().expense_tracker_bench
+        return
+
+    client = MongoClient(request.config.getoption("--mongo-uri"), serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as exc:
+        pytest.skip(f"mongod not reachable: {exc}")
+    db = client.get_default_database()
+    ensure_indexes(db)
+    yield db
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def bench_user(request, bench_db):
+    """A user with a synthetic history, generated once per session."""
+    return generate_user(
+        bench_db,
+        "bench@example.com",
+        expenses=request.config.getoption("--bench-expenses"),
+        goals=request.config.getoption("--bench-goals"),
+        seed=42
+    )
+
+
+@pytest.fixture
+def bench_client(bench_db, bench_user, monkeypatch):
+    """A test client logged in as the benchmark user and bound to the benchmark database."""
+    app.config.update({"TESTING": True, "WTF_CSRF_ENABLED": False})
+    monkeypatch.setattr(app_package.mongo, "db", bench_db)
+    user_cache.clear()
+    summary_cache.clear()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(bench_user["_id"])
+        session["_fresh"] = True
+    return client
@@ -0,0 +1,182 @@
+"""Generate synthetic users, expenses and savings goals for benchmarks and load tests.
+
+Example:
+    python -m benchmarks.datagen --uri mongodb://localhost:27017/expense_tracker_bench \\
+        --email bench@example.com --expenses 1000000 --goals 5 --months 36
+"""
+import argparse
+import os
+import random
+from datetime import datetime, time, timedelta
+from bson.objectid import ObjectId
+from pymongo import MongoClient
+from werkzeug.security import generate_password_hash
+
+# Only the app's helpers are used here; do not let importing them connect the app's own client
+os.environ.setdefault("DEFER_DB_INIT", "1")
+
+from app.aggregates import recompute_user_totals
+from app.dates import DATE_FORMAT
+from app.goals import GOAL_CATEGORIES, compute_goal_totals
+from app.indexes import ensure_indexes
+
+
+DEFAULT_MIX = {"Needs": 50, "Wants": 30, "Savings": 10, "Investments": 10}
+
+DESCRIPTIONS = {
+    "Needs": ["Rent", "Groceries", "Electricity", "Internet", "Bus pass", "Pharmacy", "Insurance"],
+    "Wants": ["Restaurant", "Cinema", "Concert", "Clothes", "Takeaway", "Games", "Coffee"],
+    "Savings": ["Emergency fund", "Holiday fund", "House deposit", "Transfer to savings"],
+    "Investments": ["Index fund", "ETF purchase", "Pension top-up", "Bonds"],
+}
+
+# Typical amount range per category
+AMOUNTS = {
+    "Needs": (5, 1200),
+    "Wants": (3, 250),
+    "Savings": (20, 800),
+    "Investments": (50, 1500),
+}
+
+# Default password of generated users, so load tests can log in
+PASSWORD = "benchmark"
+
+
+def parse_mix(value):
+    """Parse 'Needs=50,Wants=30,...' into a {category: weight} dict."""
+    mix = {}
+    for part in value.split(","):
+        category, _, weight = part.partition("=")
+        if category.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown category: {category}")
+        mix[category.strip()] = float(weight)
+    return mix
+
+
+def make_goals(rng, count, start, end):
+    """Build savings goals with date ranges spread over [start, end]."""
+    span = (end - start).days
+    goals = []
+    for number in range(count):
+        goal_start = start + timedelta(days=rng.randint(0, max(span // 2, 0)))
+        goal_end = min(goal_start + timedelta(days=rng.randint(90, 540)), end)
+        goals.append({
+            "goal_id": str(ObjectId()),
+            "goal_name": f"Goal {number + 1}",
+            "goal_amount": float(rng.randrange(1000, 50000, 500)),
+            "start_date": goal_start.strftime(DATE_FORMAT),
+            "end_date": goal_end.strftime(DATE_FORMAT),
+            "created_at": start.strftime(DATE_FORMAT),
+        })
+    return goals
+
+
+def iter_expenses(rng, user_id, count, mix, start, end, goals):
+    """Yield ``count`` expense documents dated uniformly between start and end."""
+    categories = list(mix)
+    weights = [mix[category] for category in categories]
+    span = (end - start).days
+    goal_ranges = [
+        (goal["goal_id"], datetime.strptime(goal["start_date"], DATE_FORMAT),
+         datetime.strptime(goal["end_date"], DATE_FORMAT))
+        for goal in goals
+    ]
+    for _ in range(count):
+        category = rng.choices(categories, weights)[0]
+        low, high = AMOUNTS[category]
+        expense = {
+            "user_id": user_id,
+            "description": rng.choice(DESCRIPTIONS[category]),
+            "amount": round(rng.uniform(low, high), 2),
+            "category": category,
+            "date": start + timedelta(days=rng.randint(0, span)),
+        }
+        # About half of the savings and investments are allocated to a goal covering their date
+        if category in GOAL_CATEGORIES and rng.random() < 0.5:
+            matching = [goal_id for goal_id, goal_start, goal_end in goal_ranges
+                        if goal_start <= expense["date"] <= goal_end]
+            if matching:
+                expense["goal_id"] = rng.choice(matching)
+        yield expense
+
+
+def generate_user(db, email, expenses=1000, goals=3, months=24, mix=None, seed=None,
+                  batch_size=10000, today=None):
+    """Create a user with synthetic expenses and goals; returns the user document.
+
+    Any previous data of a user with the same email is removed first. The
+    expense totals, monthly rollups and goal counters are built from the
+    generated expenses, so the dataset looks like one written by the app.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    end = datetime.combine((today or datetime.now()).date(), time())
+    start = end - timedelta(days=round(months * 30.4))
+
+    previous = db.users.find_one({"email": email}, {"_id": 1})
+    if previous:
+        previous_id = str(previous["_id"])
+        db.expenses.delete_many({"user_id": previous_id})
+        db.monthly_rollups.delete_many({"user_id": previous_id})
+        db.expense_totals.delete_one({"_id": previous_id})
+        db.users.delete_one({"_id": previous["_id"]})
+
+    user = {
+        "_id": ObjectId(),
+        "email": email,
+        "password": generate_password_hash(PASSWORD),
+        "created_at": start,
+        "onboarding_complete": True,
+        "budget_settings": {"needs": 50, "wants": 30, "savings": 10, "investments": 10},
+        "savings_goals": make_goals(rng, goals, start, end),
+    }
+    user_id = str(user["_id"])
+
+    batch = []
+    for expense in iter_expenses(rng, user_id, expenses, mix, start, end, user["savings_goals"]):
+        batch.append(expense)
+        if len(batch) >= batch_size:
+            db.expenses.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.expenses.insert_many(batch, ordered=False)
+
+    goal_totals = compute_goal_totals(db, user_id, user["savings_goals"])
+    for goal in user["savings_goals"]:
+        goal["allocated_total"] = goal_totals.get(goal["goal_id"], 0.0)
+    db.users.insert_one(user)
+    # Rebuilds the monthly rollups as well
+    recompute_user_totals(db, user_id)
+    return user
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default="mongodb://localhost:27017/expense_tracker_bench",
+                        help="MongoDB URI including the database name.")
+    parser.add_argument("--email", default="bench@example.com",
+                        help="Email of the first user; more users get a numeric suffix.")
+    parser.add_argument("--users", type=int, default=1, help="Number of users to generate.")
+    parser.add_argument("--expenses", type=int, default=1000, help="Expenses per user (1k to 1M).")
+    parser.add_argument("--goals", type=int, default=3, help="Savings goals per user.")
+    parser.add_argument("--months", type=int, default=24, help="Months of history the expenses span.")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Category weights, e.g. Needs=50,Wants=30,Savings=10,Investments=10.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible data.")
+    args = parser.parse_args(argv)
+
+    client = MongoClient(args.uri)
+    db = client.get_default_database()
+    ensure_indexes(db)
+    for number in range(args.users):
+        email = args.email if number == 0 else args.email.replace("@", f"+{number}@", 1)
+        seed = None if args.seed is None else args.seed + number
+        user = generate_user(db, email, expenses=args.expenses, goals=args.goals,
+                             months=args.months, mix=args.mix, seed=seed)
+        print(f"{email}: user {user['_id']}, {args.expenses} expenses, {args.goals} goals "
+              f"(password: {PASSWORD})")
+
+
+if __name__ == "__main__":
+    main()
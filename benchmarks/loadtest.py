@@ -0,0 +1,250 @@
+"""Replay realistic dashboard sessions against a running app and report latency per route.
+
+Each virtual user logs in, opens the dashboard, adds an expense over AJAX,
+opens the summary and switches its time range, then opens the goals page.
+Users are generated by benchmarks.datagen (password "benchmark").
+
+Example:
+    python -m benchmarks.datagen --users 20 --expenses 5000 --seed 1
+    python -m benchmarks.loadtest --url http://localhost:5000 --users 20 --concurrency 50 --duration 60
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+
+
+CSRF_TOKEN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+AJAX = {"X-Requested-With": "XMLHttpRequest"}
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Report redirects to the caller instead of following them."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class HttpSession:
+    """A browser-like session against a running server, with its own cookies."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect
+        )
+
+    def request(self, method, path, data=None, headers=None):
+        """Send a request and return (status, body text)."""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers or {})
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                return response.status, response.read().decode("utf-8", "replace")
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read().decode("utf-8", "replace")
+
+
+class InProcessSession:
+    """The same interface over a Flask test client, to measure the app without a server."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, headers=None):
+        """Send a request and return (status, body text)."""
+        response = self.client.open(path, method=method, data=data, headers=headers)
+        return response.status_code, response.get_data(as_text=True)
+
+
+class Recorder:
+    """Thread-safe collection of per-route latencies and errors."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, ok):
+        """Add one request's latency, counting it as an error unless ``ok``."""
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def _timed(session, recorder, route, method, path, data=None, headers=None, expect=(200,)):
+    """Send a request, record its latency under ``route`` and return (ok, body)."""
+    started = time.perf_counter()
+    try:
+        status, body = session.request(method, path, data=data, headers=headers)
+        ok = status in expect
+    except OSError:
+        body, ok = "", False
+    recorder.record(route, time.perf_counter() - started, ok)
+    return ok, body
+
+
+def _csrf(body):
+    """Return the CSRF token of the first form on a page, if any."""
+    match = CSRF_TOKEN.search(body)
+    return {"csrf_token": match.group(1)} if match else {}
+
+
+def run_session(session, recorder, email, password, rng):
+    """Replay one user visit; stops early if a step fails."""
+    ok, body = _timed(session, recorder, "GET /login", "GET", "/login")
+    if not ok:
+        return
+    ok, _ = _timed(session, recorder, "POST /login", "POST", "/login",
+                   data={**_csrf(body), "email": email, "password": password}, expect=(302,))
+    if not ok:
+        return
+
+    ok, body = _timed(session, recorder, "GET /", "GET", "/")
+    if not ok:
+        return
+    _timed(session, recorder, "POST /add_expense", "POST", "/add_expense", data={
+        **_csrf(body),
+        "description": rng.choice(["Coffee", "Lunch", "Groceries", "Taxi"]),
+        "amount": f"{rng.uniform(2, 80):.2f}",
+        "category": rng.choice(["Needs", "Wants"]),
+        "date": datetime.now().strftime("%Y-%m-%d"),
+    }, headers=AJAX)
+
+    # The summary page loads its two default windows, then the user switches range
+    _timed(session, recorder, "GET /summary", "GET", "/summary")
+    for months in (12, 6, rng.choice([3, 6, 12])):
+        _timed(session, recorder, "GET /summary/data", "GET", f"/summary/data?months={months}", headers=AJAX)
+
+    _timed(session, recorder, "GET /set_savings_goal", "GET", "/set_savings_goal")
+
+
+def run_load(make_session, credentials, concurrency=10, duration=None, sessions=None, seed=None):
+    """Run virtual users until ``duration`` seconds pass or ``sessions`` visits complete.
+
+    Returns (recorder, elapsed seconds, completed sessions).
+    """
+    if duration is None and sessions is None:
+        raise ValueError("Pass a duration or a number of sessions")
+    recorder = Recorder()
+    deadline = time.monotonic() + duration if duration else None
+    counter = {"started": 0}
+    lock = threading.Lock()
+
+    def worker(number):
+        rng = random.Random(None if seed is None else seed + number)
+        while deadline is None or time.monotonic() < deadline:
+            with lock:
+                if sessions is not None and counter["started"] >= sessions:
+                    return
+                counter["started"] += 1
+            email, password = rng.choice(credentials)
+            run_session(make_session(), recorder, email, password, rng)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(number,), daemon=True) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - started, counter["started"]
+
+
+def summarize(recorder, elapsed):
+    """Return per-route and overall request counts, throughput and latency percentiles in ms."""
+    rows = {}
+    everything = []
+    for route, latencies in sorted(recorder.latencies.items()):
+        ordered = sorted(latencies)
+        everything.extend(ordered)
+        rows[route] = _row(ordered, recorder.errors[route], elapsed)
+    rows["ALL"] = _row(sorted(everything), sum(recorder.errors.values()), elapsed)
+    return rows
+
+
+def _row(ordered, errors, elapsed):
+    """Summarize one sorted list of latencies."""
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": len(ordered) / elapsed if elapsed else 0.0,
+        "p50": percentile(ordered, 0.50) * 1000,
+        "p95": percentile(ordered, 0.95) * 1000,
+        "p99": percentile(ordered, 0.99) * 1000,
+    }
+
+
+def format_report(rows):
+    """Render the summary as a fixed-width table."""
+    lines = [f"{'route':<24}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"]
+    for route, row in rows.items():
+        lines.append(
+            f"{route:<24}{row['requests']:>10}{row['errors']:>8}{row['rps']:>9.1f}"
+            f"{row['p50']:>9.1f}{row['p95']:>9.1f}{row['p99']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000", help="Base URL of the running app.")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Drive the app through the Flask test client instead of HTTP.")
+    parser.add_argument("--email", default="bench@example.com", help="Email of the first generated user.")
+    parser.add_argument("--users", type=int, default=1, help="Generated users to spread sessions over.")
+    parser.add_argument("--password", default="benchmark")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent virtual users.")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds to run for.")
+    parser.add_argument("--sessions", type=int, default=None, help="Stop after this many visits.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", dest="json_path", default=None, help="Also write the summary to this file.")
+    args = parser.parse_args(argv)
+    if args.duration is None and args.sessions is None:
+        args.duration = 30
+
+    credentials = [
+        (args.email if number == 0 else args.email.replace("@", f"+{number}@", 1), args.password)
+        for number in range(args.users)
+    ]
+    if args.in_process:
+        from app import app
+        make_session = lambda: InProcessSession(app)
+    else:
+        make_session = lambda: HttpSession(args.url)
+
+    recorder, elapsed, completed = run_load(
+        make_session, credentials, concurrency=args.concurrency,
+        duration=args.duration, sessions=args.sessions, seed=args.seed
+    )
+    rows = summarize(recorder, elapsed)
+    print(f"{completed} sessions by {args.concurrency} virtual users in {elapsed:.1f}s")
+    print(format_report(rows))
+    if args.json_path:
+        with open(args.json_path, "w") as output:
+            json.dump({"elapsed": elapsed, "sessions": completed, "concurrency": args.concurrency,
+                       "routes": rows}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
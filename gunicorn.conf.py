@@ -0,0 +1,41 @@
+"""Gunicorn settings; every value can be overridden through the environment."""
+import os
+
+
+def _cpu_count():
+    """Return the CPUs this container may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# gevent workers multiplex requests on I/O, so one per CPU is enough;
+# thread-based workers need the usual 2 x CPU + 1
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+_default_workers = _cpu_count() if worker_class == "gevent" else _cpu_count() * 2 + 1
+workers = int(os.getenv("GUNICORN_WORKERS", _default_workers))
+threads = int(os.getenv("GUNICORN_THREADS", 1 if worker_class == "gevent" else 2))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 256))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+# Import the app once in the master so workers share its pages copy-on-write
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+if preload_app:
+    # The master must not open MongoDB connections that forked workers would inherit
+    os.environ["DEFER_DB_INIT"] = "1"
+    if worker_class == "gevent":
+        # Patch before the app is imported so its locks and sockets are cooperative
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def post_fork(server, worker):
+    """Give each worker its own MongoDB client and connection pool (MONGO_MAX_POOL_SIZE)."""
+    if preload_app:
+        from app import app, init_db
+        init_db(app)
@@ -1,13 +1,18 @@
 import pytest
+from contextlib import contextmanager
 from flask import Flask
 from flask_pymongo import PyMongo
 from flask_login import login_user
 from werkzeug.security import generate_password_hash
 from app import app as flask_app
 from app.models import User
+from app.user_cache import cache as user_cache
+from app.summary_cache import cache as summary_cache
+from app import analytics
+from app.querylog import capture_queries, describe, record
 from datetime import datetime
 from bson import ObjectId
-from mongomock import MongoClient
+from mongomock import MongoClient, Collection
 
 @pytest.fixture()
 def app():
@@ -69,6 +74,62 @@ def mongo(mock_db):
     """Create a mock PyMongo instance."""
     return MockPyMongo(mock_db)
 
+# Command each collection method sends; mongomock emits no command monitoring
+# events, so the counting proxies below record them instead
+COLLECTION_COMMANDS = {
+    'find': 'find', 'find_one': 'find', 'aggregate': 'aggregate', 'count_documents': 'aggregate',
+    'distinct': 'distinct', 'insert_one': 'insert', 'insert_many': 'insert',
+    'update_one': 'update', 'update_many': 'update', 'replace_one': 'update', 'bulk_write': 'bulkWrite',
+    'delete_one': 'delete', 'delete_many': 'delete', 'find_one_and_update': 'findAndModify',
+    'find_one_and_delete': 'findAndModify', 'find_one_and_replace': 'findAndModify',
+}
+
+class CountingCollection:
+    """Collection proxy recording each command method call as one round trip."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        command = COLLECTION_COMMANDS.get(name)
+        if command is None:
+            return attr
+        def counted(*args, **kwargs):
+            record(command, self._collection.name)
+            return attr(*args, **kwargs)
+        return counted
+
+class CountingDatabase:
+    """Database proxy handing out CountingCollections."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, name):
+        attr = getattr(self._db, name)
+        return CountingCollection(attr) if isinstance(attr, Collection) else attr
+
+    def __getitem__(self, name):
+        return CountingCollection(self._db[name])
+
+@pytest.fixture
+def count_queries(monkeypatch, mongo):
+    """Route the app's database through a proxy that records every command."""
+    monkeypatch.setattr('app.mongo.db', CountingDatabase(mongo.db))
+
+@pytest.fixture
+def assert_max_queries(count_queries):
+    """Fail the test if a block sends more MongoDB commands than allowed."""
+    @contextmanager
+    def check(limit):
+        with capture_queries() as queries:
+            yield queries
+        assert len(queries) <= limit, (
+            f"{len(queries)} MongoDB commands, expected at most {limit}: {describe(queries)}"
+        )
+    return check
+
 @pytest.fixture
 def auth_client(client, test_user):
     """Create an authenticated test client."""
@@ -77,6 +138,21 @@ def auth_client(client, test_user):
         session['_fresh'] = True
     return client
 
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    """Start every test with empty user settings and summary caches."""
+    user_cache.clear()
+    summary_cache.clear()
+    yield
+
+@pytest.fixture
+def analytics_events():
+    """Collect analytics events in a list instead of sending them to PostHog."""
+    events = []
+    analytics.install_dispatcher(analytics.EventDispatcher(events.extend, flush_interval=60))
+    yield events
+    analytics.install_dispatcher(None)
+
 @pytest.fixture(autouse=True)
 def app_context(app):
     """Create an application context for testing."""
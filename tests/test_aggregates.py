@@ -0,0 +1,284 @@
+import pytest
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app import aggregates
+from app.aggregates import (
+    apply_expense_change, get_user_totals, recompute_user_totals, user_categories, get_monthly_rollups
+)
+
+
+def test_totals_follow_expense_writes(auth_client, mock_db, test_user):
+    """Test that add, edit and delete keep the materialized totals in sync."""
+    user_id = str(test_user['_id'])
+    today = datetime.now().strftime('%Y-%m-%d')
+    # Materialize the (empty) totals before writing
+    assert get_user_totals(mock_db, user_id)['total'] == 0
+
+    for category, amount in [('Needs', '100'), ('Wants', '40')]:
+        auth_client.post('/add_expense', data={
+            'description': f'{category} expense',
+            'amount': amount,
+            'category': category,
+            'date': today
+        })
+    totals = mock_db.expense_totals.find_one({'_id': user_id})
+    assert totals['total'] == 140
+    assert totals['categories'] == {'Needs': 100, 'Wants': 40}
+
+    expense = mock_db.expenses.find_one({'user_id': user_id, 'category': 'Needs'})
+    auth_client.post(f"/edit_expense/{expense['_id']}", data={
+        'description': 'Moved',
+        'amount': '60',
+        'category': 'Wants',
+        'date': today
+    })
+    totals = mock_db.expense_totals.find_one({'_id': user_id})
+    assert totals['total'] == 100
+    assert totals['categories'] == {'Needs': 0, 'Wants': 100}
+
+    auth_client.get(f"/delete_expense/{expense['_id']}")
+    totals = mock_db.expense_totals.find_one({'_id': user_id})
+    assert totals['total'] == 40
+    assert recompute_user_totals(mock_db, user_id)['total'] == totals['total']
+
+
+def test_totals_rebuilt_when_missing(mock_db):
+    """Test that totals are recomputed from existing expenses on first read."""
+    user_id = str(ObjectId())
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'amount': 25.5, 'category': 'Needs', 'date': '2024-01-01'},
+        {'user_id': user_id, 'amount': 10, 'category': 'Savings', 'date': '2024-01-02'}
+    ])
+    totals = get_user_totals(mock_db, user_id)
+    assert totals['total'] == 35.5
+    assert mock_db.expense_totals.find_one({'_id': user_id})['categories']['Savings'] == 10
+
+
+def test_recompute_totals_command(runner, mock_db):
+    """Test that the CLI command repairs drifted totals."""
+    user_id = str(ObjectId())
+    mock_db.expenses.insert_one({'user_id': user_id, 'amount': 30, 'category': 'Needs', 'date': '2024-01-01'})
+    mock_db.expense_totals.insert_one({'_id': user_id, 'total': 999, 'categories': {'Needs': 999}})
+
+    result = runner.invoke(args=['recompute-totals'])
+    assert result.exit_code == 0
+    assert mock_db.expense_totals.find_one({'_id': user_id})['total'] == 30
+
+
+def test_category_set_is_per_user(auth_client, mock_db, test_user):
+    """Test that the category set only reflects the user's own live expenses."""
+    user_id = str(test_user['_id'])
+    mock_db.expenses.insert_one({'user_id': str(ObjectId()), 'amount': 5, 'category': 'Other', 'date': '2024-01-01'})
+    assert user_categories(get_user_totals(mock_db, user_id)) == []
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    for category in ['Wants', 'Needs', 'Wants']:
+        auth_client.post('/add_expense', data={
+            'description': 'Expense', 'amount': '10', 'category': category, 'date': today
+        })
+    assert user_categories(get_user_totals(mock_db, user_id)) == ['Needs', 'Wants']
+
+    needs = mock_db.expenses.find_one({'user_id': user_id, 'category': 'Needs'})
+    auth_client.get(f"/delete_expense/{needs['_id']}")
+    assert user_categories(get_user_totals(mock_db, user_id)) == ['Wants']
+
+
+def test_totals_without_counts_are_rebuilt(mock_db):
+    """Test that totals documents missing category counts are upgraded on read."""
+    user_id = str(ObjectId())
+    mock_db.expenses.insert_one({'user_id': user_id, 'amount': 12, 'category': 'Needs', 'date': '2024-01-01'})
+    mock_db.expense_totals.insert_one({'_id': user_id, 'total': 12, 'categories': {'Needs': 12}})
+    assert get_user_totals(mock_db, user_id)['counts'] == {'Needs': 1}
+
+
+@pytest.mark.parametrize('rebuild', [get_user_totals, recompute_user_totals])
+def test_rebuild_starts_over_after_concurrent_write(mock_db, monkeypatch, rebuild):
+    """Test that an expense written while aggregates are rebuilt is neither lost nor counted twice."""
+    user_id = str(ObjectId())
+    mock_db.expenses.insert_one({'user_id': user_id, 'amount': 10, 'category': 'Needs', 'date': datetime(2024, 3, 1)})
+    write_rollups = aggregates._write_rollups
+    passes = []
+
+    def interrupted(db, user, rows):
+        # Another request adds an expense after this pass summed the collection
+        if not passes:
+            expense = {'user_id': user_id, 'amount': 5, 'category': 'Wants', 'date': datetime(2024, 4, 1)}
+            db.expenses.insert_one(expense)
+            apply_expense_change(db, user_id, new=expense)
+        passes.append(rows)
+        write_rollups(db, user, rows)
+
+    monkeypatch.setattr(aggregates, '_write_rollups', interrupted)
+    totals = rebuild(mock_db, user_id)
+    assert len(passes) == 2
+    assert totals['total'] == 15
+    stored = mock_db.expense_totals.find_one({'_id': user_id})
+    assert stored['categories'] == {'Needs': 10, 'Wants': 5}
+    assert 'rebuilding' not in stored
+    assert get_monthly_rollups(mock_db, user_id, '2024-01', '2024-12') == {
+        ('2024-03', 'Needs'): 10, ('2024-04', 'Wants'): 5
+    }
+
+
+def test_rebuild_waits_for_in_flight_write(mock_db, monkeypatch):
+    """Test that a rebuild between an expense insert and its delta does not count the expense twice."""
+    user_id = str(ObjectId())
+    mock_db.expenses.insert_one({'user_id': user_id, 'amount': 10, 'category': 'Needs', 'date': datetime(2024, 3, 1)})
+    get_user_totals(mock_db, user_id)
+    expense = {'user_id': user_id, 'amount': 5, 'category': 'Needs', 'date': datetime(2024, 3, 2)}
+    write = aggregates.expense_write(mock_db, user_id)
+    write.__enter__()
+    mock_db.expenses.insert_one(expense)
+
+    def finish_write(seconds):
+        # The writer folds its expense in while the rebuild waits
+        monkeypatch.undo()
+        apply_expense_change(mock_db, user_id, new=expense)
+        write.__exit__(None, None, None)
+
+    monkeypatch.setattr(aggregates.time, 'sleep', finish_write)
+    assert recompute_user_totals(mock_db, user_id)['total'] == 15
+    stored = mock_db.expense_totals.find_one({'_id': user_id})
+    assert stored['counts'] == {'Needs': 2}
+    assert 'pending' not in stored
+    assert get_monthly_rollups(mock_db, user_id, '2024-03', '2024-03') == {('2024-03', 'Needs'): 15}
+
+
+def test_rebuild_clears_writes_left_by_dead_workers(mock_db, monkeypatch):
+    """Test that writes registered long ago stop holding rebuilds back, and live ones only delay them."""
+    monkeypatch.setattr(aggregates.time, 'sleep', lambda seconds: None)
+    user_id = str(ObjectId())
+    mock_db.expenses.insert_one({'user_id': user_id, 'amount': 10, 'category': 'Needs', 'date': datetime(2024, 3, 1)})
+    mock_db.expense_totals.insert_one({'_id': user_id, 'pending': 1, 'pending_at': datetime.utcnow()})
+
+    totals = get_user_totals(mock_db, user_id)
+    assert totals['rebuilding'] is True
+    assert 'counts' not in mock_db.expense_totals.find_one({'_id': user_id})
+
+    mock_db.expense_totals.update_one(
+        {'_id': user_id}, {'$set': {'pending_at': datetime.utcnow() - aggregates.REBUILD_TIMEOUT - timedelta(seconds=1)}}
+    )
+    assert 'rebuilding' not in get_user_totals(mock_db, user_id)
+    assert mock_db.expense_totals.find_one({'_id': user_id})['counts'] == {'Needs': 1}
+
+
+def test_read_during_rebuild_sums_expenses(mock_db):
+    """Test that a read racing another request's rebuild neither writes nor fails."""
+    user_id = str(ObjectId())
+    mock_db.expenses.insert_one({'user_id': user_id, 'amount': 10, 'category': 'Needs', 'date': datetime(2024, 3, 1)})
+    claim = {'_id': user_id, 'rebuilding': ObjectId(), 'claimed_at': datetime.utcnow(), 'dirty': 0}
+    mock_db.expense_totals.insert_one(claim)
+
+    totals = get_user_totals(mock_db, user_id)
+    assert totals['total'] == 10
+    assert totals['rebuilding'] is True
+    assert mock_db.monthly_rollups.count_documents({}) == 0
+
+    # Writes leave the claimed aggregates alone and flag the rebuild instead
+    apply_expense_change(mock_db, user_id, new={'amount': 5, 'category': 'Needs', 'date': datetime(2024, 3, 2)})
+    stored = mock_db.expense_totals.find_one({'_id': user_id})
+    assert stored['rebuilding'] == claim['rebuilding']
+    assert stored['dirty'] == 1
+    assert 'total' not in stored
+
+
+def test_abandoned_rebuild_is_taken_over(mock_db):
+    """Test that a rebuild claim older than the timeout no longer blocks the rebuild."""
+    user_id = str(ObjectId())
+    mock_db.expenses.insert_one({'user_id': user_id, 'amount': 10, 'category': 'Needs', 'date': datetime(2024, 3, 1)})
+    mock_db.expense_totals.insert_one({
+        '_id': user_id, 'rebuilding': ObjectId(), 'dirty': 3,
+        'claimed_at': datetime.utcnow() - aggregates.REBUILD_TIMEOUT - timedelta(seconds=1)
+    })
+
+    assert 'rebuilding' not in get_user_totals(mock_db, user_id)
+    assert mock_db.expense_totals.find_one({'_id': user_id})['counts'] == {'Needs': 1}
+    assert get_monthly_rollups(mock_db, user_id, '2024-03', '2024-03') == {('2024-03', 'Needs'): 10}
+
+
+def test_rollups_follow_expense_writes(auth_client, mock_db, test_user):
+    """Test that inserts, edits (old and new bucket) and deletes update monthly rollups."""
+    user_id = str(test_user['_id'])
+    get_user_totals(mock_db, user_id)
+
+    auth_client.post('/add_expense', data={
+        'description': 'Rent', 'amount': '100', 'category': 'Needs', 'date': '2024-03-05'
+    })
+    auth_client.post('/add_expense', data={
+        'description': 'Food', 'amount': '20', 'category': 'Needs', 'date': '2024-03-09'
+    })
+    assert get_monthly_rollups(mock_db, user_id, '2024-01', '2024-12') == {('2024-03', 'Needs'): 120}
+
+    rent = mock_db.expenses.find_one({'user_id': user_id, 'description': 'Rent'})
+    auth_client.post(f"/edit_expense/{rent['_id']}", data={
+        'description': 'Rent', 'amount': '100', 'category': 'Needs', 'date': '2024-04-01'
+    })
+    assert get_monthly_rollups(mock_db, user_id, '2024-01', '2024-12') == {
+        ('2024-03', 'Needs'): 20, ('2024-04', 'Needs'): 100
+    }
+
+    auth_client.get(f"/delete_expense/{rent['_id']}")
+    assert get_monthly_rollups(mock_db, user_id, '2024-04', '2024-04') == {('2024-04', 'Needs'): 0}
+    assert get_monthly_rollups(mock_db, user_id, '2024-05', '2024-12') == {}
+
+
+def test_rebuild_rollups_command(runner, mock_db):
+    """Test that the rebuild command backfills rollups from raw expenses."""
+    user_id = str(ObjectId())
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'amount': 10, 'category': 'Needs', 'date': '2024-03-01'},
+        {'user_id': user_id, 'amount': 5, 'category': 'Needs', 'date': '2024-03-31'},
+        {'user_id': user_id, 'amount': 7, 'category': 'Wants', 'date': '2024-04-15'},
+    ])
+    mock_db.monthly_rollups.insert_one({'user_id': user_id, 'month': '2020-01', 'category': 'Needs', 'amount': 1, 'count': 1})
+
+    result = runner.invoke(args=['rebuild-rollups'])
+    assert result.exit_code == 0
+    assert get_monthly_rollups(mock_db, user_id, '2000-01', '2099-12') == {
+        ('2024-03', 'Needs'): 15, ('2024-04', 'Wants'): 7
+    }
+
+
+def test_summary_monthly_average_uses_window(auth_client, mock_db, test_user):
+    """Test that the summary averages the last 12 months but totals all time."""
+    user_id = str(test_user['_id'])
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'amount': 120, 'category': 'Needs', 'date': datetime.now().strftime('%Y-%m-%d')},
+        {'user_id': user_id, 'amount': 1000, 'category': 'Wants', 'date': '2000-01-01'},
+    ])
+    content = auth_client.get('/summary').data.decode('utf-8')
+    assert '$1120.00' in content
+    assert '$10.00' in content  # 120 over 12 months
+
+
+def test_summary_data_window(auth_client, mock_db, test_user):
+    """Test that the chart API returns pre-aggregated series for the requested window."""
+    user_id = str(test_user['_id'])
+    this_month = datetime.now().replace(day=1)
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'amount': 40, 'category': 'Needs', 'date': this_month},
+        {'user_id': user_id, 'amount': 15, 'category': 'Wants', 'date': this_month},
+        {'user_id': user_id, 'amount': 500, 'category': 'Savings', 'date': datetime(2000, 1, 1)},
+    ])
+
+    data = auth_client.get('/summary/data?months=3').get_json()
+    assert data['months'] == 3
+    assert len(data['time']['labels']) == 3
+    assert data['time']['labels'][-1] == this_month.strftime('%B %Y')
+    assert data['time']['values'] == [0, 0, 55]
+    assert data['categories'] == {'labels': ['Needs', 'Wants'], 'values': [40, 15]}
+
+    assert auth_client.get('/summary/data?months=0').status_code == 400
+    assert auth_client.get('/summary/data?months=10000').status_code == 400
+
+
+def test_summary_page_does_not_embed_expenses(auth_client, mock_db, test_user):
+    """Test that the summary HTML carries no per-expense chart data."""
+    user_id = str(test_user['_id'])
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'amount': 1, 'category': 'Needs', 'date': datetime(2020, 1, day)} for day in range(1, 29)
+    ])
+    content = auth_client.get('/summary').data.decode('utf-8')
+    assert '$28.00' in content
+    assert '2020-01' not in content
+    assert 'monthly_data' not in content
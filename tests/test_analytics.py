@@ -0,0 +1,74 @@
+import threading
+from app import analytics
+from app.analytics import EventDispatcher
+
+
+def test_expense_events_go_through_the_dispatcher(auth_client, test_user, analytics_events):
+    """Test that adding an expense queues an event that reaches the sink on flush."""
+    auth_client.post('/add_expense', data={
+        'description': 'Lunch', 'amount': '12.5', 'category': 'Wants', 'date': '2024-02-01'
+    })
+    assert analytics_events == []
+
+    analytics.dispatcher.flush()
+    assert [event['event'] for event in analytics_events] == ['expense_added']
+    assert analytics_events[0]['distinct_id'] == str(test_user['_id'])
+    assert analytics_events[0]['properties']['amount'] == 12.5
+
+
+def test_requests_do_not_wait_on_the_sink(auth_client):
+    """Test that a blocked sink does not hold up adding an expense."""
+    release = threading.Event()
+    sent = []
+
+    def slow_sink(batch):
+        release.wait(5)
+        sent.extend(batch)
+
+    analytics.install_dispatcher(EventDispatcher(slow_sink, batch_size=1, flush_interval=60))
+    try:
+        for amount in ('1', '2'):
+            response = auth_client.post('/add_expense', data={
+                'description': 'Coffee', 'amount': amount, 'category': 'Wants', 'date': '2024-02-01'
+            })
+            assert response.status_code == 302
+        release.set()
+    finally:
+        analytics.install_dispatcher(None)
+    assert len(sent) == 2
+
+
+def test_full_queue_drops_oldest_events():
+    """Test that the queue keeps the newest events when producers outrun the sink."""
+    sent = []
+    dispatcher = EventDispatcher(sent.extend, max_queue=3, batch_size=10, flush_interval=60)
+    for number in range(5):
+        dispatcher.enqueue({'n': number})
+    assert dispatcher.dropped == 2
+    assert dispatcher.depth() == 3
+
+    dispatcher.close()
+    assert [event['n'] for event in sent] == [2, 3, 4]
+
+
+def test_sink_failures_are_counted(caplog):
+    """Test that a failing sink never raises into the caller."""
+    def broken_sink(batch):
+        raise ConnectionError('PostHog is down')
+
+    dispatcher = EventDispatcher(broken_sink, flush_interval=60)
+    dispatcher.enqueue({'n': 1})
+    dispatcher.close()
+    assert dispatcher.failed == 1
+    assert dispatcher.sent == 0
+
+
+def test_queue_is_reset_after_fork():
+    """Test that a forked worker starts with its own queue and thread."""
+    sent = []
+    dispatcher = EventDispatcher(sent.extend, flush_interval=60)
+    dispatcher.enqueue({'n': 1})
+    dispatcher._pid = -1  # as seen from a child process
+    dispatcher.enqueue({'n': 2})
+    dispatcher.close()
+    assert sent == [{'n': 2}]
@@ -129,4 +129,68 @@ def test_expense_goal_allocation(auth_client, mock_db, test_user):
     updated_user = mock_db.users.find_one({'_id': test_user['_id']})
     goal = next((g for g in updated_user['savings_goals'] if g['goal_id'] == goal_id), None)
     assert goal is not None
-    assert goal['current_amount'] == 100
\ No newline at end of file
+    assert goal['current_amount'] == 100
+
+def test_expense_list_pagination(auth_client, app, mock_db, test_user, monkeypatch):
+    """Test that the dashboard pages through expenses with a keyset cursor."""
+    monkeypatch.setitem(app.config, 'EXPENSES_PAGE_SIZE', 2)
+    mock_db.expenses.insert_many([
+        {
+            'user_id': str(test_user['_id']),
+            'description': f'Expense {day}',
+            'amount': 10,
+            'category': 'Needs',
+            'date': f'2024-01-0{day}'
+        }
+        for day in range(1, 6)
+    ])
+
+    response = auth_client.get('/')
+    content = response.data.decode('utf-8')
+    assert 'Expense 5' in content and 'Expense 4' in content
+    assert 'Expense 3' not in content
+    assert 'Load more' in content
+    assert '$50.00' in content  # Total still covers every expense
+
+    # Follow the cursor chain and collect every expense exactly once
+    seen = []
+    cursor = None
+    while True:
+        url = f'/?cursor={cursor}' if cursor else '/'
+        data = auth_client.get(url, headers={'X-Requested-With': 'XMLHttpRequest'}).get_json()
+        page = [day for day in range(1, 6) if f'Expense {day}<' in data['html']]
+        seen.extend(sorted(page, key=lambda day: data['html'].index(f'Expense {day}<')))
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    assert seen == [5, 4, 3, 2, 1]
+
+
+def test_expense_list_pagination_mixed_date_types(auth_client, app, mock_db, test_user, monkeypatch):
+    """Test that legacy string dates stay reachable after pages of native dates."""
+    monkeypatch.setitem(app.config, 'EXPENSES_PAGE_SIZE', 2)
+    user_id = str(test_user['_id'])
+    mock_db.expenses.insert_many(
+        [{'user_id': user_id, 'description': f'New {day}', 'amount': 10, 'category': 'Needs',
+          'date': datetime(2024, 3, day)} for day in range(1, 4)]
+        + [{'user_id': user_id, 'description': f'Old {day}', 'amount': 10, 'category': 'Needs',
+            'date': f'2023-12-0{day}'} for day in range(1, 4)]
+    )
+
+    seen = []
+    cursor = None
+    while True:
+        url = f'/?cursor={cursor}' if cursor else '/'
+        data = auth_client.get(url, headers={'X-Requested-With': 'XMLHttpRequest'}).get_json()
+        names = [name for name in ['New 3', 'New 2', 'New 1', 'Old 3', 'Old 2', 'Old 1'] if f'{name}<' in data['html']]
+        seen.extend(names)
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    assert seen == ['New 3', 'New 2', 'New 1', 'Old 3', 'Old 2', 'Old 1']
+
+
+def test_expense_list_invalid_cursor(auth_client):
+    """Test that a malformed pagination cursor is rejected."""
+    response = auth_client.get('/?cursor=not-a-cursor')
+    assert response.status_code == 400
@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+from datetime import datetime
+from bson import ObjectId
+from app import exporter
+
+
+def seed_expenses(mock_db, user_id):
+    """Insert a native-date expense, a legacy string-date expense and another user's expense."""
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'description': 'Rent', 'amount': 900.0, 'category': 'Needs',
+         'date': datetime(2024, 2, 1)},
+        {'user_id': user_id, 'description': 'Old, "quoted" fund', 'amount': 50.5, 'category': 'Savings',
+         'date': '2023-12-24', 'goal_id': 'goal-1'},
+        {'user_id': str(ObjectId()), 'description': 'Not mine', 'amount': 1.0, 'category': 'Wants',
+         'date': datetime(2024, 3, 1)},
+    ])
+
+
+def test_csv_export_streams_user_expenses(auth_client, mock_db, test_user):
+    """Test that the CSV export streams every expense of the user, newest first."""
+    seed_expenses(mock_db, str(test_user['_id']))
+
+    response = auth_client.get('/export_expenses?format=csv')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'attachment; filename=expenses-' in response.headers['Content-Disposition']
+
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert rows == [
+        {'date': '2024-02-01', 'description': 'Rent', 'amount': '900.0', 'category': 'Needs', 'goal_id': ''},
+        {'date': '2023-12-24', 'description': 'Old, "quoted" fund', 'amount': '50.5', 'category': 'Savings',
+         'goal_id': 'goal-1'},
+    ]
+
+
+def test_ndjson_export_in_chunks(auth_client, mock_db, test_user, monkeypatch):
+    """Test that the NDJSON export emits one JSON object per expense across several chunks."""
+    user_id = str(test_user['_id'])
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'description': f'Item {i}', 'amount': float(i), 'category': 'Wants',
+         'date': datetime(2024, 1, 1 + i)}
+        for i in range(5)
+    ])
+    monkeypatch.setattr(exporter, 'ROWS_PER_CHUNK', 2)
+
+    response = auth_client.get('/export_expenses?format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    chunks = list(response.response)
+    assert len(chunks) == 3
+    lines = [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+    assert [line['description'] for line in lines] == [f'Item {i}' for i in reversed(range(5))]
+    assert lines[0] == {'date': '2024-01-05', 'description': 'Item 4', 'amount': 4.0, 'category': 'Wants',
+                        'goal_id': None}
+
+
+def test_export_rejects_unknown_format(auth_client):
+    """Test that unsupported export formats are refused."""
+    assert auth_client.get('/export_expenses?format=xml').status_code == 400
+
+
+def test_export_expenses_command(runner, mock_db, test_user, tmp_path):
+    """Test that the CLI writes a user's export to a file."""
+    seed_expenses(mock_db, str(test_user['_id']))
+    path = tmp_path / 'export.ndjson'
+
+    result = runner.invoke(args=['export-expenses', test_user['email'], '--format', 'ndjson', '--output', str(path)])
+    assert result.exit_code == 0, result.output
+    assert [json.loads(line)['description'] for line in path.read_text().splitlines()] == [
+        'Rent', 'Old, "quoted" fund'
+    ]
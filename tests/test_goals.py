@@ -0,0 +1,175 @@
+import pytest
+from datetime import datetime
+from bson import ObjectId
+from app.goals import fetch_goal_expenses, compute_goal_totals, detach_out_of_range_expenses
+
+
+def make_goal(name, start_date, end_date, amount=1000):
+    """Build a savings goal document."""
+    return {
+        'goal_id': str(ObjectId()),
+        'goal_name': name,
+        'goal_amount': amount,
+        'start_date': start_date,
+        'end_date': end_date,
+        'created_at': '2024-01-01'
+    }
+
+
+def test_fetch_goal_expenses_groups_by_goal(mock_db):
+    """Test that allocated expenses of every goal come back grouped and range-filtered."""
+    user_id = str(ObjectId())
+    trip = make_goal('Trip', '2024-01-01', '2024-06-30')
+    house = make_goal('House', '2024-03-01', '2024-12-31')
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'amount': 50, 'category': 'Savings', 'date': datetime(2024, 2, 1), 'goal_id': trip['goal_id']},
+        {'user_id': user_id, 'amount': 20, 'category': 'Savings', 'date': datetime(2024, 1, 5), 'goal_id': trip['goal_id']},
+        {'user_id': user_id, 'amount': 99, 'category': 'Savings', 'date': datetime(2024, 8, 1), 'goal_id': trip['goal_id']},
+        {'user_id': user_id, 'amount': 70, 'category': 'Investments', 'date': datetime(2024, 4, 1), 'goal_id': house['goal_id']},
+        {'user_id': str(ObjectId()), 'amount': 5, 'category': 'Savings', 'date': datetime(2024, 4, 1), 'goal_id': house['goal_id']},
+    ])
+
+    expenses = fetch_goal_expenses(mock_db, user_id, [trip, house])
+    assert [e['amount'] for e in expenses[trip['goal_id']]] == [20, 50]
+    assert [e['amount'] for e in expenses[house['goal_id']]] == [70]
+    assert fetch_goal_expenses(mock_db, user_id, []) == {}
+
+
+def test_goal_expenses_include_legacy_string_dates(mock_db):
+    """Test that unmigrated string dates count towards a goal within its range."""
+    user_id = str(ObjectId())
+    trip = make_goal('Trip', '2024-01-01', '2024-06-30')
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'amount': 50, 'category': 'Savings', 'date': datetime(2024, 2, 1), 'goal_id': trip['goal_id']},
+        {'user_id': user_id, 'amount': 20, 'category': 'Savings', 'date': '2024-03-05', 'goal_id': trip['goal_id']},
+        {'user_id': user_id, 'amount': 99, 'category': 'Savings', 'date': '2024-08-01', 'goal_id': trip['goal_id']},
+    ])
+
+    expenses = fetch_goal_expenses(mock_db, user_id, [trip])
+    assert sorted(e['amount'] for e in expenses[trip['goal_id']]) == [20, 50]
+    assert compute_goal_totals(mock_db, user_id, [trip]) == {trip['goal_id']: 70}
+
+
+def test_goals_page_shows_progress_per_goal(auth_client, mock_db, test_user):
+    """Test that the goals page reports progress for several goals."""
+    user_id = str(test_user['_id'])
+    trip = make_goal('Trip', '2024-01-01', '2024-06-30', amount=200)
+    house = make_goal('House', '2024-01-01', '2024-12-31', amount=1000)
+    mock_db.users.update_one({'_id': test_user['_id']}, {'$set': {'savings_goals': [trip, house]}})
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'description': 'Trip fund', 'amount': 50, 'category': 'Savings',
+         'date': datetime(2024, 2, 1), 'goal_id': trip['goal_id']},
+        {'user_id': user_id, 'description': 'House fund', 'amount': 250, 'category': 'Investments',
+         'date': datetime(2024, 3, 1), 'goal_id': house['goal_id']},
+    ])
+
+    content = auth_client.get('/set_savings_goal').data.decode('utf-8')
+    assert '25.0%' in content
+    assert '$250.00' in content
+    assert '2024-03-01' in content
+
+
+def get_goal(mock_db, test_user, goal_id):
+    """Return a goal from the user's document."""
+    user = mock_db.users.find_one({'_id': test_user['_id']})
+    return next(g for g in user['savings_goals'] if g['goal_id'] == goal_id)
+
+
+def test_goal_counter_follows_expense_writes(auth_client, mock_db, test_user):
+    """Test that attaching, detaching and deleting expenses maintain allocated_total."""
+    auth_client.post('/set_savings_goal', data={
+        'action': 'add_goal', 'goal_name': 'Trip', 'goal_amount': '500',
+        'start_date': '2024-01-01', 'end_date': '2024-12-31'
+    })
+    goal_id = mock_db.users.find_one({'_id': test_user['_id']})['savings_goals'][0]['goal_id']
+    assert get_goal(mock_db, test_user, goal_id)['allocated_total'] == 0
+
+    auth_client.post('/add_expense', data={
+        'description': 'Deposit', 'amount': '100', 'category': 'Savings', 'date': '2024-02-01', 'goal_id': goal_id
+    })
+    assert get_goal(mock_db, test_user, goal_id)['allocated_total'] == 100
+
+    expense = mock_db.expenses.find_one({'description': 'Deposit'})
+    auth_client.post(f"/edit_expense/{expense['_id']}", data={
+        'description': 'Deposit', 'amount': '150', 'category': 'Savings', 'date': '2024-02-01', 'goal_id': goal_id
+    })
+    assert get_goal(mock_db, test_user, goal_id)['allocated_total'] == 150
+
+    auth_client.post(f"/edit_expense/{expense['_id']}", data={
+        'description': 'Deposit', 'amount': '150', 'category': 'Savings', 'date': '2024-02-01'
+    })
+    assert get_goal(mock_db, test_user, goal_id)['allocated_total'] == 0
+
+    auth_client.post('/add_expense', data={
+        'description': 'Second', 'amount': '40', 'category': 'Investments', 'date': '2024-03-01', 'goal_id': goal_id
+    })
+    second = mock_db.expenses.find_one({'description': 'Second'})
+    auth_client.get(f"/delete_expense/{second['_id']}")
+    assert get_goal(mock_db, test_user, goal_id)['allocated_total'] == 0
+
+
+def test_goal_range_edit_recomputes_counter(auth_client, mock_db, test_user):
+    """Test that narrowing a goal's dates detaches expenses and updates its counter."""
+    goal = make_goal('Trip', '2024-01-01', '2024-12-31')
+    goal['allocated_total'] = 300
+    mock_db.users.update_one({'_id': test_user['_id']}, {'$set': {'savings_goals': [goal]}})
+    user_id = str(test_user['_id'])
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'amount': 100, 'category': 'Savings', 'date': datetime(2024, 2, 1), 'goal_id': goal['goal_id']},
+        {'user_id': user_id, 'amount': 200, 'category': 'Savings', 'date': datetime(2024, 9, 1), 'goal_id': goal['goal_id']},
+    ])
+
+    auth_client.post('/set_savings_goal', data={
+        'action': 'edit_goal', 'goal_id': goal['goal_id'], 'goal_name': 'Trip', 'goal_amount': '1000',
+        'start_date': '2024-01-01', 'end_date': '2024-06-30'
+    })
+    updated = get_goal(mock_db, test_user, goal['goal_id'])
+    assert updated['allocated_total'] == 100
+    assert updated['end_date'] == '2024-06-30'
+    assert mock_db.expenses.count_documents({'goal_id': goal['goal_id']}) == 1
+
+
+def test_legacy_goal_counter_is_backfilled(auth_client, mock_db, test_user):
+    """Test that goals created before the counter get one on first view."""
+    goal = make_goal('Old goal', '2024-01-01', '2024-12-31', amount=400)
+    mock_db.users.update_one({'_id': test_user['_id']}, {'$set': {'savings_goals': [goal]}})
+    mock_db.expenses.insert_one({
+        'user_id': str(test_user['_id']), 'amount': 100, 'category': 'Savings',
+        'date': datetime(2024, 5, 1), 'goal_id': goal['goal_id']
+    })
+
+    content = auth_client.get('/').data.decode('utf-8')
+    assert 'Saved $100.00 of $400.00' in content
+    assert get_goal(mock_db, test_user, goal['goal_id'])['allocated_total'] == 100
+
+
+def test_detach_out_of_range_expenses(mock_db):
+    """Test that one range-filtered update detaches native and legacy dated expenses."""
+    user_id = str(ObjectId())
+    goal_id = str(ObjectId())
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'amount': 1, 'category': 'Savings', 'date': datetime(2023, 12, 31), 'goal_id': goal_id},
+        {'user_id': user_id, 'amount': 1, 'category': 'Savings', 'date': datetime(2024, 3, 1), 'goal_id': goal_id},
+        {'user_id': user_id, 'amount': 1, 'category': 'Savings', 'date': datetime(2024, 7, 1), 'goal_id': goal_id},
+        {'user_id': user_id, 'amount': 1, 'category': 'Savings', 'date': '2024-08-01', 'goal_id': goal_id},
+        {'user_id': user_id, 'amount': 1, 'category': 'Savings', 'date': '2024-02-01', 'goal_id': goal_id},
+    ])
+    assert detach_out_of_range_expenses(mock_db, user_id, goal_id, '2024-01-01', '2024-06-30') == 3
+    remaining = [e['date'] for e in mock_db.expenses.find({'goal_id': goal_id})]
+    assert remaining == [datetime(2024, 3, 1), '2024-02-01']
+
+
+def test_goal_range_edit_reports_detached_count(auth_client, mock_db, test_user):
+    """Test that editing a goal's dates reports how many expenses were unallocated."""
+    goal = make_goal('Trip', '2024-01-01', '2024-12-31')
+    mock_db.users.update_one({'_id': test_user['_id']}, {'$set': {'savings_goals': [goal]}})
+    mock_db.expenses.insert_many([
+        {'user_id': str(test_user['_id']), 'amount': 10, 'category': 'Savings',
+         'date': datetime(2024, 11, day), 'goal_id': goal['goal_id']}
+        for day in range(1, 4)
+    ])
+    response = auth_client.post('/set_savings_goal', data={
+        'action': 'edit_goal', 'goal_id': goal['goal_id'], 'goal_name': 'Trip', 'goal_amount': '1000',
+        'start_date': '2024-01-01', 'end_date': '2024-06-30'
+    }, follow_redirects=True)
+    assert b'3 expense(s) outside the new dates' in response.data
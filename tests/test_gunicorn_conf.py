@@ -0,0 +1,41 @@
+import os
+import runpy
+import pytest
+
+
+CONF_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'gunicorn.conf.py')
+
+
+@pytest.fixture
+def load_conf(monkeypatch):
+    """Evaluate gunicorn.conf.py with thread workers and the given environment."""
+    def load(**env):
+        monkeypatch.setenv('GUNICORN_WORKER_CLASS', 'gthread')
+        monkeypatch.delenv('DEFER_DB_INIT', raising=False)
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return runpy.run_path(CONF_PATH)
+    return load
+
+
+def test_worker_counts_follow_cpu_and_env(load_conf, monkeypatch):
+    """Test that worker and thread counts derive from the CPU count unless set explicitly."""
+    monkeypatch.setattr(os, 'sched_getaffinity', lambda pid: {0, 1, 2}, raising=False)
+    conf = load_conf()
+    assert conf['workers'] == 7
+    assert conf['threads'] == 2
+
+    conf = load_conf(GUNICORN_WORKERS='3', GUNICORN_THREADS='4', PORT='8080')
+    assert (conf['workers'], conf['threads'], conf['bind']) == (3, 4, '0.0.0.0:8080')
+
+
+def test_preload_defers_db_init_to_workers(load_conf, monkeypatch):
+    """Test that preloading defers the Mongo client to the post_fork hook."""
+    conf = load_conf()
+    assert conf['preload_app'] is True
+    assert os.environ['DEFER_DB_INIT'] == '1'
+
+    initialized = []
+    monkeypatch.setattr('app.init_db', initialized.append)
+    conf['post_fork'](server=None, worker=None)
+    assert len(initialized) == 1
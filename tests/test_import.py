@@ -0,0 +1,172 @@
+import io
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+from app.aggregates import get_user_totals
+from app.importer import import_expenses, parse_csv, parse_ofx, parse_qif
+
+
+CSV_EXPORT = """description,amount,category,date
+Groceries,42.50,Needs,2024-01-05
+Cinema,12,Wants,2024-01-06
+Broken amount,abc,Needs,2024-01-07
+Rent,900,Needs,2024-02-01
+Bad date,10,Needs,07/01/2024
+Index fund,200,Investments,2024-02-03
+"""
+
+OFX_EXPORT = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105120000[0:GMT]<TRNAMT>-42.50<NAME>Corner Shop &amp; Deli
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240110<TRNAMT>1500.00<NAME>Salary
+</STMTTRN>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240112<TRNAMT>-9.99<MEMO>Streaming
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+QIF_EXPORT = """!Type:Bank
+D01/05'24
+T-42.50
+PCorner Shop
+LWants
+^
+D01/10/2024
+T1,500.00
+PSalary
+^
+D2024-01-12
+T-9.99
+PStreaming
+^
+"""
+
+
+def test_csv_upload_imports_valid_rows_and_reports_errors(app, auth_client, mock_db, test_user):
+    """Test that a CSV upload inserts valid rows in batches and reports invalid ones by line."""
+    user_id = str(test_user['_id'])
+    # Materialize the aggregates so the import has to fold into them
+    get_user_totals(mock_db, user_id)
+    app.config['IMPORT_BATCH_SIZE'] = 2
+    try:
+        response = auth_client.post('/import_expenses', data={
+            'file': (io.BytesIO(CSV_EXPORT.encode()), 'export.csv'),
+            'default_category': 'Needs'
+        }, content_type='multipart/form-data', headers={'X-Requested-With': 'XMLHttpRequest'})
+    finally:
+        app.config['IMPORT_BATCH_SIZE'] = 1000
+
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['inserted'] == 4
+    assert report['error_count'] == 2
+    assert [error['row'] for error in report['errors']] == [4, 6]
+    assert 'amount' in report['errors'][0]['message']
+    assert 'date' in report['errors'][1]['message']
+
+    rent = mock_db.expenses.find_one({'description': 'Rent'})
+    assert rent['user_id'] == user_id
+    assert rent['date'] == datetime(2024, 2, 1)
+    totals = mock_db.expense_totals.find_one({'_id': user_id})
+    assert totals['total'] == 1154.5
+    assert totals['counts'] == {'Needs': 2, 'Wants': 1, 'Investments': 1}
+    rollup = mock_db.monthly_rollups.find_one({'user_id': user_id, 'month': '2024-02', 'category': 'Needs'})
+    assert rollup['amount'] == 900
+
+
+class LegacySpooledTemporaryFile(SpooledTemporaryFile):
+    """SpooledTemporaryFile as it was before Python 3.11, without the io.IOBase methods."""
+
+    def __getattribute__(self, name):
+        if name in ('readable', 'read1', 'readinto', 'readinto1', 'detach', 'seekable', 'writable'):
+            raise AttributeError(name)
+        return super().__getattribute__(name)
+
+
+def test_upload_spooled_to_temporary_file(auth_client, mock_db, test_user, monkeypatch):
+    """Test an upload stored the way Werkzeug does on Python 3.9, with a BOM and a multi-line field."""
+    monkeypatch.setattr('werkzeug.formparser.SpooledTemporaryFile', LegacySpooledTemporaryFile)
+    content = '\ufeffdescription,amount,category,date\r\n"Caf\u00e9\r\nbreakfast",4.20,Wants,2024-01-05\r\n'
+    response = auth_client.post('/import_expenses', data={
+        'file': (io.BytesIO(content.encode()), 'export.csv'),
+        'default_category': 'Needs'
+    }, content_type='multipart/form-data', headers={'X-Requested-With': 'XMLHttpRequest'})
+
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 1
+    assert mock_db.expenses.find_one({'user_id': str(test_user['_id'])})['description'] == 'Caf\u00e9\r\nbreakfast'
+
+
+def test_upload_rejects_unsupported_files(auth_client, mock_db):
+    """Test that files other than CSV, OFX and QIF are refused."""
+    response = auth_client.post('/import_expenses', data={
+        'file': (io.BytesIO(b'hello'), 'notes.txt')
+    }, content_type='multipart/form-data', headers={'X-Requested-With': 'XMLHttpRequest'})
+    assert response.status_code == 400
+    assert mock_db.expenses.count_documents({}) == 0
+
+
+def test_parse_csv_falls_back_to_default_category():
+    """Test that CSV rows with a missing or unknown category get the default, like QIF records."""
+    content = 'description,amount,category,date\nLunch,8,Food,2024-01-05\nCinema,12,wants,2024-01-06\nBus,2,,2024-01-07\n'
+    rows = list(parse_csv(io.StringIO(content), default_category='Needs'))
+    assert [fields['category'] for _, fields in rows] == ['Needs', 'Wants', 'Needs']
+
+
+def test_parse_ofx_maps_debits_and_skips_credits():
+    """Test that OFX debits become expense fields and credits are yielded as None."""
+    rows = list(parse_ofx(io.StringIO(OFX_EXPORT)))
+    assert rows == [
+        (1, {'description': 'Corner Shop & Deli', 'amount': '42.50', 'category': 'Needs', 'date': '2024-01-05'}),
+        (2, None),
+        (3, {'description': 'Streaming', 'amount': '9.99', 'category': 'Needs', 'date': '2024-01-12'}),
+    ]
+
+    class TinyReads(io.StringIO):
+        def read(self, size=-1):
+            return super().read(5)
+
+    # Tags split across read chunks parse the same way
+    assert list(parse_ofx(TinyReads(OFX_EXPORT))) == rows
+
+
+def test_parse_qif_normalizes_dates_and_categories():
+    """Test that QIF records map to expense fields with ISO dates."""
+    rows = list(parse_qif(io.StringIO(QIF_EXPORT), default_category='Wants'))
+    assert rows == [
+        (2, {'description': 'Corner Shop', 'amount': '42.50', 'category': 'Wants', 'date': '2024-01-05'}),
+        (7, None),
+        (11, {'description': 'Streaming', 'amount': '9.99', 'category': 'Wants', 'date': '2024-01-12'}),
+    ]
+
+
+def test_import_expenses_command(runner, mock_db, test_user, tmp_path):
+    """Test that the CLI imports a file into the given user's account."""
+    path = tmp_path / 'statement.qif'
+    path.write_text(QIF_EXPORT)
+
+    result = runner.invoke(args=['import-expenses', test_user['email'], str(path), '--batch-size', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 2 expenses, 0 errors, 1 credits skipped' in result.output
+    assert mock_db.expenses.count_documents({'user_id': str(test_user['_id'])}) == 2
+
+
+def test_import_expenses_command_rejects_unknown_category(runner, mock_db, test_user, tmp_path):
+    """Test that a mistyped default category is refused before anything is imported."""
+    path = tmp_path / 'statement.qif'
+    path.write_text(QIF_EXPORT)
+
+    result = runner.invoke(args=['import-expenses', test_user['email'], str(path), '--default-category', 'Need'])
+    assert result.exit_code == 2
+    assert "'Need' is not one of" in result.output
+    assert mock_db.expenses.count_documents({}) == 0
+
+
+def test_import_expenses_reuses_form_validation(app, mock_db):
+    """Test that rows are validated with the ExpenseForm rules."""
+    csv_export = "description,amount,date\n,5,2024-01-01\nTea,0,2024-01-01\nTea,3,2024-01-01\n"
+    with app.app_context():
+        report = import_expenses(mock_db, 'user-1', io.StringIO(csv_export), 'csv')
+    assert report['inserted'] == 1
+    assert [error['row'] for error in report['errors']] == [2, 3]
+    assert mock_db.expenses.find_one({'user_id': 'user-1'})['category'] == 'Needs'
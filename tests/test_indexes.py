@@ -0,0 +1,61 @@
+import pytest
+from mongomock import MongoClient
+from app.indexes import INDEXES, check_indexes, ensure_indexes
+
+
+@pytest.fixture
+def empty_db():
+    """Create a database without any secondary indexes."""
+    return MongoClient().index_test_db
+
+
+def test_ensure_indexes_is_idempotent(empty_db):
+    """Test that declared indexes are created once and then left alone."""
+    created = ensure_indexes(empty_db)
+    assert sorted(created) == sorted(
+        model.document['name'] for models in INDEXES.values() for model in models
+    )
+    assert ensure_indexes(empty_db) == []
+    assert check_indexes(empty_db) == {}
+
+    assert empty_db.users.index_information()['email_1']['unique']
+    assert 'user_id_1_goal_id_1_date_1' in empty_db.expenses.index_information()
+
+
+def test_check_indexes_reports_missing(empty_db):
+    """Test that missing indexes are reported per collection."""
+    report = check_indexes(empty_db)
+    assert report['users']['missing'] == ['email_1']
+    assert 'user_id_1_date_-1__id_-1' in report['expenses']['missing']
+
+
+def test_indexes_cli(runner, mock_db):
+    """Test the indexes check and sync commands."""
+    result = runner.invoke(args=['indexes', 'check'])
+    assert result.exit_code == 1
+    assert 'missing' in result.output
+
+    result = runner.invoke(args=['indexes', 'sync'])
+    assert result.exit_code == 0
+
+    result = runner.invoke(args=['indexes', 'check'])
+    assert result.exit_code == 0
+
+
+def test_conflicting_index_is_reported_and_rebuilt(runner, mock_db):
+    """Test that an index with a declared name but other keys fails the check and is rebuilt by sync."""
+    runner.invoke(args=['indexes', 'sync'])
+    mock_db.users.drop_index('email_1')
+    mock_db.users.create_index([('email', -1)], name='email_1')
+    assert check_indexes(mock_db)['users'] == {'missing': [], 'conflicting': ['email_1'], 'extra': []}
+    assert ensure_indexes(mock_db) == []
+
+    result = runner.invoke(args=['indexes', 'check'])
+    assert result.exit_code == 1
+    assert 'email_1 has different keys than declared' in result.output
+
+    result = runner.invoke(args=['indexes', 'sync'])
+    assert result.exit_code == 0
+    assert 'Created email_1' in result.output
+    assert list(mock_db.users.index_information()['email_1']['key']) == [('email', 1)]
+    assert runner.invoke(args=['indexes', 'check']).exit_code == 0
@@ -0,0 +1,26 @@
+from benchmarks.datagen import generate_user, PASSWORD
+from benchmarks.loadtest import InProcessSession, run_load, summarize, percentile
+
+
+def test_sessions_replay_every_route(app, mock_db):
+    """Test that virtual users log in and walk through the dashboard routes without errors."""
+    generate_user(mock_db, 'load@example.com', expenses=200, goals=2, seed=1)
+
+    recorder, elapsed, completed = run_load(
+        lambda: InProcessSession(app), [('load@example.com', PASSWORD)], concurrency=2, sessions=3, seed=1
+    )
+    rows = summarize(recorder, elapsed)
+    assert completed == 3
+    assert rows['ALL']['errors'] == 0
+    assert rows['POST /login']['requests'] == 3
+    assert rows['GET /summary/data']['requests'] == 9
+    assert mock_db.expenses.count_documents({'description': {'$in': ['Coffee', 'Lunch', 'Groceries', 'Taxi']}}) >= 3
+
+
+def test_percentile_nearest_rank():
+    """Test the nearest-rank percentiles used in the report."""
+    values = list(range(1, 101))
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([7], 0.95) == 7
+    assert percentile([], 0.5) == 0.0
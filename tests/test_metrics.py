@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+from app import analytics
+from app.metrics import CommandMetrics, Histogram, MONGO_COMMANDS, MONGO_LATENCY, REQUEST_LATENCY
+
+
+def metric_lines(client, headers=None):
+    """Return the /metrics exposition as a list of lines."""
+    response = client.get('/metrics', headers=headers)
+    assert response.status_code == 200
+    return response.get_data(as_text=True).splitlines()
+
+
+def test_request_latency_is_recorded_per_endpoint(auth_client):
+    """Test that handled requests show up in the latency histogram and request counter."""
+    before = REQUEST_LATENCY.count(endpoint='summary', method='GET')
+    auth_client.get('/summary')
+    assert REQUEST_LATENCY.count(endpoint='summary', method='GET') == before + 1
+
+    lines = metric_lines(auth_client)
+    assert '# TYPE http_request_duration_seconds histogram' in lines
+    assert any(line.startswith('http_request_duration_seconds_bucket{endpoint="summary",method="GET",le="+Inf"}')
+               for line in lines)
+    assert any(line.startswith('http_requests_total{endpoint="summary",method="GET",status="200"}')
+               for line in lines)
+
+
+def test_command_listener_records_collection_and_outcome():
+    """Test that the PyMongo listener counts and times commands per collection."""
+    listener = CommandMetrics()
+    before = MONGO_COMMANDS.value(collection='expenses', command='find', outcome='success')
+
+    listener.started(SimpleNamespace(command_name='find', command={'find': 'expenses'}, connection_id=('db', 1), request_id=7))
+    listener.succeeded(SimpleNamespace(command_name='find', connection_id=('db', 1), request_id=7, duration_micros=1500))
+    listener.started(SimpleNamespace(command_name='getMore', command={'getMore': 12, 'collection': 'expenses'},
+                                     connection_id=('db', 1), request_id=8))
+    listener.failed(SimpleNamespace(command_name='getMore', connection_id=('db', 1), request_id=8, duration_micros=90))
+
+    assert MONGO_COMMANDS.value(collection='expenses', command='find', outcome='success') == before + 1
+    assert MONGO_COMMANDS.value(collection='expenses', command='getMore', outcome='failure') >= 1
+    assert MONGO_LATENCY.count(collection='expenses', command='find') >= 1
+
+
+def test_histogram_buckets_are_cumulative():
+    """Test the exposition of bucket, sum and count samples."""
+    histogram = Histogram('latency_seconds', 'Test latency.', ['route'], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, route='a')
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{route="a",le="0.1"} 1',
+        'latency_seconds_bucket{route="a",le="1"} 3',
+        'latency_seconds_bucket{route="a",le="+Inf"} 4',
+        'latency_seconds_sum{route="a"} 4.05',
+        'latency_seconds_count{route="a"} 4',
+    ]
+
+
+def test_queue_and_cache_gauges(auth_client, analytics_events):
+    """Test that analytics queue depth and cache counters are exported."""
+    analytics.track('user-1', 'something_happened')
+    auth_client.get('/summary')
+    auth_client.get('/summary')
+
+    lines = metric_lines(auth_client)
+    assert 'analytics_queue_depth 1' in lines
+    assert 'user_settings_cache_hit_ratio 0.5' in lines
+
+
+def test_metrics_token(app, client):
+    """Test that a configured token is required to read the metrics."""
+    app.config['METRICS_TOKEN'] = 'secret'
+    try:
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        metric_lines(client, headers={'Authorization': 'Bearer secret'})
+    finally:
+        app.config['METRICS_TOKEN'] = None
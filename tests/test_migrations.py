@@ -0,0 +1,75 @@
+import pytest
+from datetime import datetime
+from bson import ObjectId
+from app.migrations import migrate_expense_dates
+
+
+def test_migrate_expense_dates_in_batches(mock_db):
+    """Test that string dates are converted batch by batch and invalid ones are skipped."""
+    user_id = str(ObjectId())
+    mock_db.expenses.insert_many(
+        [{'user_id': user_id, 'amount': 1, 'category': 'Needs', 'date': f'2024-02-{day:02d}'} for day in range(1, 8)]
+        + [{'user_id': user_id, 'amount': 1, 'category': 'Needs', 'date': 'not-a-date'}]
+    )
+    batches = []
+    migrated, invalid, _ = migrate_expense_dates(
+        mock_db, batch_size=3, on_batch=lambda *counts: batches.append(counts)
+    )
+    assert (migrated, invalid) == (7, 1)
+    assert len(batches) == 3
+    assert mock_db.expenses.count_documents({'date': {'$type': 'date'}}) == 7
+    assert mock_db.expenses.find_one({'date': datetime(2024, 2, 3)}) is not None
+
+    # Re-running only revisits the invalid leftovers
+    assert migrate_expense_dates(mock_db, batch_size=3)[:2] == (0, 1)
+
+
+def test_migrate_dates_command_resumes(runner, mock_db):
+    """Test that the CLI resumes after a given _id."""
+    ids = mock_db.expenses.insert_many([
+        {'user_id': 'u', 'amount': 1, 'category': 'Needs', 'date': '2024-01-01'},
+        {'user_id': 'u', 'amount': 1, 'category': 'Needs', 'date': '2024-01-02'},
+    ]).inserted_ids
+    result = runner.invoke(args=['migrate-dates', '--after-id', str(ids[0])])
+    assert result.exit_code == 0
+    assert mock_db.expenses.find_one({'_id': ids[0]})['date'] == '2024-01-01'
+    assert mock_db.expenses.find_one({'_id': ids[1]})['date'] == datetime(2024, 1, 2)
+
+
+def test_new_expenses_store_native_dates(auth_client, mock_db, test_user):
+    """Test that expenses are written with native dates and rendered as YYYY-MM-DD."""
+    auth_client.post('/add_expense', data={
+        'description': 'Dated', 'amount': '10', 'category': 'Needs', 'date': '2024-05-06'
+    })
+    expense = mock_db.expenses.find_one({'user_id': str(test_user['_id'])})
+    assert expense['date'] == datetime(2024, 5, 6)
+    assert '2024-05-06' in auth_client.get('/').data.decode('utf-8')
+
+
+def test_migrate_dates_command_repairs_goal_totals(runner, mock_db, test_user):
+    """Test that goal counters stored while dates were strings are recomputed after migrating."""
+    user_id = str(test_user['_id'])
+    goal = {'goal_id': str(ObjectId()), 'goal_name': 'Trip', 'goal_amount': 500,
+            'start_date': '2024-01-01', 'end_date': '2024-12-31', 'allocated_total': 10.0}
+    mock_db.users.update_one({'_id': test_user['_id']}, {'$set': {'savings_goals': [goal]}})
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'amount': 10, 'category': 'Savings', 'date': datetime(2024, 3, 1), 'goal_id': goal['goal_id']},
+        {'user_id': user_id, 'amount': 30, 'category': 'Savings', 'date': '2024-04-01', 'goal_id': goal['goal_id']},
+    ])
+
+    result = runner.invoke(args=['migrate-dates'])
+    assert result.exit_code == 0
+    assert 'Recomputed goal totals for 1 users' in result.output
+    stored = mock_db.users.find_one({'_id': test_user['_id']})['savings_goals'][0]
+    assert stored['allocated_total'] == 40
+
+
+def test_recompute_goal_totals_command(runner, mock_db, test_user):
+    """Test that the repair command resets a drifted counter for one user."""
+    goal = {'goal_id': str(ObjectId()), 'goal_name': 'Trip', 'goal_amount': 500,
+            'start_date': '2024-01-01', 'end_date': '2024-12-31', 'allocated_total': 999.0}
+    mock_db.users.update_one({'_id': test_user['_id']}, {'$set': {'savings_goals': [goal]}})
+
+    result = runner.invoke(args=['recompute-goal-totals', '--user-id', str(test_user['_id'])])
+    assert result.exit_code == 0
+    assert mock_db.users.find_one({'_id': test_user['_id']})['savings_goals'][0]['allocated_total'] == 0
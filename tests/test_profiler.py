@@ -0,0 +1,96 @@
+import os
+import pstats
+from types import SimpleNamespace
+import greenlet
+import pytest
+from flask import g
+from app.profiler import MongoTimer, RequestProfile, make_profile_token, _serializer
+
+
+@pytest.fixture
+def profile_config(app):
+    """Restore the profiling settings changed by a test."""
+    saved = {key: app.config[key] for key in ('ADMIN_EMAILS', 'PROFILE_DIR')}
+    yield app.config
+    app.config.update(saved)
+
+
+def test_requests_are_not_profiled_by_default(auth_client):
+    """Test that ordinary requests, and the flag from non-admins, render normally."""
+    for path in ('/summary', '/summary?profile=1'):
+        response = auth_client.get(path)
+        assert response.mimetype == 'text/html'
+        assert 'X-Profile-File' not in response.headers
+
+
+def test_signed_token_returns_report_inline(app, auth_client, profile_config):
+    """Test that a valid token replaces the response with the profile report."""
+    token = make_profile_token(app.config['SECRET_KEY'])
+    response = auth_client.get('/summary', headers={'X-Profile-Token': token})
+    report = response.get_data(as_text=True)
+    assert response.mimetype == 'text/plain'
+    assert report.startswith('GET /summary -> 200 in ')
+    assert 'MongoDB: ' in report
+    assert 'Templates: summary.html' in report
+    assert 'cumulative' in report
+
+
+def test_forged_token_is_ignored(auth_client):
+    """Test that a token signed with another key does not enable profiling."""
+    response = auth_client.get('/summary', headers={'X-Profile-Token': make_profile_token('other-key')})
+    assert response.mimetype == 'text/html'
+
+
+def test_admin_flag_writes_profile_to_directory(auth_client, profile_config, tmp_path):
+    """Test that admins can profile with ?profile=1 and that reports are saved in PROFILE_DIR."""
+    profile_config['ADMIN_EMAILS'] = {'test@example.com'}
+    profile_config['PROFILE_DIR'] = str(tmp_path)
+    response = auth_client.get('/summary?profile=1')
+    assert response.mimetype == 'text/html'
+    name = response.headers['X-Profile-File']
+    assert os.path.basename(name) == name
+    path = os.path.join(tmp_path, name)
+    assert os.path.exists(path)
+    with open(path[:-len('.prof')] + '.txt') as report:
+        assert report.read().startswith('GET /summary?profile=1 -> 200')
+
+    inline = auth_client.get('/summary?profile=inline')
+    assert inline.mimetype == 'text/plain'
+
+
+def test_mongo_timer_adds_to_current_profile(app):
+    """Test that command durations are added to the request being profiled only."""
+    timer = MongoTimer()
+    event = SimpleNamespace(duration_micros=2500)
+    with app.test_request_context():
+        timer.succeeded(event)
+        profile = g.profile = RequestProfile()
+        timer.succeeded(event)
+        timer.failed(event)
+        del g.profile
+    assert profile.mongo_commands == 2
+    assert profile.mongo_seconds == pytest.approx(0.005)
+
+
+def test_profile_skips_other_greenlets():
+    """Test that code run by other greenlets on the worker thread is left out of the profile."""
+    def other_request():
+        sorted(range(1000))
+
+    profile = RequestProfile()
+    profile.start()
+    greenlet.greenlet(other_request).switch()
+    sum(range(1000))
+    profile.stop()
+    functions = {name for _, _, name in pstats.Stats(profile.profiler).stats}
+    assert '<built-in method builtins.sum>' in functions
+    assert 'other_request' not in functions
+    assert '<built-in method builtins.sorted>' not in functions
+    assert greenlet.gettrace() is None
+
+
+def test_profile_token_command(app, runner):
+    """Test that the CLI mints a token the app accepts."""
+    result = runner.invoke(args=['profile-token'])
+    assert result.exit_code == 0
+    assert _serializer(app.config['SECRET_KEY']).loads(result.output.splitlines()[0]) == 'profile'
@@ -0,0 +1,242 @@
+"""Query-plan regression tests against a real mongod.
+
+Each test drives a route through the Flask test client, records the MongoDB
+commands it sends and runs them again through ``explain`` with
+executionStats. A plan fails when it scans a whole collection or examines
+many more documents or index keys than it returns.
+
+Set MONGO_EXPLAIN_URI (e.g. mongodb://localhost:27017/expense_tracker_explain)
+to run them; that database is dropped and seeded with synthetic data.
+"""
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+import app as app_package
+from app.dates import DATE_FORMAT
+from app.indexes import ensure_indexes
+from benchmarks.datagen import PASSWORD, generate_user
+
+
+EXPLAIN_URI = os.getenv("MONGO_EXPLAIN_URI")
+
+# Commands explain() accepts; inserts and getMores have no plan to check
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+# Driver-added fields that explain rejects or that belong to the original session
+DRIVER_FIELDS = {
+    "lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "autocommit",
+    "startTransaction", "writeConcern", "apiVersion", "apiStrict", "apiDeprecationErrors",
+}
+
+# A stage may examine at most this many documents or keys per document it returns
+MAX_EXAMINED_RATIO = 2
+
+# Plan subtrees that were not executed for the result
+SKIPPED_KEYS = {"rejectedPlans", "allPlansExecution"}
+
+
+class CommandCapture(monitoring.CommandListener):
+    """Keeps the explainable commands sent while recording."""
+
+    def __init__(self):
+        self.commands = None
+
+    @contextmanager
+    def record(self):
+        """Collect the commands sent while the block runs."""
+        self.commands = []
+        try:
+            yield self.commands
+        finally:
+            self.commands = None
+
+    def started(self, event):
+        if self.commands is not None and event.command_name in EXPLAINABLE:
+            self.commands.append({key: value for key, value in event.command.items() if key not in DRIVER_FIELDS})
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def split_statements(command):
+    """Yield one command per write statement, since explain takes a single one."""
+    name = next(iter(command))
+    field = {"update": "updates", "delete": "deletes"}.get(name)
+    if field is None:
+        yield command
+        return
+    for statement in command[field]:
+        yield {**command, field: [statement]}
+
+
+def plan_stages(node):
+    """Yield every executed plan stage of an explain document."""
+    if isinstance(node, dict):
+        if "stage" in node:
+            yield node
+        for key, value in node.items():
+            if key not in SKIPPED_KEYS:
+                yield from plan_stages(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from plan_stages(item)
+
+
+def plan_problems(command_name, explained):
+    """Return the reasons an explained plan is unacceptable."""
+    problems = []
+    for stage in plan_stages(explained):
+        if stage["stage"] == "COLLSCAN":
+            problems.append("COLLSCAN")
+        returned = max(stage.get("nReturned", 0), 1)
+        for field in ("docsExamined", "keysExamined"):
+            examined = stage.get(field, 0)
+            if examined > MAX_EXAMINED_RATIO * returned:
+                problems.append(f"{stage['stage']} {field}={examined} for nReturned={stage.get('nReturned', 0)}")
+    # Slot-based engine trees carry no per-stage counts; finds can still be checked as a whole
+    stats = explained.get("executionStats", {})
+    if command_name == "find" and stats.get("totalDocsExamined", 0) > MAX_EXAMINED_RATIO * max(stats.get("nReturned", 0), 1):
+        problems.append(f"totalDocsExamined={stats['totalDocsExamined']} for nReturned={stats['nReturned']}")
+    return problems
+
+
+def assert_indexed(db, commands):
+    """Explain every recorded command and fail on any unacceptable plan."""
+    assert commands, "the route sent no explainable commands"
+    failures = []
+    for command in commands:
+        for single in split_statements(command):
+            name = next(iter(single))
+            explained = db.command({"explain": single, "verbosity": "executionStats"})
+            failures.extend(f"{name} {single[name]}: {problem}" for problem in plan_problems(name, explained))
+    assert not failures, "\n".join([f"{len(failures)} bad query plan(s):"] + failures)
+
+
+@pytest.fixture(scope="module")
+def explain_env():
+    """A seeded database on a real mongod, its command capture and the users to log in as."""
+    if not EXPLAIN_URI:
+        pytest.skip("set MONGO_EXPLAIN_URI to run query-plan tests")
+    capture = CommandCapture()
+    client = MongoClient(EXPLAIN_URI, serverSelectionTimeoutMS=2000, event_listeners=[capture])
+    try:
+        client.admin.command("ping")
+    except PyMongoError as exc:
+        pytest.skip(f"mongod not reachable at MONGO_EXPLAIN_URI: {exc}")
+    db = client.get_default_database()
+    client.drop_database(db.name)
+    ensure_indexes(db)
+    # A second user makes every per-user filter selective
+    user = generate_user(db, "plans@example.com", expenses=5000, goals=5, months=36, seed=1)
+    generate_user(db, "other@example.com", expenses=5000, goals=5, months=36, seed=2)
+    yield db, capture, user
+    client.close()
+
+
+@pytest.fixture
+def plans_client(client, monkeypatch, explain_env):
+    """A test client bound to the seeded database and logged in as its first user."""
+    db, _, user = explain_env
+    monkeypatch.setattr(app_package.mongo, "db", db)
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user["_id"])
+        session["_fresh"] = True
+    return client
+
+
+def test_plan_checks_flag_scans_and_poor_selectivity():
+    """Test the plan checks on hand-written explain output."""
+    indexed = {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}},
+               "executionStats": {"nReturned": 50, "totalDocsExamined": 50, "executionStages": {
+                   "stage": "FETCH", "nReturned": 50, "docsExamined": 50,
+                   "inputStage": {"stage": "IXSCAN", "nReturned": 50, "keysExamined": 51}}}}
+    assert plan_problems("find", indexed) == []
+
+    rejected_scan = {**indexed, "queryPlanner": {"winningPlan": {"stage": "IXSCAN"},
+                                                 "rejectedPlans": [{"stage": "COLLSCAN"}]}}
+    assert plan_problems("find", rejected_scan) == []
+
+    scan = {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}},
+            "executionStats": {"nReturned": 1, "totalDocsExamined": 10000,
+                               "executionStages": {"stage": "COLLSCAN", "nReturned": 1, "docsExamined": 10000}}}
+    assert plan_problems("find", scan) == [
+        "COLLSCAN", "COLLSCAN", "COLLSCAN docsExamined=10000 for nReturned=1",
+        "totalDocsExamined=10000 for nReturned=1",
+    ]
+
+    residual_filter = {"stages": [{"$cursor": {"executionStats": {"executionStages": {
+        "stage": "FETCH", "nReturned": 10, "docsExamined": 400,
+        "inputStage": {"stage": "IXSCAN", "nReturned": 400, "keysExamined": 400}}}}}]}
+    assert plan_problems("aggregate", residual_filter) == ["FETCH docsExamined=400 for nReturned=10"]
+
+
+def test_login_plans(explain_env, client, monkeypatch):
+    """Test that logging in looks the user up by email through an index."""
+    db, capture, _ = explain_env
+    monkeypatch.setattr(app_package.mongo, "db", db)
+    with capture.record() as commands:
+        response = client.post("/login", data={"email": "plans@example.com", "password": PASSWORD})
+    assert response.status_code == 302
+    assert_indexed(db, commands)
+
+
+def test_dashboard_plans(explain_env, plans_client):
+    """Test the dashboard's first page and a keyset-paginated later page."""
+    db, capture, _ = explain_env
+    with capture.record() as commands:
+        assert plans_client.get("/").status_code == 200
+        page = plans_client.get("/", headers={"X-Requested-With": "XMLHttpRequest"}).get_json()
+        assert plans_client.get(f"/?cursor={page['next_cursor']}").status_code == 200
+    assert_indexed(db, commands)
+
+
+def test_summary_plans(explain_env, plans_client):
+    """Test the summary page and its chart data."""
+    db, capture, _ = explain_env
+    with capture.record() as commands:
+        assert plans_client.get("/summary").status_code == 200
+        assert plans_client.get("/summary/data?months=24").status_code == 200
+    assert_indexed(db, commands)
+
+
+def test_goal_page_plans(explain_env, plans_client):
+    """Test the savings goal page and its per-goal expense listing."""
+    db, capture, _ = explain_env
+    with capture.record() as commands:
+        assert plans_client.get("/set_savings_goal").status_code == 200
+    assert_indexed(db, commands)
+
+
+def test_goal_edit_plans(explain_env, plans_client):
+    """Test narrowing a goal's dates, which detaches and recounts its expenses."""
+    db, capture, user = explain_env
+    goal = user["savings_goals"][0]
+    start_date = datetime.strptime(goal["start_date"], DATE_FORMAT) + timedelta(days=30)
+    with capture.record() as commands:
+        response = plans_client.post("/set_savings_goal", data={
+            "action": "edit_goal", "goal_id": goal["goal_id"], "goal_name": goal["goal_name"],
+            "goal_amount": goal["goal_amount"], "start_date": start_date.strftime(DATE_FORMAT),
+            "end_date": goal["end_date"]
+        })
+    assert response.status_code == 302
+    assert_indexed(db, commands)
+
+
+def test_expense_edit_plans(explain_env, plans_client):
+    """Test allocating an existing expense to a goal."""
+    db, capture, user = explain_env
+    goal = user["savings_goals"][-1]
+    expense = db.expenses.find_one({"user_id": str(user["_id"]), "category": "Savings"})
+    with capture.record() as commands:
+        response = plans_client.post(f"/edit_expense/{expense['_id']}", data={
+            "description": expense["description"], "amount": "125.00", "category": "Savings",
+            "date": goal["end_date"], "goal_id": goal["goal_id"]
+        })
+    assert response.status_code == 302
+    assert_indexed(db, commands)
@@ -0,0 +1,97 @@
+import logging
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+from app.querylog import QueryLog, capture_queries, describe
+from app.user_cache import invalidate_user
+from app.summary_cache import cache as summary_cache
+
+
+def add_expenses(mock_db, user_id, count, **fields):
+    """Insert ``count`` expenses for a user directly into the database."""
+    if not count:
+        return
+    mock_db.expenses.insert_many([
+        {'user_id': user_id, 'description': f'Item {number}', 'amount': 10.0,
+         'category': 'Needs', 'date': datetime(2024, 1 + number % 12, 1), **fields}
+        for number in range(count)
+    ])
+
+
+def add_goals(mock_db, user, count):
+    """Give a user ``count`` savings goals, each with an allocated expense."""
+    goals = [{
+        'goal_id': str(ObjectId()), 'goal_name': f'Goal {number}', 'goal_amount': 1000.0,
+        'start_date': '2024-01-01', 'end_date': '2024-12-31', 'allocated_total': 10.0
+    } for number in range(count)]
+    mock_db.users.update_one({'_id': user['_id']}, {'$set': {'savings_goals': goals}})
+    invalidate_user(mock_db, str(user['_id']))
+    for goal in goals:
+        add_expenses(mock_db, str(user['_id']), 1, category='Savings', goal_id=goal['goal_id'])
+
+
+@pytest.mark.parametrize('expenses', [0, 500])
+def test_summary_query_budget(auth_client, assert_max_queries, mock_db, test_user, expenses):
+    """Test that the summary page needs at most 3 queries regardless of data size."""
+    add_expenses(mock_db, str(test_user['_id']), expenses)
+    auth_client.get('/summary')
+    with assert_max_queries(3):
+        assert auth_client.get('/summary').status_code == 200
+    with assert_max_queries(3):
+        assert auth_client.get('/summary/data?months=24').status_code == 200
+
+
+@pytest.mark.parametrize('expenses', [0, 500])
+def test_dashboard_query_budget(auth_client, assert_max_queries, mock_db, test_user, expenses):
+    """Test that the dashboard needs at most 3 queries regardless of data size."""
+    add_expenses(mock_db, str(test_user['_id']), expenses)
+    auth_client.get('/')
+    with assert_max_queries(3):
+        assert auth_client.get('/').status_code == 200
+
+
+def test_goal_page_queries_do_not_grow_with_goals(auth_client, count_queries, mock_db, test_user):
+    """Test that the savings goal page does not query once per goal."""
+    counts = []
+    for goals in (1, 10):
+        add_goals(mock_db, test_user, goals)
+        with capture_queries() as queries:
+            assert f'Goal {goals - 1}' in auth_client.get('/set_savings_goal').data.decode('utf-8')
+        counts.append(len(queries))
+    assert counts[0] == counts[1]
+
+
+def test_assert_max_queries_reports_commands(auth_client, assert_max_queries):
+    """Test that exceeding the limit fails with the offending commands."""
+    with pytest.raises(AssertionError, match='find expense_totals'):
+        with assert_max_queries(0):
+            auth_client.get('/summary')
+
+
+def test_budget_warning_in_dev_mode(app, auth_client, count_queries, caplog):
+    """Test that a request over its view's budget logs the repeated commands."""
+    auth_client.get('/summary')
+    app.config['QUERY_BUDGET_WARNINGS'] = True
+    try:
+        with caplog.at_level(logging.WARNING, logger=app.logger.name):
+            auth_client.get('/summary')
+            assert not caplog.records
+            app.view_functions['summary'].query_budget = 1
+            summary_cache.clear()
+            auth_client.get('/summary')
+    finally:
+        app.config['QUERY_BUDGET_WARNINGS'] = False
+        app.view_functions['summary'].query_budget = 3
+    assert 'GET /summary sent 2 MongoDB commands (budget 1)' in caplog.text
+
+
+def test_listener_records_commands():
+    """Test that the PyMongo listener records each started command and its collection."""
+    listener = QueryLog()
+    with capture_queries() as queries:
+        listener.started(SimpleNamespace(command_name='find', command={'find': 'expenses'}))
+        listener.started(SimpleNamespace(command_name='find', command={'find': 'expenses'}))
+        listener.started(SimpleNamespace(command_name='getMore', command={'getMore': 1, 'collection': 'expenses'}))
+        listener.started(SimpleNamespace(command_name='ping', command={'ping': 1}))
+    assert describe(queries) == '2x find expenses, 1x getMore expenses, 1x ping'
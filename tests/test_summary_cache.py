@@ -0,0 +1,119 @@
+import threading
+from datetime import datetime
+import mongomock
+from app.aggregates import apply_expense_change, get_user_totals, rebuild_user_rollups, recompute_user_totals
+from app.querylog import capture_queries
+from app.summary_cache import LocalBackend, SummaryCache, cache, cached_summary_window, init_summary_cache
+
+
+def make_backend(app):
+    """Factory named by SUMMARY_CACHE_BACKEND in the tests below."""
+    return LocalBackend()
+
+
+def add_expense(client, amount, category='Needs'):
+    client.post('/add_expense', data={
+        'description': 'Expense', 'amount': amount, 'category': category,
+        'date': datetime.now().strftime('%Y-%m-%d')
+    })
+
+
+def test_repeat_visits_skip_computation(auth_client, count_queries):
+    """Test that an unchanged user's series come from the cache with only the totals lookup."""
+    auth_client.get('/summary/data?months=6')
+    with capture_queries() as queries:
+        data = auth_client.get('/summary/data?months=6').get_json()
+    assert queries == [('find', 'expense_totals')]
+    assert data['months'] == 6
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_expense_writes_invalidate(auth_client, test_user):
+    """Test that adding and deleting expenses is reflected on the next visit."""
+    auth_client.get('/summary/data?months=3')
+    add_expense(auth_client, '25')
+    assert auth_client.get('/summary/data?months=3').get_json()['time']['values'][-1] == 25
+    add_expense(auth_client, '5', category='Wants')
+    data = auth_client.get('/summary/data?months=3').get_json()
+    assert data['categories'] == {'labels': ['Needs', 'Wants'], 'values': [25, 5]}
+    assert cache.hits == 0
+
+
+def test_data_version_changes_on_every_write(mock_db, test_user):
+    """Test that deltas and rebuilds move the version on, and rebuilds never reuse one."""
+    user_id = str(test_user['_id'])
+    versions = [get_user_totals(mock_db, user_id)['data_version']]
+    apply_expense_change(mock_db, user_id, new={'amount': 10.0, 'category': 'Needs', 'date': datetime(2024, 5, 1)})
+    versions.append(mock_db.expense_totals.find_one({'_id': user_id})['data_version'])
+    rebuild_user_rollups(mock_db, user_id)
+    versions.append(mock_db.expense_totals.find_one({'_id': user_id})['data_version'])
+    versions.append(recompute_user_totals(mock_db, user_id)['data_version'])
+    assert versions[1] == versions[0] + 1
+    assert len(set(versions)) == 4
+
+
+def test_read_between_totals_and_rollup_writes_is_not_cached(mock_db, test_user, monkeypatch):
+    """Test that a summary read while an expense's rollups are still being written does not outlive the write."""
+    user_id = str(test_user['_id'])
+    today = datetime.now()
+    get_user_totals(mock_db, user_id)
+    bulk_write = mongomock.collection.Collection.bulk_write
+
+    def read_first(collection, *args, **kwargs):
+        # Another request renders the summary after the totals moved but before the rollups did
+        if collection.name == 'monthly_rollups':
+            cached_summary_window(mock_db, user_id, get_user_totals(mock_db, user_id), 1, today)
+        return bulk_write(collection, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.collection.Collection, 'bulk_write', read_first)
+    apply_expense_change(mock_db, user_id, new={'amount': 50.0, 'category': 'Needs', 'date': today})
+    totals = get_user_totals(mock_db, user_id)
+    assert totals['total'] == 50
+    assert cached_summary_window(mock_db, user_id, totals, 1, today)['time']['values'] == [50]
+
+
+def test_shared_backend_is_used_across_workers():
+    """Test that a value cached by one worker is served to another through the backend."""
+    backend = LocalBackend()
+    first, second = SummaryCache(backend=backend), SummaryCache(backend=backend)
+    first.set('summary:u:1:2024-05:12', {'months': 12})
+    assert second.get('summary:u:1:2024-05:12') == {'months': 12}
+    assert second.get('summary:u:2:2024-05:12') is None
+    assert (second.hits, second.misses) == (1, 1)
+
+
+def test_counters_survive_concurrent_lookups():
+    """Test that lookups from many threads are all counted."""
+    summaries = SummaryCache()
+    summaries.set('hit', {'months': 1})
+
+    def look_up():
+        for _ in range(2000):
+            summaries.get('hit')
+            summaries.get('miss')
+
+    threads = [threading.Thread(target=look_up) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert (summaries.hits, summaries.misses) == (16000, 16000)
+
+
+def test_backend_is_configured_by_import_path(app):
+    """Test that SUMMARY_CACHE_BACKEND names the backend factory."""
+    app.config['SUMMARY_CACHE_BACKEND'] = 'tests.test_summary_cache.make_backend'
+    try:
+        init_summary_cache(app)
+        assert isinstance(cache.backend, LocalBackend)
+    finally:
+        app.config['SUMMARY_CACHE_BACKEND'] = None
+        init_summary_cache(app)
+    assert cache.backend is None
+
+
+def test_hit_ratio_is_exported(auth_client):
+    """Test that the summary cache hit ratio is exposed on /metrics."""
+    auth_client.get('/summary')
+    auth_client.get('/summary')
+    assert 'summary_cache_hit_ratio 0.5' in auth_client.get('/metrics').get_data(as_text=True).splitlines()
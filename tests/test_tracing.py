@@ -0,0 +1,94 @@
+import json
+from types import SimpleNamespace
+import pytest
+from flask import g
+from app import tracing
+from app.tracing import MongoSpans, Trace, breakdown, span
+
+
+@pytest.fixture
+def trace_config(app):
+    """Restore the tracing settings changed by a test."""
+    saved = {key: app.config[key] for key in ('ADMIN_EMAILS', 'TRACE_FILE')}
+    yield app.config
+    app.config.update(saved)
+
+
+def spans_by_kind(trace, kind):
+    return [item['name'] for item in trace['spans'] if item['kind'] == kind]
+
+
+def test_request_is_traced(auth_client):
+    """Test that the view and the template render become spans of the request's trace."""
+    auth_client.get('/summary')
+    trace = tracing.recent[-1]
+    assert (trace['method'], trace['path'], trace['endpoint'], trace['status']) == ('GET', '/summary', 'summary', 200)
+    assert spans_by_kind(trace, 'view') == ['view summary']
+    assert spans_by_kind(trace, 'template') == ['render summary.html']
+    view = trace['spans'][0]
+    assert view['duration_ms'] <= trace['duration_ms']
+
+
+def test_form_and_analytics_spans(auth_client, analytics_events):
+    """Test that form validation and track_event calls are traced."""
+    auth_client.post('/add_expense', data={
+        'description': 'Lunch', 'amount': '12.50', 'category': 'Needs', 'date': '2024-03-01'
+    })
+    trace = tracing.recent[-1]
+    assert spans_by_kind(trace, 'form') == ['validate ExpenseForm']
+    assert spans_by_kind(trace, 'analytics') == ['track_event expense_added']
+
+
+def test_mongo_commands_become_spans(app):
+    """Test that the listener adds a span per command to the current trace."""
+    listener = MongoSpans()
+    with app.test_request_context():
+        trace = g.trace = Trace('GET', '/summary')
+        listener.started(SimpleNamespace(command_name='find', command={'find': 'monthly_rollups'},
+                                         connection_id=('db', 1), request_id=3))
+        listener.succeeded(SimpleNamespace(command_name='find', connection_id=('db', 1), request_id=3,
+                                           duration_micros=4000))
+        del g.trace
+    assert trace.spans[0]['name'] == 'find monthly_rollups'
+    assert trace.spans[0]['duration_ms'] == pytest.approx(4.0)
+
+
+def test_breakdown_and_span_limit(monkeypatch):
+    """Test the time breakdown and that spans past the limit are only counted."""
+    monkeypatch.setattr(tracing, 'MAX_SPANS', 3)
+    trace = Trace('GET', '/')
+    trace.add('view index', 'view', trace.started, trace.started + 0.1)
+    trace.add('find expenses', 'mongo', trace.started, trace.started + 0.03)
+    trace.add('render index.html', 'template', trace.started + 0.05, trace.started + 0.07)
+    trace.add('find users', 'mongo', trace.started, trace.started + 0.01)
+    finished = trace.finish('index', 200)
+    assert finished['dropped_spans'] == 1
+    assert breakdown(finished) == pytest.approx({'mongo': 30.0, 'template': 20.0, 'form': 0.0, 'analytics': 0.0,
+                                                 'python': 50.0})
+
+
+def test_span_outside_request_is_a_no_op():
+    """Test that spans can wrap code that also runs without a request, such as the CLI."""
+    with span('track_event', 'analytics'):
+        pass
+
+
+def test_traces_are_appended_to_file(auth_client, trace_config, tmp_path):
+    """Test that finished traces are written as JSON lines when TRACE_FILE is set."""
+    trace_config['TRACE_FILE'] = str(tmp_path / 'traces.jsonl')
+    auth_client.get('/summary')
+    auth_client.get('/')
+    lines = (tmp_path / 'traces.jsonl').read_text().splitlines()
+    assert [json.loads(line)['endpoint'] for line in lines] == ['summary', 'index']
+
+
+def test_admin_traces_page(auth_client, trace_config):
+    """Test that only admins see the waterfall page."""
+    auth_client.get('/summary')
+    assert auth_client.get('/admin/traces?min_ms=0').status_code == 404
+
+    trace_config['ADMIN_EMAILS'] = {'test@example.com'}
+    content = auth_client.get('/admin/traces?min_ms=0').data.decode('utf-8')
+    assert 'GET /summary' in content
+    assert 'render summary.html' in content
+    assert 'No traced requests yet.' in auth_client.get('/admin/traces?min_ms=100000').data.decode('utf-8')
@@ -0,0 +1,119 @@
+from datetime import datetime
+from app import user_cache
+from app.user_cache import UserSettingsCache, cache, get_user_settings, _MISSING
+
+
+def test_user_settings_are_cached_across_requests(auth_client, test_user):
+    """Test that the users document is fetched once and then served from the worker cache."""
+    auth_client.get('/summary')
+    auth_client.get('/summary')
+    assert cache.misses == 1
+    assert cache.hits == 1
+
+
+def test_request_memo_and_copies(app, mock_db, test_user):
+    """Test that lookups within a request are memoized and cached documents are copies."""
+    user_id = str(test_user['_id'])
+    with app.test_request_context():
+        settings = get_user_settings(mock_db, user_id)
+        assert get_user_settings(mock_db, user_id) is settings
+        assert 'password' not in settings
+        settings['budget_settings']['needs'] = 99
+    assert cache.misses == 1
+
+    with app.test_request_context():
+        app.preprocess_request()
+        assert get_user_settings(mock_db, user_id)['budget_settings']['needs'] == 50
+    assert cache.hits == 1
+
+
+def test_settings_writes_invalidate_cache(auth_client, test_user):
+    """Test that updating budget settings is visible on the next page load."""
+    auth_client.get('/summary')
+    auth_client.post('/budget_settings', data={
+        'needs_percentage': 40, 'wants_percentage': 30,
+        'savings_percentage': 20, 'investments_percentage': 10
+    })
+    content = auth_client.get('/summary').data.decode('utf-8')
+    assert 'Needs (40.0%)' in content
+
+
+def test_goal_writes_invalidate_cache(auth_client, mock_db, test_user):
+    """Test that adding a goal and allocating an expense refresh the cached goals."""
+    auth_client.get('/')
+    auth_client.post('/set_savings_goal', data={
+        'action': 'add_goal', 'goal_name': 'Trip', 'goal_amount': '500',
+        'start_date': '2024-01-01', 'end_date': '2024-12-31'
+    })
+    assert 'Trip (Saved $0.00 of $500.00)' in auth_client.get('/').data.decode('utf-8')
+
+    goal_id = mock_db.users.find_one({'_id': test_user['_id']})['savings_goals'][0]['goal_id']
+    auth_client.post('/add_expense', data={
+        'description': 'Deposit', 'amount': '100', 'category': 'Savings', 'date': '2024-02-01', 'goal_id': goal_id
+    })
+    assert 'Trip (Saved $100.00 of $500.00)' in auth_client.get('/').data.decode('utf-8')
+
+
+def test_writes_invalidate_other_workers(auth_client, monkeypatch):
+    """Test that after a write, a worker still caching the old document fetches it again."""
+    first, second = UserSettingsCache(), UserSettingsCache()
+    monkeypatch.setattr(user_cache, 'cache', second)
+    auth_client.get('/summary')
+    assert second.misses == 1
+
+    monkeypatch.setattr(user_cache, 'cache', first)
+    auth_client.post('/budget_settings', data={
+        'needs_percentage': 40, 'wants_percentage': 30,
+        'savings_percentage': 20, 'investments_percentage': 10
+    })
+
+    monkeypatch.setattr(user_cache, 'cache', second)
+    assert 'Needs (40.0%)' in auth_client.get('/summary').data.decode('utf-8')
+    assert second.misses == 2
+    assert 'Needs (40.0%)' in auth_client.get('/summary').data.decode('utf-8')
+    assert second.hits == 1
+
+
+def test_goal_allocation_reads_fresh_goal_dates(auth_client, mock_db, test_user):
+    """Test that add and edit check a goal's date range against the database, not the worker cache."""
+    auth_client.post('/set_savings_goal', data={
+        'action': 'add_goal', 'goal_name': 'Trip', 'goal_amount': '500',
+        'start_date': '2024-01-01', 'end_date': '2024-01-31'
+    })
+    auth_client.get('/')
+    # Another worker extends the goal; only its own cache is invalidated
+    mock_db.users.update_one({'_id': test_user['_id']}, {'$set': {'savings_goals.0.end_date': '2024-12-31'}})
+    goal_id = mock_db.users.find_one({'_id': test_user['_id']})['savings_goals'][0]['goal_id']
+
+    auth_client.post('/add_expense', data={
+        'description': 'Deposit', 'amount': '100', 'category': 'Savings', 'date': '2024-06-01', 'goal_id': goal_id
+    })
+    expense = mock_db.expenses.find_one({'description': 'Deposit'})
+    assert expense['goal_id'] == goal_id
+
+    auth_client.post(f"/edit_expense/{expense['_id']}", data={
+        'description': 'Deposit', 'amount': '100', 'category': 'Savings', 'date': '2024-07-01', 'goal_id': goal_id
+    })
+    expense = mock_db.expenses.find_one({'_id': expense['_id']})
+    assert expense['date'] == datetime(2024, 7, 1)
+    assert expense['goal_id'] == goal_id
+
+
+def test_cache_expiry_and_eviction(monkeypatch):
+    """Test that entries expire after the TTL and the least recently used entry is evicted."""
+    now = [1000.0]
+    monkeypatch.setattr('app.lru.time.monotonic', lambda: now[0])
+    lru = UserSettingsCache(max_size=2, ttl=10)
+    lru.set('a', {'n': 1})
+    lru.set('b', {'n': 2})
+    assert lru.get('a') == {'n': 1}
+    lru.set('c', {'n': 3})
+    assert lru.get('b') is _MISSING
+    assert lru.get('a') == {'n': 1}
+
+    now[0] += 11
+    assert lru.get('c') is _MISSING
+    lru.set('c', None)
+    assert lru.get('c') is None
+    lru.invalidate('c')
+    assert lru.get('c') is _MISSING